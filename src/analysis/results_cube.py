@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""
+Labeled result cube of the model outputs
+Instead of one output tab per demand, substitution and VSLP levels ('{demand}_{sub}_{vslp}') in one workbook per years of growth and discount rate,
+all the outputs are held in one array of the dimensions
+    (country, scenario, demand, substitution, vslp, discount_rate, horizon, metric)
+e.g. the column 'S1 regrowth: total PDV (mega tC)' is the scenario 'S1 regrowth' and the metric 'total PDV (mega tC)',
+the columns without a scenario (e.g. 'Plantation area (ha)') are under the scenario 'All'. The missing combinations are NaN.
+
+The cube is an xarray DataArray, written chunked and compressed to Zarr (.zarr) or NetCDF (.nc), one chunk per discount rate and horizon,
+and opened lazily, e.g.
+    cube = open_cube('../../data/processed/derivative/CHARM_global_results_cube - V20230125.zarr')
+    cube.sel(country='BRA', demand='BAU', substitution='NOSUB', vslp='ALL', metric='total PDV (mega tC)').load()
+xarray (and zarr or netCDF4) are optional, they are only needed for the cube, cube_values works without them.
+
+From the command line, e.g. in ./src/analysis
+    python results_cube.py --years 40 100 --discount-rates 4p 0p 2p 6p
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import os
+import numpy as np
+import pandas as pd
+import results_summary_analysis
+
+try:
+    import xarray
+except ImportError:
+    xarray = None
+
+DIMS = ['country', 'scenario', 'demand', 'substitution', 'vslp', 'discount_rate', 'horizon', 'metric']
+# Columns of the output tabs that are not outputs
+ID_COLUMNS = ['Country', 'ISO', 'Discount rate', 'Years of growth']
+SCENARIO_ALL = 'All'
+
+
+def split_column(name):
+    """(scenario, metric) of an output column, e.g. ('S1 regrowth', 'total PDV (mega tC)')"""
+    scenario, separator, metric = name.partition(': ')
+    return (scenario, metric) if separator else (SCENARIO_ALL, name)
+
+
+def split_tabname(tabname):
+    """(demand, substitution, vslp) of an output tab name, e.g. ('BAU', 'NOSUB', 'ALL')"""
+    demand, substitution, vslp = tabname.split('_')
+    return demand, substitution, vslp
+
+
+def tables_by_setting(tables, discount_rate='4p', years=None):
+    """
+    Split the output tables of a Driver.run_model_sweep by discount rate and years of growth, for cube_values
+    :param tables: {output tab name: output table with the 'Discount rate' and/or 'Years of growth' columns}
+    :param discount_rate, years: the setting of the data file, for the tables without the column of the setting
+    :return: {(discount rate, years of growth): {output tab name: output table}}
+    """
+    by_setting = {}
+    for tabname, table in tables.items():
+        table = table.assign(**{column: value for column, value in [('Discount rate', discount_rate), ('Years of growth', years)] if column not in table.columns})
+        for (discount_rate_table, years_table), table_setting in table.groupby(['Discount rate', 'Years of growth'], sort=False):
+            by_setting.setdefault((discount_rate_table, int(years_table)), {})[tabname] = table_setting.reset_index(drop=True)
+    return by_setting
+
+
+def read_tables(root, years_list, discount_rates, version=results_summary_analysis.VERSION):
+    """Output tabs of the data files of the years of growth and discount rates, {(discount rate, years of growth): {output tab name: output table}}"""
+    return {(discount_rate, years): results_summary_analysis.read_output_tables(f'{root}/data/processed/CHARM global - YR_{years} - DR_{discount_rate} - V{version}.xlsx')
+            for years in years_list for discount_rate in discount_rates}
+
+
+def cube_values(tables):
+    """
+    Values and coordinates of the cube
+    :param tables: {(discount rate, years of growth): {output tab name: output table}}, e.g. from read_tables or tables_by_setting,
+                   the discount rate as the label of the data file ('4p') or a number (0.04)
+    :return: (values, coords), values of the shape of the DIMS, coords {dimension: labels} and 'country_name' of the countries
+    """
+    long_tables = []
+    for (discount_rate, years), tables_setting in tables.items():
+        for tabname, table in tables_setting.items():
+            demand, substitution, vslp = split_tabname(tabname)
+            long_table = table.drop(columns=[column for column in ID_COLUMNS[2:] if column in table.columns]).melt(id_vars=ID_COLUMNS[:2], var_name='column', value_name='value')
+            long_table = long_table.assign(demand=demand, substitution=substitution, vslp=vslp,
+                                           discount_rate=results_summary_analysis.discount_rate_value(discount_rate), horizon=int(years))
+            long_tables.append(long_table)
+    long_table = pd.concat(long_tables, ignore_index=True)
+    columns = long_table['column'].unique()
+    scenario_metric = dict(zip(columns, [split_column(column) for column in columns]))
+    long_table['scenario'] = long_table['column'].map(lambda column: scenario_metric[column][0])
+    long_table['metric'] = long_table['column'].map(lambda column: scenario_metric[column][1])
+    long_table = long_table.rename(columns={'ISO': 'country'})
+
+    coords, index = {}, []
+    for dim in DIMS:
+        # The labels in the order of appearance, except the numeric settings which are sorted
+        codes, labels = pd.factorize(long_table[dim], sort=dim in ('discount_rate', 'horizon'))
+        coords[dim] = np.asarray(labels)
+        index.append(codes)
+    values = np.full([len(coords[dim]) for dim in DIMS], np.nan)
+    values[tuple(index)] = pd.to_numeric(long_table['value'], errors='coerce').to_numpy(dtype=np.float64)
+    country_names = long_table.drop_duplicates('country').set_index('country')['Country']
+    coords['country_name'] = country_names.loc[coords['country']].to_numpy()
+    return values, coords
+
+
+def _require_xarray():
+    if xarray is None:
+        raise ImportError("The result cube needs xarray, please install xarray and zarr (for .zarr) or netCDF4 (for .nc)")
+
+
+def build_cube(tables):
+    """xarray DataArray of the output tables, see cube_values"""
+    _require_xarray()
+    values, coords = cube_values(tables)
+    cube_coords = {dim: coords[dim] for dim in DIMS}
+    cube_coords['country_name'] = ('country', coords['country_name'])
+    return xarray.DataArray(values, coords=cube_coords, dims=DIMS, name='value')
+
+
+def write_cube(filename, cube):
+    """Write the cube chunked by discount rate and horizon, compressed, to a .zarr store or a .nc file"""
+    _require_xarray()
+    chunks = {dim: 1 if dim in ('discount_rate', 'horizon') else cube.sizes[dim] for dim in DIMS}
+    dataset = cube.astype(np.float64).to_dataset()
+    # The labels are saved as fixed width strings
+    dataset = dataset.assign_coords({name: dataset[name].astype(str) for name in ['country', 'scenario', 'demand', 'substitution', 'vslp', 'metric', 'country_name']})
+    if filename.endswith('.zarr'):
+        # The default compressor of zarr (Blosc) is used
+        dataset['value'].encoding = {'chunks': tuple(chunks[dim] for dim in DIMS)}
+        dataset.to_zarr(filename, mode='w')
+    elif filename.endswith('.nc'):
+        dataset.to_netcdf(filename, encoding={'value': {'zlib': True, 'complevel': 4, 'chunksizes': tuple(chunks[dim] for dim in DIMS)}})
+    else:
+        raise ValueError(f"Unknown format of the result cube '{filename}', please use .zarr or .nc")
+    print(f"Result cube of {dict(cube.sizes)} written to {filename}")
+
+
+def open_cube(filename):
+    """Lazy DataArray of a cube written by write_cube, the values are only read when they are selected and loaded"""
+    _require_xarray()
+    engine = 'zarr' if filename.rstrip('/').endswith('.zarr') else None
+    return xarray.open_dataset(filename, engine=engine, chunks=None)['value']
+
+
+def main(argv=None):
+    """Command line entry point, the cube of the data files of the years of growth and discount rates, or of the sweep workbooks (Driver --discount-rate-sweep)"""
+    import argparse
+    parser = argparse.ArgumentParser(prog='results_cube', description='Write the CHARM global model outputs as one labeled result cube', usage='%(prog)s [options]')
+    parser.add_argument('--path', default='../..', help='The root path of running the model')
+    parser.add_argument('--version', default=results_summary_analysis.VERSION, help='The version of the data files')
+    parser.add_argument('--years', default=[40], type=int, nargs='+', help='The numbers of years of growth')
+    parser.add_argument('--discount-rates', default=['4p', '0p', '2p', '6p'], nargs='+', help='The discount rates of the data files')
+    parser.add_argument('--sweep', default=False, type=lambda x: (str(x).lower() in ['true', '1', 'yes']), help="Read the sweep workbooks '... - sweep.xlsx' of the years instead of the data files")
+    parser.add_argument('--outfile', default=None, help="The .zarr or .nc output, default '<path>/data/processed/derivative/CHARM_global_results_cube - V<version>.zarr'")
+    args = parser.parse_args(argv)
+
+    root, version = args.path, args.version
+    outfile = args.outfile if args.outfile is not None else f'{root}/data/processed/derivative/CHARM_global_results_cube - V{version}.zarr'
+    os.makedirs(os.path.dirname(os.path.abspath(outfile)), exist_ok=True)
+    if args.sweep:
+        tables = {}
+        for years in args.years:
+            tables.update(tables_by_setting(pd.read_excel(f'{root}/data/processed/CHARM global - YR_{years} - DR_4p - V{version} - sweep.xlsx', sheet_name=None), years=years))
+    else:
+        tables = read_tables(root, args.years, args.discount_rates, version)
+    write_cube(outfile, build_cube(tables))
+
+
+if __name__ == "__main__": # to avoid import run
+    main()
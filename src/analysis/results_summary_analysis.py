@@ -13,6 +13,9 @@ This script is used to perform result analysis based on the model outputs for th
 5. 125% of the plantation growth rates
 6. increase harvest efficiency using optimal slash rate in tropical countries
 7. reduce wood fuel demand by 50% of 2050 under baseline scenario
+
+Importing the module has no side effects, the steps are run from the command line, e.g. in ./src/analysis
+    python results_summary_analysis.py --steps 1 2 --years 40 --discount-rates 4p 0p 2p 6p
 """
 __author__ = "Liqing Peng"
 __copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
@@ -25,19 +28,27 @@ __version__ = "1.0"
 import os, sys
 import numpy as np
 import pandas as pd
-sys.path.append('../models')
-import Tropical_new_plantation_calculator
+try:
+    import Global_by_country, Tropical_new_plantation_calculator
+except ImportError:
+    # The model modules are in ../models of this file, if they are not on the path already
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'models'))
+    import Global_by_country, Tropical_new_plantation_calculator
 
-#############################################Path###########################################
-root = '../..'
-indir = f'{root}/data/processed'
-outdir = f'{root}/data/processed/derivative'
-sensoutdir = f'{root}/data/processed/derivative/sensitivity_analysis'
+VERSION = '20230125'
 
-if not os.path.exists(outdir):
-    os.makedirs(outdir)
-if not os.path.exists(sensoutdir):
-    os.makedirs(sensoutdir)
+# Sensitivity analysis
+GROWTH_EXPS = ['GR_25U', 'GR_25D', 'GR1_GR2_25U', 'GR1_GR2_25D', 'GR1_GR2_50U']
+ROOTSHOOT_EXPS = ['RSR_25U', 'RSR_25D']
+DEMAND_EXPS = ['Demand_OECD', 'Demand_IIASA', 'Demand_LINE']
+TRADE_EXPS = ['Trade_50U', 'Trade_50D']
+SENSITIVITY_EXPERIMENTS = GROWTH_EXPS + ROOTSHOOT_EXPS + DEMAND_EXPS + TRADE_EXPS
+
+GROWTH_NAMES = ['GRs 25% Up', 'GRs 25% Down', 'GR1/GR2 25% Up', 'GR1/GR2 25% Down', 'GR1/GR2 50% Up']
+ROOTSHOOT_NAMES = ['R/S 25% Up', 'R/S 25% Down']
+DEMAND_NAMES = ['OECD', 'IIASA', 'LINE']
+TRADE_NAMES = ['Tropical exports 50% Up', 'Tropical exports 50% Down']
+SENSITIVITY_NAMES = ['Baseline'] + GROWTH_NAMES + ROOTSHOOT_NAMES + DEMAND_NAMES + TRADE_NAMES
 
 ##############################################Read in model outputs##########################################
 # 2022/01 Lists
@@ -107,66 +118,121 @@ def write_excel(filename, sheetname, dataframe):
 
 
 ############################################## Results Summary ##########################################
-def summarize_results_all(datafile, outfile, discount_rate):
-    ### Prepare the data arrays
-    # 12 demand and sub levels x (6+1) scenarios
-    carbon_costs = np.zeros((12, 7))
-    # 12 demand and sub levels x (6+1) scenarios + 2 columns for plantation areas
-    required_area = np.zeros((12, 9))
-    # 12 demand and sub levels x (4+1) scenarios x 2
-    wood_supply = np.zeros((12, 10))
-    row = 0
-    row_index = []
-    for vslp_input_control in ['ALL', 'IND', 'WFL']:
-        for substitution_mode in ['NOSUB', 'SUBON']:
-            for future_demand_level in ['BAU', 'CST']:
-                output_tabname = f'{future_demand_level}_{substitution_mode}_{vslp_input_control}'
-                row_index.append(output_tabname)
-                results = pd.read_excel(datafile, sheet_name=output_tabname)
-                carbon_main, land_main = extract_global_outputs_summary(results)
-                wood_main = extract_global_wood_supply(results)
-                carbon_last, secondary_land_last, new_tropical_land_last, secondary_wood_last, plantation_wood_last = Tropical_new_plantation_calculator.PlantationCalculator(datafile, results).run_new_tropical_plantations_scenario()
-                carbon_costs[row, :3] = carbon_main.values[:3]
-                carbon_costs[row, 4:7] = carbon_main.values[3:]
-                required_area[row, :3] = land_main.values[1:4]
-                required_area[row, 4:7] = land_main.values[4:]
-                wood_supply[row, :2] = wood_main.values[:2]
-                wood_supply[row, 4:10] = wood_main.values[2:]
-                # The 4th scenario new tropical plantation
-                carbon_costs[row, 3] = carbon_last
-                required_area[row, 3] = secondary_land_last
-
-                required_area[row, 7] = land_main.values[0]  # The existing plantation
-                required_area[row, 8] = new_tropical_land_last  # The new plantation
-
-                wood_supply[row, 2] = plantation_wood_last
-                wood_supply[row, 3] = secondary_wood_last
-
-                row = row + 1
+# Output tabs of the 12 demand and sub levels, in the order of the rows of the summary
+OUTPUT_TABNAMES = [f'{future_demand_level}_{substitution_mode}_{vslp_input_control}' for vslp_input_control in ['ALL', 'IND', 'WFL']
+                   for substitution_mode in ['NOSUB', 'SUBON'] for future_demand_level in ['BAU', 'CST']]
+
+SCENARIOS = ['S1 Secondary forest harvest + regrowth', 'S2 Secondary forest harvest + conversion', 'S3 Secondary forest mixed harvest',
+             'S4 New tropical plantations', 'S5 Higher plantation productivity', 'S6 Higher harvest efficiency', 'S7 50% less 2050 wood fuel demand']
+LAND_AREAS = SCENARIOS + ['Existing plantations', 'New plantations']
+WOOD_SUPPLY_ITEMS = ['Default: Plantation supply wood (mega tC)',
+                     'Default: Secondary forest supply wood (mega tC)',
+                     'Agriland: Plantation supply wood (mega tC)',
+                     'Agriland: Secondary forest supply wood (mega tC)',
+                     '125% GR: Plantation supply wood (mega tC)',
+                     '125% GR: Secondary forest supply wood (mega tC)',
+                     '62% SL: Plantation supply wood (mega tC)',
+                     '62% SL: Secondary forest supply wood (mega tC)',
+                     'WFL50less: Plantation supply wood (mega tC)',
+                     'WFL50less: Secondary forest supply wood (mega tC)']
+
+
+def discount_rate_label(discount_rate):
+    """Label of the data files and summary tabs, e.g. '4p' for 0.04"""
+    return discount_rate if isinstance(discount_rate, str) else f'{discount_rate * 100:g}p'
+
+
+def discount_rate_value(discount_rate):
+    """Discount rate of a label, e.g. 0.04 for '4p'"""
+    return float(discount_rate[:-1]) / 100 if isinstance(discount_rate, str) else float(discount_rate)
+
+
+def tables_by_discount_rate(tables):
+    """
+    Split the output tables of a Driver.run_model_sweep by discount rate, for summarize_tables
+    :param tables: {output tab name: output table with a 'Discount rate' column}
+    :return: {discount rate: {output tab name: output table}}
+    """
+    by_discount_rate = {}
+    for tabname, table in tables.items():
+        for discount_rate, table_discount_rate in table.groupby('Discount rate', sort=False):
+            by_discount_rate.setdefault(discount_rate, {})[tabname] = table_discount_rate.reset_index(drop=True)
+    return by_discount_rate
+
+
+def summarize_tables(tables, datafile):
+    """
+    Carbon, land and wood supply summaries of the output tables already in memory, e.g. returned by Driver.run_model_all_scenarios, for all the discount rates in one pass
+    :param tables: {discount rate: {output tab name: output table}}, the discount rate as the label of the data file ('4p') or a number (0.04)
+    :param datafile: path of the excel data file, or its Inputs table, for the parameters of the new tropical plantation scenario
+    :return: {summary tab name: DataFrame}, for write_summary
+    """
+    inputs = Global_by_country.read_inputs(datafile)
+    summary = {}
+    for discount_rate, tables_discount_rate in tables.items():
+        discount_rate = discount_rate_label(discount_rate)
+        results_tables = [tables_discount_rate[tabname] for tabname in OUTPUT_TABNAMES]
+        ### Prepare the data arrays
+        # 12 demand and sub levels x (6+1) scenarios
+        carbon_costs = np.zeros((12, 7))
+        # 12 demand and sub levels x (6+1) scenarios + 2 columns for plantation areas
+        required_area = np.zeros((12, 9))
+        # 12 demand and sub levels x (4+1) scenarios x 2
+        wood_supply = np.zeros((12, 10))
+
+        # The 4th scenario new tropical plantation, for the 12 demand and sub levels at once
+        global_harvest_settings, global_growth_settings = Tropical_new_plantation_calculator.tropical_parameters(inputs, discount_rate_input=discount_rate_value(discount_rate))
+        new_tropical = Tropical_new_plantation_calculator.run_new_tropical_plantations_batch(results_tables, global_harvest_settings, global_growth_settings)
+
+        for row, results in enumerate(results_tables):
+            carbon_main, land_main = extract_global_outputs_summary(results)
+            wood_main = extract_global_wood_supply(results)
+            carbon_costs[row, :3] = carbon_main.values[:3]
+            carbon_costs[row, 4:7] = carbon_main.values[3:]
+            required_area[row, :3] = land_main.values[1:4]
+            required_area[row, 4:7] = land_main.values[4:]
+            wood_supply[row, :2] = wood_main.values[:2]
+            wood_supply[row, 4:10] = wood_main.values[2:]
+            # The 4th scenario new tropical plantation
+            carbon_costs[row, 3] = new_tropical['carbon_cost_annual'][row, 0]
+            required_area[row, 3] = new_tropical['updated_secondary_area'][row, 0]
+
+            required_area[row, 7] = land_main.values[0]  # The existing plantation
+            required_area[row, 8] = new_tropical['new_plantation_area'][row, 0]  # The new plantation
+
+            wood_supply[row, 2] = new_tropical['total_wood_plantation_after_replace'][row, 0]
+            wood_supply[row, 3] = new_tropical['total_wood_secondary_after_replace'][row, 0]
+
+        # Convert to pandas dataframe
+        summary[f'CO2 (Gt per yr) DR_{discount_rate}'] = pd.DataFrame(carbon_costs, index=OUTPUT_TABNAMES, columns=SCENARIOS)
+        # For land and wood supply, no matter what discount it is, the land area does not change
+        if discount_rate == '4p':
+            summary[f'Land (Mha) DR_{discount_rate}'] = pd.DataFrame(required_area, index=OUTPUT_TABNAMES, columns=LAND_AREAS)
+            summary[f'Wood supply (mega tC) DR_{discount_rate}'] = pd.DataFrame(wood_supply, index=OUTPUT_TABNAMES, columns=WOOD_SUPPLY_ITEMS)
+
+    return summary
+
+
+def write_summary(outfile, summary):
+    """Write all the summary tabs to the summary workbook at once, replacing the tabs of the same names and keeping the others"""
+    if os.path.isfile(outfile):
+        writer = pd.ExcelWriter(outfile, engine='openpyxl', mode='a', if_sheet_exists='replace')
+    else:
+        print("Creating new workbook...")
+        writer = pd.ExcelWriter(outfile, engine='openpyxl')
+    with writer:
+        for sheetname, dataframe in summary.items():
+            dataframe.to_excel(writer, sheet_name=sheetname)
 
 
-    # Convert to pandas dataframe
-    scenarios = ['S1 Secondary forest harvest + regrowth', 'S2 Secondary forest harvest + conversion', 'S3 Secondary forest mixed harvest',
-     'S4 New tropical plantations', 'S5 Higher plantation productivity', 'S6 Higher harvest efficiency', 'S7 50% less 2050 wood fuel demand']
-    carbon_df = pd.DataFrame(carbon_costs, index=row_index, columns=scenarios)
-    write_excel(outfile, f'CO2 (Gt per yr) DR_{discount_rate}', carbon_df)
-    # For land and wood supply, no matter what discount it is, the land area does not change
-    if discount_rate == '4p':
-        land_areas = scenarios + ['Existing plantations', 'New plantations']
-        wood_supply_items = ['Default: Plantation supply wood (mega tC)',
-                             'Default: Secondary forest supply wood (mega tC)',
-                             'Agriland: Plantation supply wood (mega tC)',
-                             'Agriland: Secondary forest supply wood (mega tC)',
-                             '125% GR: Plantation supply wood (mega tC)',
-                             '125% GR: Secondary forest supply wood (mega tC)',
-                             '62% SL: Plantation supply wood (mega tC)',
-                             '62% SL: Secondary forest supply wood (mega tC)',
-                             'WFL50less: Plantation supply wood (mega tC)',
-                             'WFL50less: Secondary forest supply wood (mega tC)']
-        area_df = pd.DataFrame(required_area, index=row_index, columns=land_areas)
-        wood_df = pd.DataFrame(wood_supply, index=row_index, columns=wood_supply_items)
-        write_excel(outfile, f'Land (Mha) DR_{discount_rate}', area_df)
-        write_excel(outfile, f'Wood supply (mega tC) DR_{discount_rate}', wood_df)
+def read_output_tables(datafile):
+    """The 12 output tabs of a data file, read in one pass of the workbook"""
+    return pd.read_excel(datafile, sheet_name=OUTPUT_TABNAMES)
+
+
+def summarize_results_all(datafile, outfile, discount_rate):
+    """Summaries of the output tabs of one data file, see summarize_tables"""
+    write_summary(outfile, summarize_tables({discount_rate: read_output_tables(datafile)}, datafile))
 
     return
 
@@ -184,7 +250,7 @@ def collect_all_discount_rates_results(infile, outfile):
     return
 
 
-def collect_secondary_carbon_costs_all_years():
+def collect_secondary_carbon_costs_all_years(root, version=VERSION):
     "This is to compare 100yr and 40yr on secondary carbon costs only, excluding plantation, for bar charts"
     # 4 demand and 2x4 scenarios
     carbon_costs = np.zeros((4, 8))
@@ -215,8 +281,10 @@ def collect_secondary_carbon_costs_all_years():
     return
 
 
-def summarize_results_sensitivity(outfile, years, discount_rate):
+def summarize_results_sensitivity(outfile, years, discount_rate, root, version=VERSION, experiments=SENSITIVITY_EXPERIMENTS, names=SENSITIVITY_NAMES):
     "This is for the sensitivity analysis only"
+    indir = f'{root}/data/processed'
+    sensindir = f'run_NatSensitivity_{version}'
     m = len(experiments)
     # 2 demand and sub levels x M experiments
     carbon_costs = np.zeros((2, m+1))
@@ -252,50 +320,57 @@ def summarize_results_sensitivity(outfile, years, discount_rate):
     return
 
 
-########## Input
-version = '20230125'
-sensindir = f'run_NatSensitivity_{version}'
-discount_rates = ['4p', '0p', '2p', '6p']
-years_list = [40]
-
-
-# Step 1
-for years in years_list:
-    for discount_rate in discount_rates:
-        datafile = f'{root}/data/processed/CHARM global - YR_{years} - DR_{discount_rate} - V{version}.xlsx'
-        outfile = f'{root}/data/processed/derivative/CHARM_global_carbon_land_summary - YR_{years} - V{version}.xlsx'
-        summarize_results_all(datafile, outfile, discount_rate)
-
-# Step 2
-# for years in years_list:
-#     infile = f'{root}/data/processed/derivative/CHARM_global_carbon_land_summary - YR_{years} - V{version}.xlsx'
-#     outfile = f'{root}/data/processed/derivative/carbon_results_all_discountrate - YR_{years} - V{version}.csv'
-#     collect_all_discount_rates_results(infile, outfile)
-
-# Step 3 Fig E3
-# collect_secondary_carbon_costs_all_years()
-
-# Step 4
-
-# Sensitivity analysis
-# growth_exps = ['GR_25U', 'GR_25D', 'GR1_GR2_25U', 'GR1_GR2_25D', 'GR1_GR2_50U']
-# rootshoot_exps = ['RSR_25U', 'RSR_25D']
-# demand_exps = ['Demand_OECD', 'Demand_IIASA', 'Demand_LINE']
-# trade_exps = ['Trade_50U', 'Trade_50D']
-# experiments = growth_exps + rootshoot_exps + demand_exps + trade_exps
-#
-# growth_names = ['GRs 25% Up', 'GRs 25% Down', 'GR1/GR2 25% Up', 'GR1/GR2 25% Down', 'GR1/GR2 50% Up']
-# rootshoot_names = ['R/S 25% Up', 'R/S 25% Down']
-# demand_names = ['OECD', 'IIASA', 'LINE']
-# trade_names = ['Tropical exports 50% Up', 'Tropical exports 50% Down']
-# names = ['Baseline'] + growth_names + rootshoot_names + demand_names + trade_names
-
-# years = 40
-# discount_rate = '4p'
-# outfile = f'{sensoutdir}/CHARM_global_carbon_land_summary - YR_{years} - V{version} - sensitivity.xlsx'
-
-# years = 100
-# discount_rate = '4p'
-# outfile = f'{sensoutdir}/CHARM_global_carbon_land_summary - YR_{years} - V{version} - sensitivity Old.xlsx'
-
-# summarize_results_sensitivity(outfile, years, discount_rate)
\ No newline at end of file
+def main(argv=None):
+    """
+    Command line entry point
+    Step 1: summary of the output tabs of all the discount rates, see summarize_tables
+    Step 2: carbon costs of all the discount rates, for the Appendix 3 table
+    Step 3: secondary carbon costs of 40 and 100 years, for Fig E3
+    Step 4: summary of the sensitivity experiments
+    """
+    import argparse
+    parser = argparse.ArgumentParser(prog='results_summary_analysis', description='Summarize the CHARM global model outputs', usage='%(prog)s [options]')
+    parser.add_argument('--path', default='../..', help='The root path of running the model')
+    parser.add_argument('--version', default=VERSION, help='The version of the data files')
+    parser.add_argument('--years', default=[40], type=int, nargs='+', help='The numbers of years of growth')
+    parser.add_argument('--discount-rates', default=['4p', '0p', '2p', '6p'], nargs='+', help='The discount rates of the data files')
+    parser.add_argument('--steps', default=[1], type=int, nargs='+', choices=[1, 2, 3, 4], help='The analysis steps to run')
+    args = parser.parse_args(argv)
+
+    root, version = args.path, args.version
+    outdir = f'{root}/data/processed/derivative'
+    sensoutdir = f'{root}/data/processed/derivative/sensitivity_analysis'
+    os.makedirs(outdir, exist_ok=True)
+    os.makedirs(sensoutdir, exist_ok=True)
+
+    # Step 1
+    # All the discount rates are summarized in one pass and the summary workbook is written once.
+    # The tables returned by Driver.run_model_all_scenarios (or Driver.run_model_sweep, split by tables_by_discount_rate) can be passed directly instead of reading the data files.
+    if 1 in args.steps:
+        for years in args.years:
+            tables = {discount_rate: read_output_tables(f'{root}/data/processed/CHARM global - YR_{years} - DR_{discount_rate} - V{version}.xlsx') for discount_rate in args.discount_rates}
+            datafile = f'{root}/data/processed/CHARM global - YR_{years} - DR_{args.discount_rates[0]} - V{version}.xlsx'
+            outfile = f'{outdir}/CHARM_global_carbon_land_summary - YR_{years} - V{version}.xlsx'
+            write_summary(outfile, summarize_tables(tables, datafile))
+
+    # Step 2
+    if 2 in args.steps:
+        for years in args.years:
+            infile = f'{outdir}/CHARM_global_carbon_land_summary - YR_{years} - V{version}.xlsx'
+            outfile = f'{outdir}/carbon_results_all_discountrate - YR_{years} - V{version}.csv'
+            collect_all_discount_rates_results(infile, outfile)
+
+    # Step 3 Fig E3
+    if 3 in args.steps:
+        collect_secondary_carbon_costs_all_years(root, version)
+
+    # Step 4 Sensitivity analysis
+    if 4 in args.steps:
+        for years in args.years:
+            for discount_rate in args.discount_rates:
+                outfile = f'{sensoutdir}/CHARM_global_carbon_land_summary - YR_{years} - V{version} - sensitivity.xlsx'
+                summarize_results_sensitivity(outfile, years, discount_rate, root, version)
+
+
+if __name__ == "__main__": # to avoid import run
+    main()
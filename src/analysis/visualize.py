@@ -1,6 +1,10 @@
 #!/usr/bin/env python
 """
 Plot the barplots for carbon costs and land use
+All the figures of the summary workbooks (see results_summary_analysis) are rendered by render_figures, from the command line e.g. in ./src/analysis
+    python visualize.py --years 40 100 --discount-rates 4p 0p 2p 6p
+Each summary workbook is read once, the figures are rendered in a process pool with the Agg backend and saved as PNG and SVG.
+A figure whose data and plotting code did not change since the last rendering is skipped (see figure_stamps.json in the figure folder).
 """
 __author__ = "Liqing Peng"
 __copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
@@ -10,24 +14,41 @@ __maintainer__ = "Liqing Peng"
 __email__ = "liqing.peng@wri.org"
 __version__ = "1.0"
 
+import os
+import json
+import hashlib
+import concurrent.futures
 import matplotlib
 import pandas as pd
 import matplotlib.pyplot as plt
 matplotlib.rcParams['font.sans-serif'] = "Arial"
 matplotlib.rcParams['font.family'] = "sans-serif"
 
-### Directory
-root = '../..'
-figdir = f'{root}/reports/figures'
+VERSION = '20230125'
 
-def read_dataframe(infile, tabname):
-    # Read in the excel file using the first column as the index
-    df = pd.read_excel(infile, sheet_name=tabname, index_col=0)
+# Figures of a summary workbook: (figure name, plot function, summary tab, label type)
+# The figure name and the tab are formatted with the years and the discount rate, the land figures are the same for all the discount rates
+FIGURES = [('annual_carbon_cost_7scenarios_YR{years}_DR{discount_rate}', 'barplot_carbon_BAU_CST_SUB', 'CO2 (Gt per yr) DR_{discount_rate}', 'quantity'),
+           ('land_requirement_7scenarios_YR{years}', 'barplot_land_BAU_CST', 'Land (Mha) DR_4p', 'quantity'),
+           ('carbon_cost_annual_percentage_IND_WFL_7scenarios_YR{years}_DR{discount_rate}', 'barplot_carbon_IND_WFL', 'CO2 (Gt per yr) DR_{discount_rate}', 'percentage'),
+           ('land_requirement_percentage_IND_WFL_7scenarios_YR{years}', 'barplot_land_IND_WFL', 'Land (Mha) DR_4p', 'percentage')]
+
+
+def prepare_dataframe(df):
     # Prepare data for the BAU vs CST plot
     df.loc['NewDemand_NOSUB_ALL'] = df.loc['BAU_NOSUB_ALL'] - df.loc['CST_NOSUB_ALL']
     df.loc['BAU_SubEffect_ALL'] = df.loc['BAU_SUBON_ALL'] - df.loc['BAU_NOSUB_ALL']
     return df
 
+def read_dataframe(infile, tabname):
+    # Read in the excel file using the first column as the index
+    df = pd.read_excel(infile, sheet_name=tabname, index_col=0)
+    return prepare_dataframe(df)
+
+def read_summary(infile):
+    "All the tabs of a summary workbook, read at once"
+    return {tabname: prepare_dataframe(df) for tabname, df in pd.read_excel(infile, sheet_name=None, index_col=0).items()}
+
 ############################################## Plot Modules ##################################################
 
 def setup_color_scheme(data='carbon', mode='quantity', colorstyle='original'):
@@ -284,30 +305,93 @@ def barplot_land_IND_WFL(result_df, label_type='percentage'):
 
     return
 
-############################################## Execution ##################################################
-
-years = 40 #100
-version = '20230125'
-discount_rate = '4p'
-infile = f'{root}/data/processed/derivative/CHARM_global_carbon_land_summary - YR_{years} - V{version}.xlsx'
-carbon_df = read_dataframe(infile, f'CO2 (Gt per yr) DR_{discount_rate}')
-land_df = read_dataframe(infile, 'Land (Mha) DR_4p')
-
-# ax = barplot_carbon_BAU_CST_SUB(carbon_df, label_type='quantity')
-# plt.show()
-# plt.savefig(f'{figdir}/annual_carbon_cost_7scenarios_YR{years}_DR{discount_rate}.png', dpi=300)
-# plt.savefig(f'{figdir}/svg/annual_carbon_cost_7scenarios_YR{years}_DR{discount_rate}.svg', dpi=300)
-#
-# ax = barplot_land_BAU_CST(land_df, label_type='quantity')
-# plt.show()
-# plt.savefig(f'{figdir}/land_requirement_7scenarios_YR{years}.png', dpi=300)
-# plt.savefig(f'{figdir}/svg/land_requirement_7scenarios_YR{years}.svg', dpi=300)
-#
-# ax = barplot_carbon_IND_WFL(carbon_df, label_type='percentage')
-# plt.show()
-# plt.savefig(f'{figdir}/carbon_cost_annual_percentage_IND_WFL_7scenarios_YR{years}.png', dpi=300)
-# plt.savefig(f'{figdir}/svg/carbon_cost_annual_percentage_IND_WFL_7scenarios_YR{years}.svg', dpi=300)
-#
-# ax = barplot_land_IND_WFL(land_df, label_type='percentage')
-# plt.show()
-# plt.savefig(f'{figdir}/svg/carbon_cost_annual_percentage_IND_WFL_7scenarios_YR{years}.png', dpi=300)
+############################################## Batch rendering ##################################################
+def code_digest():
+    "Digest of this script, a change of the plotting code renders all the figures again"
+    with open(os.path.abspath(__file__), 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def figure_digest(figname, function_name, label_type, result_df, code):
+    "Digest of the data and the code of a figure"
+    digest = hashlib.sha256()
+    digest.update(json.dumps([figname, function_name, label_type, list(map(str, result_df.columns)), list(map(str, result_df.index))]).encode())
+    digest.update(pd.util.hash_pandas_object(result_df, index=True).values.tobytes())
+    digest.update(code.encode())
+    return digest.hexdigest()
+
+def render_figure(figname, function_name, label_type, result_df, figdir):
+    "Render one figure with the Agg backend and save it as PNG and SVG, in a worker process"
+    matplotlib.use('Agg')
+    # The plot functions change the signs of the data in place
+    globals()[function_name](result_df.copy(), label_type=label_type)
+    plt.savefig(f'{figdir}/{figname}.png', dpi=300)
+    plt.savefig(f'{figdir}/svg/{figname}.svg', dpi=300)
+    plt.close('all')
+    return figname
+
+def render_figures(root, years_list, discount_rates, version=VERSION, processes=None, force=False):
+    """
+    Render all the figures of the summary workbooks of years_list for the discount_rates
+    :param processes: number of worker processes, default the number of CPUs, 1 to render in this process
+    :param force: render the figures whose data and code did not change as well
+    :return: the names of the rendered figures
+    """
+    figdir = f'{root}/reports/figures'
+    os.makedirs(f'{figdir}/svg', exist_ok=True)
+    stamps_file = f'{figdir}/figure_stamps.json'
+    stamps = {}
+    if os.path.exists(stamps_file):
+        with open(stamps_file) as f:
+            stamps = json.load(f)
+    code = code_digest()
+
+    jobs, digests = {}, {}
+    for years in years_list:
+        # Each summary workbook is read once for all its figures
+        summary = read_summary(f'{root}/data/processed/derivative/CHARM_global_carbon_land_summary - YR_{years} - V{version}.xlsx')
+        for discount_rate in discount_rates:
+            for figname, function_name, tabname, label_type in FIGURES:
+                figname, tabname = figname.format(years=years, discount_rate=discount_rate), tabname.format(discount_rate=discount_rate)
+                if figname in digests or tabname not in summary:
+                    continue
+                digests[figname] = figure_digest(figname, function_name, label_type, summary[tabname], code)
+                exists = os.path.exists(f'{figdir}/{figname}.png') and os.path.exists(f'{figdir}/svg/{figname}.svg')
+                if not force and exists and stamps.get(figname) == digests[figname]:
+                    print(f"{figname} is unchanged")
+                    continue
+                jobs[figname] = (figname, function_name, label_type, summary[tabname], figdir)
+
+    processes = os.cpu_count() if processes is None else processes
+    if processes == 1 or len(jobs) <= 1:
+        rendered = [render_figure(*job) for job in jobs.values()]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(processes, len(jobs))) as executor:
+            rendered = list(executor.map(render_figure, *zip(*jobs.values())))
+
+    # Record the figures only after they are saved
+    for figname in rendered:
+        print(f"{figname} is rendered")
+        stamps[figname] = digests[figname]
+    with open(stamps_file, 'w') as f:
+        json.dump(stamps, f, indent=1)
+
+    return rendered
+
+
+def main(argv=None):
+    "Command line entry point"
+    import argparse
+    parser = argparse.ArgumentParser(prog='visualize', description='Render the figures of the CHARM global summary', usage='%(prog)s [options]')
+    parser.add_argument('--path', default='../..', help='The root path of running the model')
+    parser.add_argument('--version', default=VERSION, help='The version of the data files')
+    parser.add_argument('--years', default=[40], type=int, nargs='+', help='The numbers of years of growth')
+    parser.add_argument('--discount-rates', default=['4p'], nargs='+', help='The discount rates of the summary tabs')
+    parser.add_argument('--processes', default=None, type=int, help='The number of worker processes, default the number of CPUs')
+    parser.add_argument('--force', default=False, type=lambda x: (str(x).lower() in ['true', '1', 'yes']), help='Render the unchanged figures as well')
+    args = parser.parse_args(argv)
+
+    render_figures(args.path, args.years, args.discount_rates, version=args.version, processes=args.processes, force=args.force)
+
+
+if __name__ == "__main__": # to avoid import run
+    main()
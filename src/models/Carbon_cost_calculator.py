@@ -17,22 +17,152 @@ __version__ = "1.0"
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import Secondary_conversion_scenario, Secondary_regrowth_scenario, Secondary_mature_regrowth_scenario
-import Plantation_counterfactual_secondary_plantation_age_scenario
+import Global_by_country
+import Secondary_conversion_scenario, Secondary_regrowth_scenario, Secondary_mature_regrowth_scenario, Secondary_regrowth_closed_form
+import Plantation_counterfactual_secondary_plantation_age_scenario, Tracker_result
+
+
+def annual_flux_by_scenario(Carbon_calculator):
+    """(annual flux, discounted year) of the plantation, secondary conversion, secondary regrowth and secondary mature regrowth"""
+    return [(Carbon_calculator.annual_flux_plantation, Carbon_calculator.discounted_year_plantation),
+            (Carbon_calculator.annual_flux_secondary_conversion, Carbon_calculator.discounted_year_secondary_conversion),
+            (Carbon_calculator.annual_flux_secondary_regrowth, Carbon_calculator.discounted_year_secondary_regrowth),
+            (Carbon_calculator.annual_flux_secondary_mature_regrowth, Carbon_calculator.discounted_year_secondary_mature_regrowth)]
+
+
+def tracker_annual_flux(scenario_module, Global, nyears_start):
+    """(annual flux (nyears, nyears_start), discounted year) of the carbon tracker of the scenario module, one column per starting year"""
+    annual_flux = np.zeros((Global.nyears, nyears_start), dtype=Global.dtype)
+    for year in range(nyears_start):
+        stand_result_year = scenario_module.CarbonTracker(Global, year_start_for_PDV=year, keep_intermediates=False)
+        # Every year, the annual flux are saved for each column
+        annual_flux[:, year] = stand_result_year.benefit_minus_counterfactual_diff[:]
+    # The discounting years only depend on the rotation length, the same for all the starting years
+    return annual_flux, stand_result_year.discounted_year
+
+
+def _total_pdv(Carbon_calculator, pdv_yearly_by_scenario):
+    """Total PDV (mega tC) from the (..., nyears_harvest) PDV of harvesting one hectare in year x of each scenario, as in the CarbonCalculator"""
+    pdv_yearly_plantation, pdv_yearly_secondary_conversion, pdv_yearly_secondary_regrowth, pdv_yearly_secondary_mature_regrowth = pdv_yearly_by_scenario
+    Land_area = Carbon_calculator.Land_area
+    totals = {'total_pdv_plantation_sum': pdv_yearly_plantation @ Carbon_calculator.area_harvested_new_plantation / 1000000,
+              'total_pdv_secondary_regrowth_sum': (pdv_yearly_secondary_regrowth @ Land_area.area_harvested_new_secondary_regrowth + pdv_yearly_secondary_mature_regrowth @ Land_area.area_harvested_new_secondary_mature_regrowth) / 1000000,
+              'total_pdv_secondary_conversion_sum': pdv_yearly_secondary_conversion @ Land_area.area_harvested_new_secondary_conversion / 1000000}
+    totals['total_pdv_plantation_secondary_regrowth'] = totals['total_pdv_plantation_sum'] + totals['total_pdv_secondary_regrowth_sum']
+    totals['total_pdv_plantation_secondary_conversion'] = totals['total_pdv_plantation_sum'] + totals['total_pdv_secondary_conversion_sum']
+    return totals
+
+
+def _nyears_growth(Carbon_calculator, years_growth):
+    """Number of years (rows of the annual flux) of the years of growth, which is at least the years of harvests as in Global_by_country.SetupTime"""
+    years_growth = np.maximum(np.asarray(years_growth, dtype=int), Carbon_calculator.Global_harvest.nyears - 1)
+    if np.any(years_growth >= Carbon_calculator.Global_growth.nyears):
+        raise ValueError(f"The years of growth {np.max(years_growth)} are beyond the {Carbon_calculator.Global_growth.nyears - 1} years simulated, run the model with a longer 'Years of growth'")
+    return years_growth + 1
+
+
+def global_at_years_growth(Global, years_growth):
+    """Parameters of the same country inputs and scenario settings, set up for another number of years of growth as a separate run"""
+    input_country = Global.input_country.assign(**{'Years of growth': int(years_growth)})
+    code = input_country['ISO'].values[0]
+    return Global_by_country.Parameters(input_country, Global_by_country.SetupTime(input_country, country_iso=code, nyears_run_control='growth'), country_iso=code,
+                                        discount_rate_input=Global.discount_rate_input, future_demand_level=Global.future_demand_level, substitution_mode=Global.substitution_mode,
+                                        vslp_input_control=Global.vslp_input_control, vslp_future_demand=Global.vslp_future_demand, secondary_mature_wood_share=Global.secondary_mature_wood_share,
+                                        plantation_growth_increase_ratio=Global.plantation_growth_increase_ratio, slash_rate_mode=Global.slash_rate_mode, dtype=Global.dtype, pool_storage=Global.pool_storage)
+
+
+def total_pdv_by_discount_rate(Carbon_calculator, discount_rates):
+    """
+    Created and Edited: 2023/06
+    Total PDV (mega tC) of the scenarios for a grid of discount rates, from the undiscounted annual flux kept by one carbon calculator run
+    The carbon calculator can be a CarbonCalculator, its cached result (Result_cache) or a CarbonCalculatorAtYearsGrowth
+    :param discount_rates: array of discount rates, e.g. np.arange(0, 0.1001, 0.0025)
+    :return: {name: array of the discount rates}, with the same names as the totals of the CarbonCalculator
+    """
+    discount_rates = np.atleast_1d(np.asarray(discount_rates, dtype=np.float64))
+    # (n_discount_rates, nyears_harvest) PDV of harvesting one hectare in year x
+    return _total_pdv(Carbon_calculator, [Tracker_result.discount_annual_flux(annual_flux, discounted_year[:, None], discount_rates)
+                                          for annual_flux, discounted_year in annual_flux_by_scenario(Carbon_calculator)])
+
+
+def total_pdv_by_years_growth(Carbon_calculator, years_growth, discount_rate=None, flux_memo=None):
+    """
+    Created and Edited: 2023/06
+    Total PDV (mega tC) of the scenarios for a grid of years of growth, the same as separate runs to each years of growth (see CarbonCalculatorAtYearsGrowth)
+    :param years_growth: array of years of growth, e.g. np.arange(40, 101, 10), at least the years of harvests and at most the years of growth of the run
+    :param discount_rate: default the discount rate of the run
+    :return: {name: array of the years of growth}, with the same names as the totals of the CarbonCalculator
+    """
+    discount_rate = Carbon_calculator.Global_growth.discount_rate if discount_rate is None else discount_rate
+    totals = [total_pdv_by_discount_rate(CarbonCalculatorAtYearsGrowth(Carbon_calculator, years, flux_memo=flux_memo), discount_rate) for years in np.atleast_1d(years_growth)]
+    return {name: np.concatenate([total[name] for total in totals]) for name in totals[0]}
+
+
+class CarbonCalculatorView:
+    """Carbon calculator result at another discount rate: the total PDV are recomputed from the annual flux, the other results are the carbon calculator's"""
+
+    def __init__(self, Carbon_calculator, discount_rate=None):
+        self.Carbon_calculator = Carbon_calculator
+        self.discount_rate = Carbon_calculator.Global_growth.discount_rate if discount_rate is None else discount_rate
+        # The annual flux are the carbon calculator's, or those set by a subclass before
+        for name, total in total_pdv_by_discount_rate(self, self.discount_rate).items():
+            setattr(self, name, total[0])
+
+    def __getattr__(self, name):
+        # Only called for the attributes not set above
+        if name == 'Carbon_calculator':
+            raise AttributeError(name)
+        return getattr(self.Carbon_calculator, name)
+
+
+class CarbonCalculatorAtYearsGrowth(CarbonCalculatorView):
+    """
+    Carbon calculator result at a shorter number of years of growth, the same as a separate run to these years of growth
+    The single harvest regrowth scenarios only have the products of the harvest in the starting year, their annual flux is the first years of the run's annual flux.
+    The plantation and conversion re-harvests (and the regrowth with thinning) use the product shares shifted by the starting year and cut at the run length,
+    so a shorter run has no products from the harvests after its last year: their annual flux is computed again to the years of growth.
+    The land area and the other results are the carbon calculator's, they do not depend on the years of growth.
+    """
+
+    def __init__(self, Carbon_calculator, years_growth, flux_memo=None):
+        nyears = int(_nyears_growth(Carbon_calculator, years_growth))
+        Global_growth = Carbon_calculator.Global_growth
+        if nyears < Global_growth.nyears:
+            Global_growth = global_at_years_growth(Global_growth, nyears - 1)
+        nyears_start = Carbon_calculator.Global_harvest.nyears
+
+        def scenario_flux(scenario, compute):
+            if nyears == Carbon_calculator.Global_growth.nyears:
+                return getattr(Carbon_calculator, f'annual_flux_{scenario}'), getattr(Carbon_calculator, f'discounted_year_{scenario}')
+            if flux_memo is None:
+                return compute()
+            return flux_memo.flux(scenario, Global_growth, nyears_start, compute)
+
+        def regrowth_flux(scenario, mature):
+            if Secondary_regrowth_closed_form.is_single_harvest(Global_growth):
+                return getattr(Carbon_calculator, f'annual_flux_{scenario}')[:nyears], getattr(Carbon_calculator, f'discounted_year_{scenario}')[:nyears]
+            return scenario_flux(scenario, lambda: (Secondary_regrowth_closed_form.annual_flux_matrix(Global_growth, nyears_start, mature=mature), Secondary_regrowth_closed_form.discounted_year(Global_growth)))
+
+        self.Global_growth = Global_growth
+        self.years_growth = nyears - 1
+        self.annual_flux_secondary_regrowth, self.discounted_year_secondary_regrowth = regrowth_flux('secondary_regrowth', False)
+        self.annual_flux_secondary_mature_regrowth, self.discounted_year_secondary_mature_regrowth = regrowth_flux('secondary_mature_regrowth', True)
+        self.annual_flux_secondary_conversion, self.discounted_year_secondary_conversion = scenario_flux('secondary_conversion', lambda: tracker_annual_flux(Secondary_conversion_scenario, Global_growth, nyears_start))
+        self.annual_flux_plantation, self.discounted_year_plantation = scenario_flux('plantation', lambda: tracker_annual_flux(Plantation_counterfactual_secondary_plantation_age_scenario, Global_growth, nyears_start))
+        super().__init__(Carbon_calculator)
 
 
 class CarbonCalculator:
 
-    def __init__(self, Global_harvest, Global_growth, Land_area):
+    def __init__(self, Global_harvest, Global_growth, Land_area, flux_memo=None):
         # set up the country profile
         self.Global_harvest = Global_harvest # this is for 100 years of length
         self.Global_growth = Global_growth # this is for 100 years of length
         self.Land_area = Land_area
         ### total PDV
-        self.calculate_total_present_discounted_value()
+        self.calculate_total_present_discounted_value(flux_memo=flux_memo)
 
-    def calculate_total_present_discounted_value(self):
+    def calculate_total_present_discounted_value(self, flux_memo=None):
             """
             - Number of plantation hectares harvested each year: area_harvested_plantation
             - Number of natural hectares harvested each year for BOTH the conversion and regrowth scenarios
@@ -47,31 +177,35 @@ class CarbonCalculator:
             # Initialize
             # nyears rows, nyears of columns
             # array dimension nyears_growth. Only place with nyears_growth
-            annual_discounted_value_nyears_plantation, annual_discounted_value_nyears_secondary_conversion, annual_discounted_value_nyears_secondary_regrowth, annual_discounted_value_nyears_secondary_mature_regrowth = [
-                    np.zeros((self.Global_growth.nyears, self.Global_harvest.nyears)) for _ in range(4)]
+            # 2023/06 Keep the undiscounted annual flux of each starting year, the discount rate and years of growth are only applied at the end (see total_pdv_by_discount_rate)
+            # A scenario variant that leaves the parameters of a scenario unchanged (e.g. the plantation growth increase for the secondary scenarios)
+            # reuses the annual flux of that scenario from the flux_memo (Result_cache.RunMemo)
+            def scenario_flux(scenario, compute):
+                if flux_memo is None:
+                    return compute()
+                return flux_memo.flux(scenario, self.Global_growth, self.Global_harvest.nyears, compute)
 
             # Get PDV values for the large matrix nyears+40 x nyears
             # This is number of years for product demand, only 2010-2050. As long as it is 100 years' PDV.
 
-            for year in range(self.Global_harvest.nyears):
-                # Run the carbon tracker
-                stand_result_year_secondary_regrowth = Secondary_regrowth_scenario.CarbonTracker(self.Global_growth, year_start_for_PDV=year)
-                stand_result_year_secondary_conversion = Secondary_conversion_scenario.CarbonTracker(self.Global_growth, year_start_for_PDV=year)
-                stand_result_year_plantation = Plantation_counterfactual_secondary_plantation_age_scenario.CarbonTracker(self.Global_growth, year_start_for_PDV=year)
-                stand_result_year_secondary_mature_regrowth = Secondary_mature_regrowth_scenario.CarbonTracker(self.Global_growth, year_start_for_PDV=year)
-                # Update the PDV per ha
-                # Every year, the annual discounted value are saved for each column
-                annual_discounted_value_nyears_secondary_regrowth[:, year] = stand_result_year_secondary_regrowth.annual_discounted_value[:]
-                annual_discounted_value_nyears_secondary_conversion[:, year] = stand_result_year_secondary_conversion.annual_discounted_value[:]
-                annual_discounted_value_nyears_plantation[:, year] = stand_result_year_plantation.annual_discounted_value[:]
-                annual_discounted_value_nyears_secondary_mature_regrowth[:, year] = stand_result_year_secondary_mature_regrowth.annual_discounted_value[:]
+            # 2023/06 The regrowth scenarios without thinning only have one harvest, all the starting years are evaluated at once in the closed form.
+            # With thinning, the closed form falls back to the carbon tracker per starting year.
+            self.annual_flux_secondary_regrowth, self.discounted_year_secondary_regrowth = scenario_flux('secondary_regrowth', lambda: (
+                Secondary_regrowth_closed_form.annual_flux_matrix(self.Global_growth, self.Global_harvest.nyears), Secondary_regrowth_closed_form.discounted_year(self.Global_growth)))
+            self.annual_flux_secondary_mature_regrowth, self.discounted_year_secondary_mature_regrowth = scenario_flux('secondary_mature_regrowth', lambda: (
+                Secondary_regrowth_closed_form.annual_flux_matrix(self.Global_growth, self.Global_harvest.nyears, mature=True), Secondary_regrowth_closed_form.discounted_year(self.Global_growth)))
+            # Run the carbon tracker for every starting year
+            self.annual_flux_secondary_conversion, self.discounted_year_secondary_conversion = scenario_flux('secondary_conversion', lambda: tracker_annual_flux(Secondary_conversion_scenario, self.Global_growth, self.Global_harvest.nyears))
+            self.annual_flux_plantation, self.discounted_year_plantation = scenario_flux('plantation', lambda: tracker_annual_flux(Plantation_counterfactual_secondary_plantation_age_scenario, self.Global_growth, self.Global_harvest.nyears))
 
+            annual_discounted_value_nyears_plantation, annual_discounted_value_nyears_secondary_conversion, annual_discounted_value_nyears_secondary_regrowth, annual_discounted_value_nyears_secondary_mature_regrowth = [
+                    (annual_flux / (1 + self.Global_growth.discount_rate) ** discounted_year[:, None]).astype(self.Global_growth.dtype) for annual_flux, discounted_year in annual_flux_by_scenario(self)]
 
             # Sum up the yearly values
-            self.pdv_yearly_plantation = np.sum(annual_discounted_value_nyears_plantation, axis=0)
-            self.pdv_yearly_secondary_conversion = np.sum(annual_discounted_value_nyears_secondary_conversion, axis=0)
-            self.pdv_yearly_secondary_regrowth = np.sum(annual_discounted_value_nyears_secondary_regrowth, axis=0)
-            self.pdv_yearly_secondary_mature_regrowth = np.sum(annual_discounted_value_nyears_secondary_mature_regrowth, axis=0)
+            self.pdv_yearly_plantation = np.sum(annual_discounted_value_nyears_plantation, axis=0, dtype=np.float64)
+            self.pdv_yearly_secondary_conversion = np.sum(annual_discounted_value_nyears_secondary_conversion, axis=0, dtype=np.float64)
+            self.pdv_yearly_secondary_regrowth = np.sum(annual_discounted_value_nyears_secondary_regrowth, axis=0, dtype=np.float64)
+            self.pdv_yearly_secondary_mature_regrowth = np.sum(annual_discounted_value_nyears_secondary_mature_regrowth, axis=0, dtype=np.float64)
 
             # First, let’s do the secondary PDV (regrowth; conversion) since that’s easier.
             # The total secondary PDV is simply equal to the number of secondary hectares harvested in year x multiplied by the PDV of harvesting one hectare in year x. We have to do this separately for the conversion and regrowth scenarios.
@@ -124,8 +258,8 @@ class CarbonCalculator:
 
         # 2022/02/02 wrong formula turn off
         # FIXME add the accumulate carbon, the end of 40 years of growth 2050 tC/ha for 40 years
-        self.total_C_stand_pool_cum_secondary_conversion = self.Land_area.area_harvested_new_secondary_conversion * Secondary_conversion_scenario.CarbonTracker(self.Global_harvest, year_start_for_PDV=0).totalC_stand_pool[-1]
-        self.total_C_stand_pool_cum_secondary_regrowth = self.Land_area.area_harvested_new_secondary_regrowth * Secondary_regrowth_scenario.CarbonTracker(self.Global_harvest,year_start_for_PDV=0).totalC_stand_pool[-1]
-        self.total_C_stand_pool_cum_secondary_mature_regrowth = self.Land_area.area_harvested_new_secondary_mature_regrowth * Secondary_mature_regrowth_scenario.CarbonTracker(self.Global_harvest, year_start_for_PDV=0).totalC_stand_pool[-1]
+        self.total_C_stand_pool_cum_secondary_conversion = self.Land_area.area_harvested_new_secondary_conversion * Secondary_conversion_scenario.CarbonTracker(self.Global_harvest, year_start_for_PDV=0, keep_intermediates=False).totalC_stand_pool[-1]
+        self.total_C_stand_pool_cum_secondary_regrowth = self.Land_area.area_harvested_new_secondary_regrowth * Secondary_regrowth_scenario.CarbonTracker(self.Global_harvest,year_start_for_PDV=0, keep_intermediates=False).totalC_stand_pool[-1]
+        self.total_C_stand_pool_cum_secondary_mature_regrowth = self.Land_area.area_harvested_new_secondary_mature_regrowth * Secondary_mature_regrowth_scenario.CarbonTracker(self.Global_harvest, year_start_for_PDV=0, keep_intermediates=False).totalC_stand_pool[-1]
         # add up regrowth and mature regrowth = tC yearly 2010-2050, each year the total accumulate carbon after 40 years of regrowth
         self.total_C_stand_pool_cum_secondary_regrowth_combined = self.total_C_stand_pool_cum_secondary_regrowth + self.total_C_stand_pool_cum_secondary_mature_regrowth
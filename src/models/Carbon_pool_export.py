@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+"""
+Export of the annual carbon pool series of the scenarios, without plotting
+Instead of plotting one country at a time (Carbon_pool_plot), the tracker results (Tracker_result) computed in the Driver runs
+are collected for all the countries, scenarios and output tabs, and written to one columnar file:
+one row per (output tab, country, scenario, year) and one column per pool,
+    stand, slash_root, products, landfill, methane, LLP_substitution, VSLP_substitution, total, counterfactual (tC/ha)
+The file is a parquet file if pyarrow is installed, otherwise a compressed npz with one array per column. read_pool_series reads both.
+
+Example:
+    run_model_all_scenarios('40', '4p', '20230125', root, export_pools=True)
+    pools = read_pool_series('../../data/processed/CHARM global - YR_40 - DR_4p - V20230125 - carbon pools.parquet')
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import os
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# Pool column: tracker result attribute, same pools as in Carbon_pool_plot
+POOLS = {'stand': 'totalC_stand_pool',
+         'slash_root': 'totalC_slash_root',
+         'products': 'totalC_product_pool',
+         'landfill': 'totalC_landfill_pool',
+         'methane': 'totalC_methane_emission',
+         'LLP_substitution': 'LLP_substitution_benefit',
+         'VSLP_substitution': 'VSLP_substitution_benefit',
+         'total': 'total_carbon_benefit',
+         'counterfactual': 'counterfactual_biomass'}
+ID_COLUMNS = ['tab', 'Country', 'ISO', 'scenario', 'year']
+# The first year of the series, the year 0 of the trackers is the initial state
+YEAR_START = 2010
+
+
+def pool_series(result):
+    """{pool: annual series} of a tracker result (or carbon tracker), without the initial year as in Carbon_pool_plot"""
+    return {pool: np.asarray(getattr(result, name)[1:], dtype=np.float64) for pool, name in POOLS.items()}
+
+
+class PoolSeriesStore:
+
+    def __init__(self):
+        """Pool series of the countries, one block of rows per (output tab, country, scenario)"""
+        self.blocks = []
+
+    def add(self, tabname, country, code, trackers):
+        """trackers: {scenario: tracker result} of one country, see the trackers argument of Driver.run_country_all_scenarios"""
+        for scenario, result in trackers.items():
+            self.blocks.append((tabname, country, code, scenario, pool_series(result)))
+
+    def to_frame(self):
+        if not self.blocks:
+            return pd.DataFrame(columns=ID_COLUMNS + list(POOLS))
+        nyears = [len(series['total']) for _, _, _, _, series in self.blocks]
+        columns = {name: np.repeat([block[i] for block in self.blocks], nyears) for i, name in enumerate(ID_COLUMNS[:-1])}
+        columns['year'] = np.concatenate([YEAR_START + np.arange(n) for n in nyears])
+        for pool in POOLS:
+            columns[pool] = np.concatenate([series[pool] for _, _, _, _, series in self.blocks])
+        return pd.DataFrame(columns)
+
+    def write(self, filename):
+        write_pool_series(filename, self.to_frame())
+
+
+def default_filename(datafile):
+    """'<data file name> - carbon pools.parquet' next to the data file, or .npz without pyarrow"""
+    return f"{os.path.splitext(datafile)[0]} - carbon pools.{'parquet' if pyarrow is not None else 'npz'}"
+
+
+def write_pool_series(filename, dataframe):
+    if filename.endswith('.parquet'):
+        dataframe.to_parquet(filename, index=False)
+    elif filename.endswith('.npz'):
+        # The text columns are saved as unicode arrays, so that the file is read without pickle
+        np.savez_compressed(filename, **{name: values.to_numpy(dtype=str if values.dtype == object else values.dtype) for name, values in dataframe.items()})
+    else:
+        raise ValueError(f"Unknown format of the carbon pool file '{filename}', please use .parquet or .npz")
+    print(f"Carbon pool series of {dataframe[['tab', 'ISO']].drop_duplicates().shape[0]} country runs written to {filename}")
+
+
+def read_pool_series(filename, columns=None):
+    """DataFrame of the pool series, or only the columns, e.g. ID_COLUMNS + ['stand', 'counterfactual']"""
+    if filename.endswith('.parquet'):
+        return pd.read_parquet(filename, columns=columns)
+    with np.load(filename) as data:
+        return pd.DataFrame({name: data[name] for name in (data.files if columns is None else columns)})
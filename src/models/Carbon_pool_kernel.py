@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+"""
+Carbon pool kernels
+Inner loops shared by the scenario carbon trackers and the land area calculator
+1. Decay of the harvested pools (products, slash, decaying roots) and the landfill recurrence
+2. Linear stand regrowth within a rotation cycle
+3. Zero forward fill (the "staircase" used for harvest stocks and output per ha)
+4. Area recursions of the land area calculator
+
+When numba is installed the loop versions are compiled with numba.njit, otherwise the vectorized NumPy versions are used.
+Set the environment variable CHARM_DISABLE_NUMBA=1 to force the NumPy versions.
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import os
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+NUMBA_ENABLED = (numba is not None) and (os.environ.get('CHARM_DISABLE_NUMBA', '0').lower() not in ['1', 'true', 'yes'])
+
+
+######################## Harvested pools decay ##############################
+
+def _decay_harvested_pools_numpy(product_LLP_pool, product_SLP_pool, slash_pool, belowground_biomass_decay, landfill_cumulative, landfill_pool, landfill_emission, landfill_methane_emission,
+                                 half_life_LLP, half_life_SLP, half_life_slash, half_life_root, half_life_landfill, slash_burn, landfill_methane_ratio):
+    """
+    All the arrays are the rows of one cycle starting at the year of harvest/thinning (index 0), which holds the harvested quantities.
+    The pools are decayed from index 1 until the end of the row, in place.
+    """
+    nyears_after_harvest = np.arange(1, product_LLP_pool.shape[0])
+    if nyears_after_harvest.shape[0] == 0:
+        return
+    ### Product pool
+    product_LLP_pool[1:] = product_LLP_pool[0] * np.exp(- np.log(2) / half_life_LLP * nyears_after_harvest)
+    product_SLP_pool[1:] = product_SLP_pool[0] * np.exp(- np.log(2) / half_life_SLP * nyears_after_harvest)
+    # Slash is burnt the next year, so there is a jump the year after the harvest
+    slash_pool[1:] = slash_pool[0] * (1 - slash_burn) * np.exp(- np.log(2) / half_life_slash * nyears_after_harvest)
+    belowground_biomass_decay[1:] = belowground_biomass_decay[0] * np.exp(- np.log(2) / half_life_root * nyears_after_harvest)
+
+    ### Landfill pool
+    # Landfill cumulative = landfill pool of the previous year + LLP product pool yearly difference deltaC: C(yr-1) - C(yr)
+    # Landfill pool = cumulative amount in landfill * retention, so pool(yr) = retention * (pool(yr-1) + deltaC(yr)) with pool(harvest year) = 0.
+    # The recurrence is solved as a convolution of deltaC with the powers of the retention.
+    retention = np.exp(-np.log(2) / half_life_landfill)
+    product_LLP_diff = product_LLP_pool[:-1] - product_LLP_pool[1:]
+    landfill_pool[1:] = np.convolve(product_LLP_diff, retention ** nyears_after_harvest)[:nyears_after_harvest.shape[0]]
+    landfill_cumulative[1:] = landfill_pool[:-1] + product_LLP_diff
+    # Landfill carbon and methane emission, Methane is a stronger GHG, 34 times over CO2
+    landfill_emission[1:] = landfill_cumulative[1:] * (1 - retention)
+    landfill_methane_emission[1:] = - landfill_emission[1:] * landfill_methane_ratio * 34 * 12 / 44
+
+
+def _decay_harvested_pools_loop(product_LLP_pool, product_SLP_pool, slash_pool, belowground_biomass_decay, landfill_cumulative, landfill_pool, landfill_emission, landfill_methane_emission,
+                                half_life_LLP, half_life_SLP, half_life_slash, half_life_root, half_life_landfill, slash_burn, landfill_methane_ratio):
+    """Same as _decay_harvested_pools_numpy, written as the year by year loop for numba"""
+    retention = np.exp(-np.log(2) / half_life_landfill)
+    for year in range(1, product_LLP_pool.shape[0]):
+        product_LLP_pool[year] = product_LLP_pool[0] * np.exp(- np.log(2) / half_life_LLP * year)
+        product_SLP_pool[year] = product_SLP_pool[0] * np.exp(- np.log(2) / half_life_SLP * year)
+        slash_pool[year] = slash_pool[0] * (1 - slash_burn) * np.exp(- np.log(2) / half_life_slash * year)
+        belowground_biomass_decay[year] = belowground_biomass_decay[0] * np.exp(- np.log(2) / half_life_root * year)
+
+        landfill_cumulative[year] = landfill_pool[year - 1] + product_LLP_pool[year - 1] - product_LLP_pool[year]
+        landfill_pool[year] = landfill_cumulative[year] * retention
+        landfill_emission[year] = landfill_cumulative[year] * (1 - retention)
+        landfill_methane_emission[year] = - landfill_emission[year] * landfill_methane_ratio * 34 * 12 / 44
+
+
+######################## Stand regrowth ##############################
+
+def _regrow_stand_linear_numpy(aboveground_biomass, growth):
+    """
+    aboveground_biomass is the row of one cycle starting at the year of harvest/thinning (index 0 is the leftover after harvest).
+    growth[i] is the growth added in year i + 1 of the row. The row is filled in place.
+    """
+    # Cumulative sum with the leftover in front keeps the same order of additions as the year by year loop
+    aboveground_biomass[1:] = np.cumsum(np.concatenate((aboveground_biomass[:1], growth)))[1:]
+
+
+def plantation_growth(years, year_index_harvest, GR_young, GR_old):
+    """
+    Growth of the plantation in each of the years: young growth rate for 20 years after the latest harvest, old growth rate afterwards
+    """
+    year_index_harvest = np.sort(np.asarray(year_index_harvest))
+    year_latest_harvest = year_index_harvest[np.searchsorted(year_index_harvest, years, side='left') - 1]
+    return np.where(years - year_latest_harvest <= 20, GR_young, GR_old)
+
+
+def _regrow_stand_linear_loop(aboveground_biomass, growth):
+    """Same as _regrow_stand_linear_numpy, written as the year by year loop for numba"""
+    for year in range(1, aboveground_biomass.shape[0]):
+        aboveground_biomass[year] = aboveground_biomass[year - 1] + growth[year - 1]
+
+
+######################## Staircase ##############################
+
+def forward_fill_zeros(array):
+    """
+    Piecewise array for aboveground biomass actually harvested/thinned during rotation harvest/thinning
+    Zeros are replaced by the previous non-zero value along the last axis, the same as pandas replace(to_replace=0, method='ffill') row by row.
+    Leading zeros remain zero.
+    """
+    if hasattr(array, 'map_rows'):
+        # Banded per cycle pool matrix (Cycle_pool_matrix), fill each cycle from its year of harvest/thinning
+        return array.map_rows(forward_fill_zeros)
+    array = np.asarray(array)
+    index = np.where(array != 0, np.arange(array.shape[-1]), 0)
+    np.maximum.accumulate(index, axis=-1, out=index)
+    return np.take_along_axis(array, index, axis=-1)
+
+
+######################## Land area recursions ##############################
+
+def _cycle_year_offsets(year_index_both, nyears):
+    """Cumulative cycle lengths, offsets[i] is the number of years from the first harvest to the harvest/thinning of cycle i"""
+    year_index_harvest_thinning = np.append(np.asarray(year_index_both, dtype=np.int64), nyears)
+    cycle_lengths = np.diff(year_index_harvest_thinning)
+    return np.concatenate((np.zeros(1, dtype=np.int64), np.cumsum(cycle_lengths)))
+
+
+def _new_area_secondary_numpy(output_need_secondary, wood_thinning_accumulate, output_ha_secondary, year_index_both, nyears):
+    """
+    Area of secondary forest newly harvested every year and the wood from the re-harvests/thinnings of the area harvested in previous cycles
+    A year only depends on the area harvested at least one previous cycle length before, so the years are calculated in blocks of that length.
+    """
+    ncycles = len(year_index_both)
+    offsets = _cycle_year_offsets(year_index_both, nyears)
+    area_harvested_new_secondary = np.zeros((nyears))
+    wood_harvest_accumulate_secondary = np.zeros((nyears))
+
+    for current_cycle in range(0, ncycles):
+        ### st year and end year of each period, shift -1 to remove the first initial condition
+        st_cycle = year_index_both[current_cycle] - 1
+        ed_cycle = year_index_both[current_cycle + 1] - 1 if current_cycle < ncycles - 1 else nyears
+        # The shortest lag to a previous cycle is the length of the cycle just before
+        block_length = offsets[current_cycle] - offsets[current_cycle - 1] if current_cycle > 0 else max(ed_cycle - st_cycle, 1)
+        for st_block in range(st_cycle, ed_cycle, block_length):
+            years = np.arange(st_block, min(st_block + block_length, ed_cycle))
+            for previous_cycle in range(0, current_cycle):
+                Nyears_Ncycles_before = offsets[current_cycle] - offsets[previous_cycle]
+                Nyears_Ncycles_ahead = offsets[previous_cycle]
+                wood_harvest_accumulate_secondary[years] += area_harvested_new_secondary[years - Nyears_Ncycles_before] * output_ha_secondary[years, years - Nyears_Ncycles_ahead]
+            # !!!! divide by output from first harvest !!!!
+            output_need_new = output_need_secondary[years] - wood_harvest_accumulate_secondary[years] - wood_thinning_accumulate[years]
+            years_new_area = output_need_new > 0
+            area_harvested_new_secondary[years[years_new_area]] = output_need_new[years_new_area] / output_ha_secondary[years[years_new_area], 0]
+
+    return area_harvested_new_secondary, wood_harvest_accumulate_secondary
+
+
+def _new_area_secondary_loop(output_need_secondary, wood_thinning_accumulate, output_ha_secondary, year_index_both, nyears):
+    """Same as _new_area_secondary_numpy, written as the year by year loop for numba"""
+    ncycles = year_index_both.shape[0]
+    offsets = np.zeros(ncycles + 1, dtype=np.int64)
+    for cycle in range(ncycles):
+        cycle_end = year_index_both[cycle + 1] if cycle < ncycles - 1 else nyears
+        offsets[cycle + 1] = offsets[cycle] + cycle_end - year_index_both[cycle]
+    area_harvested_new_secondary = np.zeros((nyears))
+    wood_harvest_accumulate_secondary = np.zeros((nyears))
+
+    for current_cycle in range(0, ncycles):
+        st_cycle = year_index_both[current_cycle] - 1
+        ed_cycle = year_index_both[current_cycle + 1] - 1 if current_cycle < ncycles - 1 else nyears
+        for year in range(st_cycle, ed_cycle):
+            for previous_cycle in range(0, current_cycle):
+                Nyears_Ncycles_before = offsets[current_cycle] - offsets[previous_cycle]
+                Nyears_Ncycles_ahead = offsets[previous_cycle]
+                wood_harvest_accumulate_secondary[year] = wood_harvest_accumulate_secondary[year] + area_harvested_new_secondary[year - Nyears_Ncycles_before] * output_ha_secondary[year, year - Nyears_Ncycles_ahead]
+            output_need_new = output_need_secondary[year] - wood_harvest_accumulate_secondary[year] - wood_thinning_accumulate[year]
+            if output_need_new > 0:
+                area_harvested_new_secondary[year] = output_need_new / output_ha_secondary[year, 0]
+            else:
+                area_harvested_new_secondary[year] = 0
+
+    return area_harvested_new_secondary, wood_harvest_accumulate_secondary
+
+
+def _thinning_accumulate_numpy(area_harvested_plantation, output_ha_plantation_thinning, year_index_thinning, nyears):
+    """
+    Wood from the thinnings of the plantation area harvested in the previous cycles
+    year_index_thinning starts with 1 and ends with nyears, as prepared by the land area calculator
+    """
+    ncycles_thinning = len(year_index_thinning) - 1
+    offsets = np.concatenate((np.zeros(1, dtype=np.int64), np.cumsum(np.diff(year_index_thinning))))
+    wood_thinning_accumulate_plantation = np.zeros((nyears))
+
+    for current_cycle in range(0, ncycles_thinning):
+        st_cycle = year_index_thinning[current_cycle] - 1
+        ed_cycle = year_index_thinning[current_cycle + 1] - 1 if current_cycle < ncycles_thinning - 1 else nyears
+        years = np.arange(st_cycle, ed_cycle)
+        for previous_cycle in range(0, current_cycle):
+            Nyears_Ncycles_before = offsets[current_cycle] - offsets[previous_cycle]
+            Nyears_Ncycles_ahead = offsets[previous_cycle]
+            # staggered array only for thinning production output
+            wood_thinning_accumulate_plantation[years] += area_harvested_plantation[years - Nyears_Ncycles_before] * output_ha_plantation_thinning[years - Nyears_Ncycles_ahead]
+
+    return wood_thinning_accumulate_plantation
+
+
+def _thinning_accumulate_loop(area_harvested_plantation, output_ha_plantation_thinning, year_index_thinning, nyears):
+    """Same as _thinning_accumulate_numpy, written as the year by year loop for numba"""
+    ncycles_thinning = year_index_thinning.shape[0] - 1
+    wood_thinning_accumulate_plantation = np.zeros((nyears))
+
+    for current_cycle in range(0, ncycles_thinning):
+        st_cycle = year_index_thinning[current_cycle] - 1
+        ed_cycle = year_index_thinning[current_cycle + 1] - 1 if current_cycle < ncycles_thinning - 1 else nyears
+        for year in range(st_cycle, ed_cycle):
+            for previous_cycle in range(0, current_cycle):
+                Nyears_Ncycles_before = year_index_thinning[current_cycle] - year_index_thinning[previous_cycle]
+                Nyears_Ncycles_ahead = year_index_thinning[previous_cycle] - year_index_thinning[0]
+                wood_thinning_accumulate_plantation[year] = wood_thinning_accumulate_plantation[year] + area_harvested_plantation[year - Nyears_Ncycles_before] * output_ha_plantation_thinning[year - Nyears_Ncycles_ahead]
+
+    return wood_thinning_accumulate_plantation
+
+
+######################## Kernel selection ##############################
+
+if NUMBA_ENABLED:
+    _decay_harvested_pools = numba.njit(cache=True)(_decay_harvested_pools_loop)
+    _regrow_stand_linear = numba.njit(cache=True)(_regrow_stand_linear_loop)
+    _new_area_secondary = numba.njit(cache=True)(_new_area_secondary_loop)
+    _thinning_accumulate = numba.njit(cache=True)(_thinning_accumulate_loop)
+else:
+    _decay_harvested_pools = _decay_harvested_pools_numpy
+    _regrow_stand_linear = _regrow_stand_linear_numpy
+    _new_area_secondary = _new_area_secondary_numpy
+    _thinning_accumulate = _thinning_accumulate_numpy
+
+
+def decay_harvested_pools(product_LLP_pool, product_SLP_pool, slash_pool, belowground_biomass_decay, landfill_cumulative, landfill_pool, landfill_emission, landfill_methane_emission, Global):
+    """
+    Decay the product, slash, decaying root and landfill pools of one cycle in place.
+    The arrays are the cycle rows from the year of harvest/thinning to the end of the array.
+    """
+    _decay_harvested_pools(product_LLP_pool, product_SLP_pool, slash_pool, belowground_biomass_decay, landfill_cumulative, landfill_pool, landfill_emission, landfill_methane_emission,
+                           float(Global.half_life_LLP), float(Global.half_life_SLP), float(Global.half_life_slash), float(Global.half_life_root), float(Global.half_life_landfill),
+                           float(Global.slash_burn), float(Global.landfill_methane_ratio))
+
+
+def regrow_stand_linear(aboveground_biomass, growth):
+    """Grow the stand of one cycle in place, from the leftover at index 0, adding growth[i] in year i + 1"""
+    _regrow_stand_linear(aboveground_biomass, np.asarray(growth, dtype=aboveground_biomass.dtype))
+
+
+def new_area_secondary(output_need_secondary, wood_thinning_accumulate, output_ha_secondary, year_index_both, nyears):
+    """Area recursion of the secondary forest scenarios, returns the new area harvested and the wood from the re-harvests"""
+    return _new_area_secondary(np.asarray(output_need_secondary, dtype=np.float64), np.asarray(wood_thinning_accumulate, dtype=np.float64),
+                               np.ascontiguousarray(output_ha_secondary, dtype=np.float64), np.asarray(year_index_both, dtype=np.int64), int(nyears))
+
+
+def thinning_accumulate(area_harvested_plantation, output_ha_plantation_thinning, year_index_thinning, nyears):
+    """Area recursion of the plantation thinnings, returns the wood from the thinnings of the area harvested in the previous cycles"""
+    return _thinning_accumulate(np.asarray(area_harvested_plantation, dtype=np.float64), np.asarray(output_ha_plantation_thinning, dtype=np.float64),
+                                np.asarray(year_index_thinning, dtype=np.int64), int(nyears))
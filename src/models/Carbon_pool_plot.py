@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Plot of the carbon pools of a carbon tracker (the scenario modules), with the counterfactual and the PDV
+matplotlib is only imported here, so that the model runs (e.g. in the worker processes) do not import it.
+Without a display, matplotlib uses a non-interactive backend (Agg).
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import numpy as np
+import pandas as pd
+import matplotlib.pyplot as plt
+
+
+def plot_C_pools_counterfactual_print_PDV(tracker):
+    """tracker: CarbonTracker of a scenario module, with the intermediates (keep_intermediates=True)"""
+    present_discounted_carbon_fullperiod = np.sum(tracker.annual_discounted_value)
+    print('PDV (tC/ha): ', present_discounted_carbon_fullperiod)
+
+    nyears = tracker.Global.nyears
+    df_stack = pd.DataFrame({'Displaced VSLP emissions': tracker.VSLP_substitution_benefit[1:],
+                             'Displaced concrete & steel emissions': tracker.LLP_substitution_benefit[1:],
+                             'Live tree stand & root storage': tracker.totalC_stand_pool[1:],
+                             'Slash & decaying root storage': tracker.totalC_slash_root[1:],
+                             'Wood products storage': tracker.totalC_product_pool[1:],
+                             'Landfill storage': tracker.totalC_landfill_pool[1:],
+                             'Methane emission': tracker.totalC_methane_emission[1:]
+                             }, index=np.arange(2010, 2010 + nyears))
+    df_line = pd.DataFrame({'Non-harvest scenario': tracker.counterfactual_biomass[1:],
+                            'Harvest scenario - total carbon (all pools)': tracker.total_carbon_benefit[1:]},
+                           index=np.arange(2010, 2010 + nyears))
+
+    colornames = ['Brown', 'Darkgrey', 'DarkGreen', 'Sienna', 'Goldenrod', 'Darkorange', 'Steelblue']
+
+    # Positive carbon flux
+    fig, ax = plt.subplots(figsize=(11, 5))
+    plt.stackplot(df_stack.index, df_stack['Displaced VSLP emissions'],df_stack['Displaced concrete & steel emissions'],
+                  df_stack['Live tree stand & root storage'], df_stack['Slash & decaying root storage'],
+                  df_stack['Wood products storage'], df_stack['Landfill storage'], labels=df_stack.columns,
+                  colors=colornames[:-1])
+    # Negative carbon flux
+    # plt.stackplot(df_stack.index, df_stack['Methane emission'], labels=['Methane emission'], color=colornames[-1])
+    plt.stackplot(df_stack.index, df_stack['Methane emission'], labels=[''], color=colornames[-1])
+
+    # Two lines
+    df_line.plot(ax=ax, style=['--', '-'], color=["limegreen", "k"], lw=2.5, legend=False)
+    ax.set_ylabel('Carbon storage (tCeq/ha)', fontsize=18)
+    ax.set_xlabel('Year', fontsize=18)
+    ax.tick_params(axis='both', which='major', labelsize=16)
+    ax.annotate('PDV including substitution: {:.1f} tCeq/ha'.format(present_discounted_carbon_fullperiod), xy=(0.05, 0.84),
+                xycoords='axes fraction', fontsize=11, fontweight='bold')
+
+    ax.set_title(tracker.Global.country_name, fontsize=16)
+
+    handles, labels = ax.get_legend_handles_labels()
+    # fig.legend(handles, labels, loc=(0.68, 0.04), fontsize=12)
+    fig.legend(handles[:2], labels[:2], loc=(0.62, 0.6), fontsize=11, frameon=False)
+    fig.legend(handles[2:], labels[2:], loc=(0.62, 0.2), fontsize=11, title='Subpools in harvest scenario',
+               title_fontsize=11, frameon=False)
+
+    fig.tight_layout()
+    fig.subplots_adjust(top=0.82, right=0.6, left=0.1)
+    plt.show(); exit()
+
+    return
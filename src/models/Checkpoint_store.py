@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Checkpoints of the Driver runs per (output tab, country)
+Each country's output row is saved as soon as it is computed, under ./data/interim/checkpoints/<data file name>/<output tab>/<ISO>.json,
+together with the run manifest digest of the country (inputs, run settings and code, see Run_manifest).
+With resume, a country with a checkpoint of the same digest is not recomputed, so a long sweep interrupted by a crash or preemption
+restarts from the last completed country. The checkpoints of a data file are removed when its run completes.
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import os
+import json
+import shutil
+import numpy as np
+
+
+class CheckpointStore:
+
+    def __init__(self, path, datafile):
+        # One folder per data file, e.g. the sensitivity experiments have their own checkpoints
+        self.directory = os.path.join(f'{path}/data/interim/checkpoints', os.path.splitext(os.path.basename(datafile))[0])
+
+    def _filename(self, tabname, code):
+        return os.path.join(self.directory, tabname, f'{code}.json')
+
+    def load(self, tabname, code, digest):
+        """Output row of a completed country, None if there is no checkpoint of the same digest"""
+        filename = self._filename(tabname, code)
+        if not os.path.exists(filename):
+            return None
+        with open(filename) as f:
+            checkpoint = json.load(f)
+        if checkpoint['digest'] != digest:
+            return None
+        return checkpoint['output_row']
+
+    def save(self, tabname, code, digest, output_row):
+        filename = self._filename(tabname, code)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # json keeps the full float precision of the results
+        output_row = {name: (value.item() if isinstance(value, np.generic) else value) for name, value in output_row.items()}
+        # Write to a temporary file first so that an interrupted run does not leave a broken checkpoint
+        with open(filename + '.tmp', 'w') as f:
+            json.dump({'digest': digest, 'output_row': output_row}, f)
+        os.replace(filename + '.tmp', filename)
+
+    def clear(self):
+        """Remove the checkpoints of the data file"""
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Banded storage for the per cycle carbon pool matrices of the carbon trackers
+Each cycle (harvest/thinning) only has carbon in its pools from the year of harvest/thinning onward, the years before are always zero.
+The dense (ncycles, arraylength) matrix is replaced by one band per cycle from the year of harvest/thinning until the end of the array, stored back to back in one flat array.
+The memory grows with the number of non-zero entries instead of ncycles x arraylength.
+
+The matrix supports what the carbon trackers use:
+- matrix[cycle, year] read/write
+- matrix[cycle, start:end] read/write, a view into the band when start is within the band, otherwise a read-only copy
+- np.sum(matrix, axis=0) for the total pools
+- forward fill of the zeros per cycle for the staircase
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import numpy as np
+
+
+class CyclePoolMatrix:
+
+    ndim = 2
+
+    def __init__(self, band_start, arraylength, dtype=np.float64):
+        """
+        band_start: the first year with carbon for each cycle, i.e. the year of harvest/thinning (0 for the first cycle which holds the initial condition)
+        arraylength: number of columns of the equivalent dense matrix
+        """
+        self.band_start = np.asarray(band_start, dtype=int)
+        self.arraylength = arraylength
+        self.dtype = np.dtype(dtype)
+        self.shape = (len(self.band_start), arraylength)
+        # Offsets of each band in the flat storage array
+        self.band_offset = np.concatenate(([0], np.cumsum(arraylength - self.band_start)))
+        self.data = np.zeros(self.band_offset[-1], dtype=self.dtype)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def row(self, cycle):
+        """View of the band of one cycle, starting at band_start[cycle]"""
+        return self.data[self.band_offset[cycle]:self.band_offset[cycle + 1]]
+
+    def _locate(self, key):
+        cycle, year = key
+        if cycle < 0:
+            cycle = cycle + self.shape[0]
+        return cycle, self.row(cycle), self.band_start[cycle]
+
+    def __getitem__(self, key):
+        cycle, band, start = self._locate(key)
+        year = key[1]
+        if isinstance(year, slice):
+            year_start, year_end, step = year.indices(self.arraylength)
+            if year_start >= start and step == 1:
+                return band[year_start - start:max(year_end - start, year_start - start)]
+            # Part of the slice is before the band, return a read-only dense copy so that an in-place write through it raises instead of being lost
+            values = self.toarray()[cycle, year]
+            values.setflags(write=False)
+            return values
+        if year < 0:
+            year = year + self.arraylength
+        if year < start:
+            return self.dtype.type(0)
+        return band[year - start]
+
+    def __setitem__(self, key, value):
+        cycle, band, start = self._locate(key)
+        year = key[1]
+        if isinstance(year, slice):
+            year_start, year_end, step = year.indices(self.arraylength)
+            if year_start < start or step != 1:
+                raise IndexError(f"Cycle {cycle} only stores years from {start}, cannot assign to {year}")
+            band[year_start - start:max(year_end - start, year_start - start)] = value
+            return
+        if year < 0:
+            year = year + self.arraylength
+        if year < start:
+            if value != 0:
+                raise IndexError(f"Cycle {cycle} only stores years from {start}, cannot assign to year {year}")
+            return
+        band[year - start] = value
+
+    def sum(self, axis=None, dtype=None, out=None, **kwargs):
+        """Sum over the cycles (axis=0) gives the dense total pool per year, the same as np.sum of the dense matrix"""
+        if axis is None:
+            return np.sum(self.data, dtype=dtype)
+        if axis not in (0, -2):
+            return np.sum(self.toarray(), axis=axis, dtype=dtype, out=out)
+        total = np.zeros(self.arraylength, dtype=dtype if dtype is not None else self.dtype) if out is None else out
+        if out is not None:
+            total[:] = 0
+        for cycle in range(self.shape[0]):
+            total[self.band_start[cycle]:] += self.row(cycle)
+        return total
+
+    def map_rows(self, func):
+        """New matrix with func applied to the band of each cycle, e.g. the forward fill of the staircase. func must keep the band length."""
+        outmatrix = CyclePoolMatrix(self.band_start, self.arraylength, dtype=self.dtype)
+        for cycle in range(self.shape[0]):
+            outmatrix.row(cycle)[:] = func(self.row(cycle))
+        return outmatrix
+
+    def toarray(self):
+        """Dense (ncycles, arraylength) copy"""
+        outarray = np.zeros(self.shape, dtype=self.dtype)
+        for cycle in range(self.shape[0]):
+            outarray[cycle, self.band_start[cycle]:] = self.row(cycle)
+        return outarray
+
+    def __array__(self, dtype=None):
+        outarray = self.toarray()
+        return outarray if dtype is None else outarray.astype(dtype)
+
+
+def allocate(Global, year_index_both):
+    """
+    Zero pool matrix of (ncycles, arraylength) for the cycles in year_index_both
+    The storage is selected by Global.pool_storage: 'dense' numpy array or 'banded' CyclePoolMatrix
+    """
+    if Global.pool_storage == 'banded':
+        # The first cycle holds the initial condition in year 0
+        band_start = [0] + list(year_index_both[1:])
+        return CyclePoolMatrix(band_start, Global.arraylength, dtype=Global.dtype)
+    else:
+        return np.zeros((len(year_index_both), Global.arraylength), dtype=Global.dtype)
@@ -11,26 +11,429 @@ __email__ = "liqing.peng@wri.org"
 __version__ = "1.0"
 
 
+import time
 import numpy as np
 import pandas as pd
-import Global_by_country, Plantation_counterfactual_secondary_plantation_age_scenario, Secondary_conversion_scenario, Secondary_regrowth_scenario, Secondary_mature_regrowth_scenario, Agricultural_land_tropical_scenario, Land_area_calculator, Carbon_cost_calculator
+import Global_by_country, Plantation_counterfactual_secondary_plantation_age_scenario, Secondary_conversion_scenario, Secondary_regrowth_scenario, Secondary_mature_regrowth_scenario, Agricultural_land_tropical_scenario, Carbon_cost_calculator
+import Tracker_result, Run_manifest, Result_cache, Checkpoint_store, Result_stream, Carbon_pool_export
 
 
-def run_model_all_scenarios(years, discount_rate, version, path):
+def has_complete_inputs(input_country):
+    """Test if all the parameters are set up for the country's row of the Inputs table, except the LLP substitution factor which is calculated"""
+    input_country = input_country.drop(['Emissions substitution factor for LLP (tC saved/tons C in LLP)'], axis=1)
+    return not input_country.isnull().values.any()
+
+
+def result_at(result, discount_rate=None, years_growth=None, flux_memo=None):
+    """
+    Tracker result (Tracker_result) or carbon calculator result at another discount rate or a shorter number of years of growth, the same as a separate run
+    flux_memo: Result_cache.RunMemo of the country run, so that the scenario variants share the annual flux re-run for the shorter years of growth
+    """
+    if isinstance(result, Tracker_result.TrackerResult):
+        # The PDV per ha are run for the years of harvests, they do not depend on the years of growth
+        return result if discount_rate is None else result.at_discount_rate(discount_rate)
+    if years_growth is not None:
+        result = Carbon_cost_calculator.CarbonCalculatorAtYearsGrowth(result, years_growth, flux_memo=flux_memo)
+    return result if discount_rate is None else Carbon_cost_calculator.CarbonCalculatorView(result, discount_rate=discount_rate)
+
+
+def output_rows_by_setting(prepare_output, results, discount_rates=None, years_growth=None, flux_memo=None):
+    """
+    Created and Edited: 2023/06
+    The output row of the results, or one output row per discount rate and number of years of growth.
+    The discount rate only enters the PDV at the end, as the discounting of the annual flux, so all the discount rates come from one run.
+    The shorter years of growth take the first years of the annual flux of the single harvest regrowth scenarios,
+    the other scenarios are run again once per years of growth (see Carbon_cost_calculator.CarbonCalculatorAtYearsGrowth).
+    """
+    if discount_rates is None and years_growth is None:
+        return prepare_output(*results)
+    results_by_years = {years: [result_at(result, years_growth=years, flux_memo=flux_memo) for result in results] for years in ([None] if years_growth is None else years_growth)}
+    output_rows = []
+    for discount_rate in ([None] if discount_rates is None else discount_rates):
+        for years, results_years in results_by_years.items():
+            output_row = prepare_output(*[result_at(result, discount_rate) for result in results_years])
+            settings = {'Discount rate': discount_rate, 'Years of growth': years}
+            output_rows.append({'Country': output_row['Country'], 'ISO': output_row['ISO'], **{name: value for name, value in settings.items() if value is not None}, **output_row})
+    return output_rows
+
+
+def run_country_all_scenarios(datafile, country, code, future_demand_level_input='BAU', substitution_mode_input='SUBON', vslp_input_control_input='ALL', dtype='float64', pool_storage='dense', cache=None, discount_rates=None, years_growth=None, trackers=None):
+    """
+    Created and Edited: 2023/06
+    Run all the scenarios for one country, split from run_model_all_scenarios so that a country can be re-run on its own
+    :param pool_storage: 'dense' (default) or 'banded' storage of the per cycle carbon pool matrices, see Global_by_country.Parameters
+    :param cache: Result_cache.ResultCache of the land area and carbon cost results, None to compute without the cache
+    :param discount_rates: list of discount rates to apply to the same run instead of the discount rate of the data file
+    :param years_growth: list of years of growth up to the 'Years of growth' of the data file, each row the same as a separate run
+    :param trackers: dict filled with the tracker results of the scenarios {scenario: Tracker_result.TrackerResult}, e.g. for Carbon_pool_export
+    :return: the country's row of the output tab, {column name: value}, or a list of rows with the 'Discount rate' and 'Years of growth' for discount_rates and years_growth
+    """
+    ################################### Execute model runs ##################################
+    # 2023/06 The scenario variants with the same effective parameters as a computed one reuse its results
+    memo = Result_cache.RunMemo(cache)
+    nyears_harvest_settings = Global_by_country.SetupTime(datafile, country_iso=code, nyears_run_control='harvest')
+    nyears_growth_settings = Global_by_country.SetupTime(datafile, country_iso=code, nyears_run_control='growth')
+    ### Default plantation scenarios, (1) secondary harvest regrowth and (2) conversion
+    ### Read in global parameters ###
+    global_harvest_settings = Global_by_country.Parameters(datafile, nyears_harvest_settings,
+                                                            country_iso=code,
+                                                           future_demand_level=future_demand_level_input,
+                                                           substitution_mode=substitution_mode_input,
+                                                           vslp_input_control=vslp_input_control_input, dtype=dtype, pool_storage=pool_storage)
+    global_growth_settings = Global_by_country.Parameters(datafile, nyears_growth_settings,
+                                                           country_iso=code,
+                                                           future_demand_level=future_demand_level_input,
+                                                           substitution_mode=substitution_mode_input,
+                                                           vslp_input_control=vslp_input_control_input, dtype=dtype, pool_storage=pool_storage)
+    # run different policy scenarios
+    result_plantation_default = memo.tracker(Plantation_counterfactual_secondary_plantation_age_scenario, global_harvest_settings)
+    result_conversion_default = memo.tracker(Secondary_conversion_scenario, global_harvest_settings)
+    result_regrowth_default = memo.tracker(Secondary_regrowth_scenario, global_harvest_settings)
+    result_agriland_default = memo.tracker(Agricultural_land_tropical_scenario, global_harvest_settings)
+
+    # run the land area calculator
+    LAC_default = memo.land_calculator(global_harvest_settings)
+    if global_harvest_settings.rotation_length_harvest <= 10:
+        output_ha_agriland_default = LAC_default.output_ha_agriland[global_harvest_settings.year_index_harvest_plantation[1]-1]
+    else:
+        output_ha_agriland_default = 0
+    # run the carbon cost calculator
+    CCC_default = memo.carbon_calculator(global_harvest_settings, global_growth_settings, LAC_default)
+
+
+    ### scenario (3) secondary harvest regrowth: 50% middle aged and 50% mature secondary forest
+    ### Read in global parameters ###
+    global_harvest_settings = Global_by_country.Parameters(datafile, nyears_harvest_settings,
+                                                           country_iso=code,
+                                                   future_demand_level=future_demand_level_input,
+                                                   substitution_mode=substitution_mode_input,
+                                                   vslp_input_control=vslp_input_control_input, dtype=dtype, pool_storage=pool_storage,
+                                                   secondary_mature_wood_share=0.5)
+    global_growth_settings = Global_by_country.Parameters(datafile, nyears_growth_settings,
+                                                           country_iso=code,
+                                                           future_demand_level=future_demand_level_input,
+                                                           substitution_mode=substitution_mode_input,
+                                                           vslp_input_control=vslp_input_control_input, dtype=dtype, pool_storage=pool_storage,
+                                                           secondary_mature_wood_share=0.5)
+    # run different policy scenarios
+    # result_plantation_mixture = Plantation_counterfactual_secondary_plantation_age_scenario.CarbonTracker(global_settings)
+    # result_regrowth_mixture = Secondary_regrowth_scenario.CarbonTracker(global_settings)
+    result_regrowth_mature_mixture = memo.tracker(Secondary_mature_regrowth_scenario, global_harvest_settings)
+
+    # run the land area calculator
+    LAC_mixture = memo.land_calculator(global_harvest_settings)
+    # run the carbon cost calculator
+    CCC_mixture = memo.carbon_calculator(global_harvest_settings, global_growth_settings, LAC_mixture)
+
+    ### scenario (4) secondary harvest regrowth: 125% productivity increase in plantation
+    ### Read in global parameters ###
+    global_harvest_settings = Global_by_country.Parameters(datafile, nyears_harvest_settings,
+                                                   country_iso=code,
+                                                   future_demand_level=future_demand_level_input,
+                                                   substitution_mode=substitution_mode_input,
+                                                   vslp_input_control=vslp_input_control_input, dtype=dtype, pool_storage=pool_storage,
+                                                   plantation_growth_increase_ratio=1.25)
+    global_growth_settings = Global_by_country.Parameters(datafile, nyears_growth_settings,
+                                                           country_iso=code,
+                                                           future_demand_level=future_demand_level_input,
+                                                           substitution_mode=substitution_mode_input,
+                                                           vslp_input_control=vslp_input_control_input, dtype=dtype, pool_storage=pool_storage,
+                                                           plantation_growth_increase_ratio=1.25)
+    # run different policy scenarios
+    result_plantation_highGR = memo.tracker(Plantation_counterfactual_secondary_plantation_age_scenario, global_harvest_settings)
+
+    # run the land area calculator
+    LAC_highGR = memo.land_calculator(global_harvest_settings)
+    # run the carbon cost calculator
+    CCC_highGR = memo.carbon_calculator(global_harvest_settings, global_growth_settings, LAC_highGR)
+
+    ### scenario (5) secondary harvest regrowth: optimal slash rate in tropical secondary forests
+    ### Read in global parameters ###
+    global_harvest_settings = Global_by_country.Parameters(datafile, nyears_harvest_settings,
+                                                           country_iso=code,
+                                                           future_demand_level=future_demand_level_input,
+                                                           substitution_mode=substitution_mode_input,
+                                                           vslp_input_control=vslp_input_control_input, dtype=dtype, pool_storage=pool_storage,
+                                                           slash_rate_mode='optimal')
+    global_growth_settings = Global_by_country.Parameters(datafile, nyears_growth_settings,
+                                                           country_iso=code,
+                                                           future_demand_level=future_demand_level_input,
+                                                           substitution_mode=substitution_mode_input,
+                                                           vslp_input_control=vslp_input_control_input, dtype=dtype, pool_storage=pool_storage,
+                                                           slash_rate_mode='optimal')
+    # run different policy scenarios
+    result_regrowth_optimalSL = memo.tracker(Secondary_regrowth_scenario, global_harvest_settings)
+    # run the land area calculator
+    LAC_optimalSL = memo.land_calculator(global_harvest_settings)
+    # run the carbon cost calculator
+    CCC_optimalSL = memo.carbon_calculator(global_harvest_settings, global_growth_settings, LAC_optimalSL)
+
+    ### scenario (6) secondary harvest regrowth: 50% reduction in VSLP-WFL production
+    # read in global parameters
+    global_harvest_settings = Global_by_country.Parameters(datafile, nyears_harvest_settings,
+                                                   country_iso=code,
+                                                   future_demand_level=future_demand_level_input,
+                                                   substitution_mode=substitution_mode_input,
+                                                   vslp_input_control=vslp_input_control_input, dtype=dtype, pool_storage=pool_storage,
+                                                   vslp_future_demand='WFL50less')
+    global_growth_settings = Global_by_country.Parameters(datafile, nyears_growth_settings,
+                                                           country_iso=code,
+                                                           future_demand_level=future_demand_level_input,
+                                                           substitution_mode=substitution_mode_input,
+                                                           vslp_input_control=vslp_input_control_input, dtype=dtype, pool_storage=pool_storage,
+                                                           vslp_future_demand='WFL50less')
+    # run the land area calculator
+    LAC_WFL50less = memo.land_calculator(global_harvest_settings)
+    # run the carbon cost calculator
+    CCC_WFL50less = memo.carbon_calculator(global_harvest_settings, global_growth_settings, LAC_WFL50less)
+
+    if trackers is not None:
+        trackers.update({'Secondary middle regrowth': result_regrowth_default, 'Secondary mature regrowth': result_regrowth_mature_mixture,
+                         'Secondary conversion': result_conversion_default, 'Plantation': result_plantation_default, 'Plantation 125% GR': result_plantation_highGR,
+                         'Secondary regrowth 62% SL': result_regrowth_optimalSL, 'Agricultural land conversion': result_agriland_default})
+
+    ################################### Prepare output ##################################
+    def prepare_output(result_regrowth_default, result_regrowth_mature_mixture, result_conversion_default, result_plantation_default, result_plantation_highGR, result_regrowth_optimalSL, result_agriland_default,
+                       CCC_default, CCC_mixture, CCC_highGR, CCC_optimalSL, CCC_WFL50less):
+        output_row = {'Country': country,
+                      'ISO': code,
+                      # Save PDV
+                      'PDV per ha Secondary middle regrowth (tC/ha)': np.sum(result_regrowth_default.annual_discounted_value),
+                      'PDV per ha Secondary mature regrowth (tC/ha)': np.sum(result_regrowth_mature_mixture.annual_discounted_value),
+                      'PDV per ha Secondary conversion (tC/ha)': np.sum(result_conversion_default.annual_discounted_value),
+                      'PDV per ha Plantation (tC/ha)': np.sum(result_plantation_default.annual_discounted_value),
+                      'PDV per ha Plantation 125% GR (tC/ha)': np.sum(result_plantation_highGR.annual_discounted_value),
+                      'PDV per ha Secondary regrowth 62% SL (tC/ha)': np.sum(result_regrowth_optimalSL.annual_discounted_value),
+                      'PDV per ha Agricultural land conversion (tC/ha)': np.sum(result_agriland_default.annual_discounted_value),
+                      # Get output per ha for new plantation
+                      'Output per ha Agricultural land conversion (tC/ha)': output_ha_agriland_default,
+                      # Save wood supply
+                      'Default: Plantation supply wood (mega tC)': sum(LAC_default.product_total_carbon) / 1000000 - sum(LAC_default.output_need_secondary) / 1000000,
+                      'Default: Secondary forest supply wood (mega tC)': sum(LAC_default.output_need_secondary / 1000000),
+                      # Scenario 4: Plantation productivity increase
+                      '125% GR: Plantation supply wood (mega tC)': sum(LAC_highGR.product_total_carbon) / 1000000 - sum(LAC_highGR.output_need_secondary) / 1000000,
+                      '125% GR: Secondary forest supply wood (mega tC)': sum(LAC_highGR.output_need_secondary / 1000000),
+                      # Scenario 5: Secondary forest slash rate reduction
+                      '62% SL: Plantation supply wood (mega tC)': sum(LAC_optimalSL.product_total_carbon) / 1000000 - sum(LAC_optimalSL.output_need_secondary) / 1000000,
+                      '62% SL: Secondary forest supply wood (mega tC)': sum(LAC_optimalSL.output_need_secondary / 1000000),
+                      # Scenario 6: VSLP-WFL 50% reduction
+                      'WFL50less: Plantation supply wood (mega tC)': sum(LAC_WFL50less.product_total_carbon) / 1000000 - sum(LAC_WFL50less.output_need_secondary) / 1000000,
+                      'WFL50less: Secondary forest supply wood (mega tC)': sum(LAC_WFL50less.output_need_secondary / 1000000),
+
+                      # Save plantation area
+                      'Plantation area (ha)': sum(CCC_default.area_harvested_new_plantation),
+
+                      # S1
+                      'S1 regrowth: Secondary area (ha)': sum(LAC_default.area_harvested_new_secondary_regrowth_combined),
+                      'S1 regrowth: total PDV (mega tC)': CCC_default.total_pdv_plantation_secondary_regrowth,
+                      'S1 regrowth: PDV plantation (mega tC)': CCC_default.total_pdv_plantation_sum,
+                      'S1 regrowth: PDV secondary (mega tC)': CCC_default.total_pdv_secondary_regrowth_sum,
+
+                      # S2
+                      'S2 conversion: Secondary area (ha)': sum(LAC_default.area_harvested_new_secondary_conversion),
+                      'S2 conversion: total PDV (mega tC)': CCC_default.total_pdv_plantation_secondary_conversion,
+
+                      # S3: 50:50 secondary supply
+                      'S3 mixture: Secondary area (ha)': sum(LAC_mixture.area_harvested_new_secondary_regrowth_combined),
+                      'S3 mixture: total PDV (mega tC)': CCC_mixture.total_pdv_plantation_secondary_regrowth,
+                      'S3 mixture: Secondary middle aged area (ha)': sum(LAC_mixture.area_harvested_new_secondary_regrowth),
+                      'S3 mixture: Secondary mature area (ha)': sum(LAC_mixture.area_harvested_new_secondary_mature_regrowth),
+
+                      # S4
+                      'S4 125% GR: Secondary area (ha)': sum(LAC_highGR.area_harvested_new_secondary_regrowth_combined),
+                      'S4 125% GR: total PDV (mega tC)': CCC_highGR.total_pdv_plantation_secondary_regrowth,
+
+                      # S5
+                      'S5 62% SL: Secondary area (ha)': sum(LAC_optimalSL.area_harvested_new_secondary_regrowth_combined),
+                      'S5 62% SL: total PDV (mega tC)': CCC_optimalSL.total_pdv_plantation_secondary_regrowth,
+
+                      # S6
+                      'S6 WFL 50% less: Secondary area (ha)': sum(LAC_WFL50less.area_harvested_new_secondary_regrowth_combined),
+                      'S6 WFL 50% less: total PDV (mega tC)': CCC_WFL50less.total_pdv_plantation_secondary_regrowth,
+
+                      }
+        return output_row
+
+    results = [result_regrowth_default, result_regrowth_mature_mixture, result_conversion_default, result_plantation_default, result_plantation_highGR, result_regrowth_optimalSL, result_agriland_default,
+               CCC_default, CCC_mixture, CCC_highGR, CCC_optimalSL, CCC_WFL50less]
+    return output_rows_by_setting(prepare_output, results, discount_rates, years_growth, flux_memo=memo)
+
+
+def run_country_main_scenario(datafile, country, code, future_demand_level_input='BAU', substitution_mode_input='SUBON', vslp_input_control_input='ALL', dtype='float64', pool_storage='dense', cache=None, discount_rates=None, years_growth=None, trackers=None):
+    """
+    Created and Edited: 2023/06
+    Run the main regrowth scenario 1 for one country, split from run_model_main_scenario so that a country can be re-run on its own
+    :param pool_storage: 'dense' (default) or 'banded' storage of the per cycle carbon pool matrices, see Global_by_country.Parameters
+    :param cache: Result_cache.ResultCache of the land area and carbon cost results, None to compute without the cache
+    :param discount_rates: list of discount rates to apply to the same run instead of the discount rate of the data file
+    :param years_growth: list of years of growth up to the 'Years of growth' of the data file, each row the same as a separate run
+    :param trackers: dict filled with the tracker results of the scenarios {scenario: Tracker_result.TrackerResult}, e.g. for Carbon_pool_export
+    :return: the country's row of the output tab, {column name: value}, or a list of rows with the 'Discount rate' and 'Years of growth' for discount_rates and years_growth
+    """
+    ################################### Execute model runs ##################################
+    nyears_harvest_settings = Global_by_country.SetupTime(datafile, country_iso=code, nyears_run_control='harvest')
+    nyears_growth_settings = Global_by_country.SetupTime(datafile, country_iso=code, nyears_run_control='growth')
+    ### Default plantation scenarios, (1) secondary harvest regrowth and (2) conversion
+    ### Read in global parameters ###
+    global_harvest_settings = Global_by_country.Parameters(datafile, nyears_harvest_settings,
+                                                            country_iso=code,
+                                                           future_demand_level=future_demand_level_input,
+                                                           substitution_mode=substitution_mode_input,
+                                                           vslp_input_control=vslp_input_control_input, dtype=dtype, pool_storage=pool_storage)
+    global_growth_settings = Global_by_country.Parameters(datafile, nyears_growth_settings,
+                                                           country_iso=code,
+                                                           future_demand_level=future_demand_level_input,
+                                                           substitution_mode=substitution_mode_input,
+                                                           vslp_input_control=vslp_input_control_input, dtype=dtype, pool_storage=pool_storage)
+    # run different policy scenarios
+    result_plantation_default = Plantation_counterfactual_secondary_plantation_age_scenario.CarbonTracker(global_harvest_settings, keep_intermediates=False).slim_result()
+    # result_conversion_default = Secondary_conversion_scenario.CarbonTracker(global_harvest_settings)
+    result_regrowth_default = Secondary_regrowth_scenario.CarbonTracker(global_harvest_settings, keep_intermediates=False).slim_result()
+    # result_agriland_default = Agricultural_land_tropical_scenario.CarbonTracker(global_harvest_settings)
+
+    # run the land area calculator
+    LAC_default = Result_cache.land_calculator(global_harvest_settings, cache)
+    if global_harvest_settings.rotation_length_harvest == 10:
+        output_ha_agriland_default = LAC_default.output_ha_agriland[global_harvest_settings.year_index_harvest_plantation[1]-1]
+    else:
+        output_ha_agriland_default = 0
+    # run the carbon cost calculator
+    CCC_default = Result_cache.carbon_calculator(global_harvest_settings, global_growth_settings, LAC_default, cache)
+
+    if trackers is not None:
+        trackers.update({'Secondary middle regrowth': result_regrowth_default, 'Plantation': result_plantation_default})
+
+    ################################### Prepare output ##################################
+    def prepare_output(result_regrowth_default, result_plantation_default, CCC_default):
+        output_row = {'Country': country,
+                      'ISO': code,
+                      # Save PDV
+                      'PDV per ha Secondary middle regrowth (tC/ha)': np.sum(result_regrowth_default.annual_discounted_value),
+                      'PDV per ha Plantation (tC/ha)': np.sum(result_plantation_default.annual_discounted_value),
+                      # Get output per ha for new plantation
+                      'Output per ha Agricultural land conversion (tC/ha)': output_ha_agriland_default,
+                      # Save wood supply
+                      'Default: Plantation supply wood (mega tC)': sum(LAC_default.product_total_carbon) / 1000000 - sum(LAC_default.output_need_secondary) / 1000000,
+                      'Default: Secondary forest supply wood (mega tC)': sum(LAC_default.output_need_secondary / 1000000),
+
+                      # Save plantation area
+                      'Plantation area (ha)': sum(CCC_default.area_harvested_new_plantation),
+
+                      # S1
+                      'S1 regrowth: Secondary area (ha)': sum(LAC_default.area_harvested_new_secondary_regrowth_combined),
+                      'S1 regrowth: total PDV (mega tC)': CCC_default.total_pdv_plantation_secondary_regrowth,
+                      'S1 regrowth: PDV plantation (mega tC)': CCC_default.total_pdv_plantation_sum,
+                      'S1 regrowth: PDV secondary (mega tC)': CCC_default.total_pdv_secondary_regrowth_sum,
+
+                      }
+        return output_row
+
+    return output_rows_by_setting(prepare_output, [result_regrowth_default, result_plantation_default, CCC_default], discount_rates, years_growth)
+
+
+def run_countries(datafile, run_country, future_demand_level_input, substitution_mode_input, vslp_input_control_input, run_settings, incremental=False, dtype='float64', pool_storage='dense', cache=None, checkpoints=None, resume=False, pool_store=None):
+    """
+    Created and Edited: 2023/06
+    Run one country function (run_country_all_scenarios or run_country_main_scenario) over the countries of the Inputs sheet and write the output tab.
+    :param run_settings: scenario settings recorded in the run manifest next to the data file
+    :param incremental: only recompute the countries whose input row, run settings or code changed since the last run, keep the others' rows in the existing output tab
+    :param pool_storage: 'dense' or 'banded' carbon pool matrices passed to the country function, the rows are the same so it is not a run setting of the manifest
+    :param cache: Result_cache.ResultCache passed to the country function
+    :param checkpoints: Checkpoint_store.CheckpointStore, each computed country is saved to it
+    :param resume: skip the countries already completed in the checkpoints of an interrupted run
+    :param pool_store: Carbon_pool_export.PoolSeriesStore, the pool series of each country are added to it.
+                       The countries are all computed, the rows of the last run and of the checkpoints are not reused.
+    :return: the output tab (DataFrame), as written to the data file
+    """
+    # Read in input data
+    input_data = Global_by_country.read_inputs(datafile)
+    # If the cell has formula, it will be read as NaN
+    # Read in countries
+    countries = input_data[['Country', 'ISO']]
+
+    # Prepare output tab name
+    output_tabname = f'{future_demand_level_input}_{substitution_mode_input}_{vslp_input_control_input}'
+    run_settings = dict(run_settings, future_demand_level=future_demand_level_input, substitution_mode=substitution_mode_input, vslp_input_control=vslp_input_control_input, dtype=dtype, driver=run_country.__name__)
+    manifest = Run_manifest.RunManifest(datafile)
+    existing_tab = Run_manifest.read_output_tab(datafile, output_tabname) if incremental else None
+
+    # Each country's row is streamed to the writers as soon as it is ready, see Result_stream
+    table = Result_stream.ColumnStore()
+    partial = Result_stream.PartialCSV(Result_stream.partial_filename(datafile, output_tabname))
+    country_digests = {}
+    with Result_stream.ResultStream([table, partial, Result_stream.ProgressReport(output_tabname, len(countries))]) as stream:
+        for country, code in zip(countries['Country'], countries['ISO']):
+            start = time.perf_counter()
+            # Test if the parameters are set up for this country, if there is one parameter missing, no calculation will be done for this country.
+            input_country = input_data.loc[input_data['Country'] == country]
+            digest = manifest.digest(input_country, run_settings)
+            if not has_complete_inputs(input_country):
+                print(f"Please fill in the abbreviation and all the missing parameters for country '{country}'!")
+                continue
+            output_row = Run_manifest.reuse_row(existing_tab, code) if manifest.is_current(output_tabname, code, digest) and pool_store is None else None
+            source = 'unchanged'
+            if output_row is None and resume and checkpoints is not None and pool_store is None:
+                output_row = checkpoints.load(output_tabname, code, digest)
+                source = 'checkpoint'
+            if output_row is None:
+                trackers = {} if pool_store is not None else None
+                output_row = run_country(datafile, country, code, future_demand_level_input=future_demand_level_input, substitution_mode_input=substitution_mode_input, vslp_input_control_input=vslp_input_control_input, dtype=dtype, pool_storage=pool_storage, cache=cache, trackers=trackers)
+                source = 'computed'
+                if pool_store is not None:
+                    pool_store.add(output_tabname, country, code, trackers)
+                if checkpoints is not None:
+                    checkpoints.save(output_tabname, code, digest, output_row)
+            stream.emit(Result_stream.CountryRecord(output_tabname, country, code, source, time.perf_counter() - start, output_row))
+            country_digests[code] = digest
+
+    # Save to the excel file
+    dataframe = table.to_frame()
+
+    def write_excel(filename, sheetname, dataframe):
+        "This function will overwrite the Outputs sheet"
+        with pd.ExcelWriter(filename, engine='openpyxl', mode='a') as writer:
+            workbook = writer.book
+            try:
+                workbook.remove(workbook[sheetname])
+                print("Updating Outputs sheet...")
+            except KeyError:
+                print("Creating Outputs sheet...")
+            finally:
+                dataframe.to_excel(writer, sheet_name=sheetname, index=False)
+                writer.save()
+
+    write_excel(datafile, output_tabname, dataframe)
+    # The tab has all the rows
+    partial.remove()
+    # Record the countries of the tab only after it is written
+    manifest.update_tab(output_tabname, country_digests)
+    manifest.save()
+
+    return dataframe
+
+
+def run_model_all_scenarios(years, discount_rate, version, path, dtype='float64', pool_storage='dense', incremental=False, cache=False, resume=False, export_pools=False):
     """
     Created and Edited: 2022/01
     This is an updated driver for running global analysis for forestry land and carbon consequences.
     Adding several scenarios based on the run_model_five_scenarios
+    dtype: 'float64' (default) or 'float32' for the carbon pool matrices, see Global_by_country.Parameters
+    pool_storage: 'dense' (default) or 'banded' carbon pool matrices, 'banded' uses less memory for the long runs with many cycles, see Global_by_country.Parameters
+    incremental: only recompute the countries changed since the last run, see Run_manifest
+    cache: reuse the land area and carbon cost results computed in the previous runs, see Result_cache
+    resume: skip the countries completed before an interrupted run, see Checkpoint_store
+    export_pools: write the annual carbon pool series of all the countries and scenarios next to the data file, see Carbon_pool_export
+    Returns the output tabs {tab name: DataFrame}, e.g. for results_summary_analysis.summarize_tables without reading the data file again
     """
     ## Standard runs
     # Read input/output data excel file.
     datafile = f'{path}/data/processed/CHARM global - YR_{years} - DR_{discount_rate} - V{version}.xlsx'
-
-    # Read in countries
-    countries = pd.read_excel(datafile, sheet_name='Inputs', usecols="A:B", skiprows=1)
-    # Read in input data
-    input_data = pd.read_excel(datafile, sheet_name='Inputs', skiprows=1)
-    # If the cell has formula, it will be read as NaN
+    run_settings = {'years': years, 'discount_rate': discount_rate, 'version': version}
+    result_cache = Result_cache.ResultCache(Result_cache.default_directory(path)) if cache else None
+    checkpoints = Checkpoint_store.CheckpointStore(path, datafile)
+    pool_store = Carbon_pool_export.PoolSeriesStore() if export_pools else None
+    # Output tabs of the run, also written to the data file
+    tables = {}
 
     def single_run_with_combination_input(future_demand_level_input='BAU', substitution_mode_input='SUBON', vslp_input_control_input='ALL'):
         """
@@ -40,286 +443,8 @@ def run_model_all_scenarios(years, discount_rate, version, path):
         :param vslp_input_control_input: select VSLP option from "ALL" total roundwood (VSLP_WFL+VSLP_IND) or "IND" industrial roundwood (VSLP_IND)
         :return:
         """
-        # Initiate the output variables.
-        # country name, code
-        countrynames, codes = [], []
-        # wood supply
-        secondary_wood_default, plantation_wood_default = [], []
-        secondary_wood_highGR, plantation_wood_highGR = [], []   # This will increase the percentage of wood from plantation, reduce the share of secondary
-        secondary_wood_optimalSL, plantation_wood_optimalSL = [], []  # This will increase the share of secondary
-        secondary_wood_WFL50less, plantation_wood_WFL50less = [], []  # This will change the total wood supply for both secondary and plantation
-        # pdv
-        pdv_per_ha_plantation_default, pdv_per_ha_plantation_highGR = [], []
-        pdv_per_ha_regrowth, pdv_per_ha_regrowth_mature, pdv_per_ha_regrowth_optimalSL = [], [], []
-        pdv_per_ha_conversion = []
-        pdv_per_ha_agriland = []
-        # area
-        area_plantation = []
-        area_regrowth, carbon_regrowth, carbon_existing_plantation, carbon_secondary_regrowth = [], [], [], []
-        area_conversion, carbon_conversion = [], []
-        area_mixture, carbon_mixture, area_mixture_middle, area_mixture_mature = [], [], [], []
-        area_regrowth_highGR, carbon_regrowth_highGR = [], []
-        area_regrowth_optimalSL, carbon_regrowth_optimalSL = [], []
-        area_regrowth_WFL50less, carbon_regrowth_WFL50less = [], []
-
-        output_ha_agriland = []
-
-        # For each country, calculate the results for all scenarios. Each variable collects a list of the countries' results.
-        for country, code in zip(countries['Country'], countries['ISO']):
-            # Test if the parameters are set up for this country, if there is one parameter missing, no calculation will be done for this country.
-            input_country = input_data.loc[input_data['Country'] == country]
-            input_country = input_country.drop(['Emissions substitution factor for LLP (tC saved/tons C in LLP)'], axis=1)
-            if input_country.isnull().values.any():
-                print(f"Please fill in the abbreviation and all the missing parameters for country '{country}'!")
-            else:
-                ################################### Execute model runs ##################################
-                nyears_harvest_settings = Global_by_country.SetupTime(datafile, country_iso=code, nyears_run_control='harvest')
-                nyears_growth_settings = Global_by_country.SetupTime(datafile, country_iso=code, nyears_run_control='growth')
-                ### Default plantation scenarios, (1) secondary harvest regrowth and (2) conversion
-                ### Read in global parameters ###
-                global_harvest_settings = Global_by_country.Parameters(datafile, nyears_harvest_settings,
-                                                                        country_iso=code,
-                                                                       future_demand_level=future_demand_level_input,
-                                                                       substitution_mode=substitution_mode_input,
-                                                                       vslp_input_control=vslp_input_control_input)
-                global_growth_settings = Global_by_country.Parameters(datafile, nyears_growth_settings,
-                                                                       country_iso=code,
-                                                                       future_demand_level=future_demand_level_input,
-                                                                       substitution_mode=substitution_mode_input,
-                                                                       vslp_input_control=vslp_input_control_input)
-                # run different policy scenarios
-                result_plantation_default = Plantation_counterfactual_secondary_plantation_age_scenario.CarbonTracker(global_harvest_settings)
-                result_conversion_default = Secondary_conversion_scenario.CarbonTracker(global_harvest_settings)
-                result_regrowth_default = Secondary_regrowth_scenario.CarbonTracker(global_harvest_settings)
-                result_agriland_default = Agricultural_land_tropical_scenario.CarbonTracker(global_harvest_settings)
-
-                # run the land area calculator
-                LAC_default = Land_area_calculator.LandCalculator(global_harvest_settings)
-                if global_harvest_settings.rotation_length_harvest <= 10:
-                    output_ha_agriland_default = LAC_default.output_ha_agriland[global_harvest_settings.year_index_harvest_plantation[1]-1]
-                else:
-                    output_ha_agriland_default = 0
-                # run the carbon cost calculator
-                CCC_default = Carbon_cost_calculator.CarbonCalculator(global_harvest_settings, global_growth_settings, LAC_default)
-
-
-                ### scenario (3) secondary harvest regrowth: 50% middle aged and 50% mature secondary forest
-                ### Read in global parameters ###
-                global_harvest_settings = Global_by_country.Parameters(datafile, nyears_harvest_settings,
-                                                                       country_iso=code,
-                                                               future_demand_level=future_demand_level_input,
-                                                               substitution_mode=substitution_mode_input,
-                                                               vslp_input_control=vslp_input_control_input,
-                                                               secondary_mature_wood_share=0.5)
-                global_growth_settings = Global_by_country.Parameters(datafile, nyears_growth_settings,
-                                                                       country_iso=code,
-                                                                       future_demand_level=future_demand_level_input,
-                                                                       substitution_mode=substitution_mode_input,
-                                                                       vslp_input_control=vslp_input_control_input,
-                                                                       secondary_mature_wood_share=0.5)
-                # run different policy scenarios
-                # result_plantation_mixture = Plantation_counterfactual_secondary_plantation_age_scenario.CarbonTracker(global_settings)
-                # result_regrowth_mixture = Secondary_regrowth_scenario.CarbonTracker(global_settings)
-                result_regrowth_mature_mixture = Secondary_mature_regrowth_scenario.CarbonTracker(global_harvest_settings)
-
-                # run the land area calculator
-                LAC_mixture = Land_area_calculator.LandCalculator(global_harvest_settings)
-                # run the carbon cost calculator
-                CCC_mixture = Carbon_cost_calculator.CarbonCalculator(global_harvest_settings, global_growth_settings, LAC_mixture)
-
-                ### scenario (4) secondary harvest regrowth: 125% productivity increase in plantation
-                ### Read in global parameters ###
-                global_harvest_settings = Global_by_country.Parameters(datafile, nyears_harvest_settings,
-                                                               country_iso=code,
-                                                               future_demand_level=future_demand_level_input,
-                                                               substitution_mode=substitution_mode_input,
-                                                               vslp_input_control=vslp_input_control_input,
-                                                               plantation_growth_increase_ratio=1.25)
-                global_growth_settings = Global_by_country.Parameters(datafile, nyears_growth_settings,
-                                                                       country_iso=code,
-                                                                       future_demand_level=future_demand_level_input,
-                                                                       substitution_mode=substitution_mode_input,
-                                                                       vslp_input_control=vslp_input_control_input,
-                                                                       plantation_growth_increase_ratio=1.25)
-                # run different policy scenarios
-                result_plantation_highGR = Plantation_counterfactual_secondary_plantation_age_scenario.CarbonTracker(
-                    global_harvest_settings)
-
-                # run the land area calculator
-                LAC_highGR = Land_area_calculator.LandCalculator(global_harvest_settings)
-                # run the carbon cost calculator
-                CCC_highGR = Carbon_cost_calculator.CarbonCalculator(global_harvest_settings, global_growth_settings, LAC_highGR)
-
-                ### scenario (5) secondary harvest regrowth: optimal slash rate in tropical secondary forests
-                ### Read in global parameters ###
-                global_harvest_settings = Global_by_country.Parameters(datafile, nyears_harvest_settings,
-                                                                       country_iso=code,
-                                                                       future_demand_level=future_demand_level_input,
-                                                                       substitution_mode=substitution_mode_input,
-                                                                       vslp_input_control=vslp_input_control_input,
-                                                                       slash_rate_mode='optimal')
-                global_growth_settings = Global_by_country.Parameters(datafile, nyears_growth_settings,
-                                                                       country_iso=code,
-                                                                       future_demand_level=future_demand_level_input,
-                                                                       substitution_mode=substitution_mode_input,
-                                                                       vslp_input_control=vslp_input_control_input,
-                                                                       slash_rate_mode='optimal')
-                # run different policy scenarios
-                result_regrowth_optimalSL = Secondary_regrowth_scenario.CarbonTracker(global_harvest_settings)
-                # run the land area calculator
-                LAC_optimalSL = Land_area_calculator.LandCalculator(global_harvest_settings)
-                # run the carbon cost calculator
-                CCC_optimalSL = Carbon_cost_calculator.CarbonCalculator(global_harvest_settings, global_growth_settings, LAC_optimalSL)
-
-                ### scenario (6) secondary harvest regrowth: 50% reduction in VSLP-WFL production
-                # read in global parameters
-                global_harvest_settings = Global_by_country.Parameters(datafile, nyears_harvest_settings,
-                                                               country_iso=code,
-                                                               future_demand_level=future_demand_level_input,
-                                                               substitution_mode=substitution_mode_input,
-                                                               vslp_input_control=vslp_input_control_input,
-                                                               vslp_future_demand='WFL50less')
-                global_growth_settings = Global_by_country.Parameters(datafile, nyears_growth_settings,
-                                                                       country_iso=code,
-                                                                       future_demand_level=future_demand_level_input,
-                                                                       substitution_mode=substitution_mode_input,
-                                                                       vslp_input_control=vslp_input_control_input,
-                                                                       vslp_future_demand='WFL50less')
-                # run the land area calculator
-                LAC_WFL50less = Land_area_calculator.LandCalculator(global_harvest_settings)
-                # run the carbon cost calculator
-                CCC_WFL50less = Carbon_cost_calculator.CarbonCalculator(global_harvest_settings, global_growth_settings, LAC_WFL50less)
-
-                ################################### Prepare output ##################################
-                countrynames.append(country)
-                codes.append(code)
-
-                # Carbon tracker
-                pdv_per_ha_plantation_default.append(np.sum(result_plantation_default.annual_discounted_value))
-                pdv_per_ha_regrowth.append(np.sum(result_regrowth_default.annual_discounted_value))
-                pdv_per_ha_conversion.append(np.sum(result_conversion_default.annual_discounted_value))
-                pdv_per_ha_regrowth_mature.append(np.sum(result_regrowth_mature_mixture.annual_discounted_value))
-                pdv_per_ha_plantation_highGR.append(np.sum(result_plantation_highGR.annual_discounted_value))
-                pdv_per_ha_regrowth_optimalSL.append(np.sum(result_regrowth_optimalSL.annual_discounted_value))
-                pdv_per_ha_agriland.append(np.sum(result_agriland_default.annual_discounted_value))
-
-                # Get output per ha for new plantation
-                output_ha_agriland.append(output_ha_agriland_default)
-
-                # Default situation
-                secondary_wood_default.append(sum(LAC_default.output_need_secondary / 1000000))
-                plantation_wood_default.append(sum(LAC_default.product_total_carbon) / 1000000 - sum(LAC_default.output_need_secondary) / 1000000)
-                area_plantation.append(sum(CCC_default.area_harvested_new_plantation))
-
-                # Scenario 1
-                area_regrowth.append(sum(LAC_default.area_harvested_new_secondary_regrowth_combined))
-                carbon_regrowth.append(CCC_default.total_pdv_plantation_secondary_regrowth)
-                carbon_existing_plantation.append(CCC_default.total_pdv_plantation_sum)
-                carbon_secondary_regrowth.append(CCC_default.total_pdv_secondary_regrowth_sum)
-
-                # Scenario 2
-                area_conversion.append(sum(LAC_default.area_harvested_new_secondary_conversion))
-                carbon_conversion.append(CCC_default.total_pdv_plantation_secondary_conversion)
-
-                # Scenario 3: 50:50 secondary supply
-                area_mixture.append(sum(LAC_mixture.area_harvested_new_secondary_regrowth_combined))
-                carbon_mixture.append(CCC_mixture.total_pdv_plantation_secondary_regrowth)
-                area_mixture_middle.append(sum(LAC_mixture.area_harvested_new_secondary_regrowth))
-                area_mixture_mature.append(sum(LAC_mixture.area_harvested_new_secondary_mature_regrowth))
-
-                # Scenario 4: Plantation productivity increase
-                # Productivity increase
-                secondary_wood_highGR.append(sum(LAC_highGR.output_need_secondary / 1000000))
-                plantation_wood_highGR.append(sum(LAC_highGR.product_total_carbon) / 1000000 - sum(LAC_highGR.output_need_secondary) / 1000000)
-                area_regrowth_highGR.append(sum(LAC_highGR.area_harvested_new_secondary_regrowth_combined))
-                carbon_regrowth_highGR.append(CCC_highGR.total_pdv_plantation_secondary_regrowth)
-
-                # Scenario 5: Secondary forest slash rate reduction
-                # Productivity increase
-                secondary_wood_optimalSL.append(sum(LAC_optimalSL.output_need_secondary / 1000000))
-                plantation_wood_optimalSL.append(sum(LAC_optimalSL.product_total_carbon) / 1000000 - sum(LAC_optimalSL.output_need_secondary) / 1000000)
-                area_regrowth_optimalSL.append(sum(LAC_optimalSL.area_harvested_new_secondary_regrowth_combined))
-                carbon_regrowth_optimalSL.append(CCC_optimalSL.total_pdv_plantation_secondary_regrowth)
-
-                # Scenario 6: VSLP-WFL 50% reduction
-                secondary_wood_WFL50less.append(sum(LAC_WFL50less.output_need_secondary / 1000000))
-                plantation_wood_WFL50less.append( sum(LAC_WFL50less.product_total_carbon) / 1000000 - sum(LAC_WFL50less.output_need_secondary) / 1000000)
-                area_regrowth_WFL50less.append(sum(LAC_WFL50less.area_harvested_new_secondary_regrowth_combined))
-                carbon_regrowth_WFL50less.append(CCC_WFL50less.total_pdv_plantation_secondary_regrowth)
-
-
-        # Save to the excel file
-        dataframe = pd.DataFrame({'Country': countrynames,
-                                  'ISO': codes,
-                                  # Save PDV
-                                  'PDV per ha Secondary middle regrowth (tC/ha)': pdv_per_ha_regrowth,
-                                  'PDV per ha Secondary mature regrowth (tC/ha)': pdv_per_ha_regrowth_mature,
-                                  'PDV per ha Secondary conversion (tC/ha)': pdv_per_ha_conversion,
-                                  'PDV per ha Plantation (tC/ha)': pdv_per_ha_plantation_default,
-                                  'PDV per ha Plantation 125% GR (tC/ha)': pdv_per_ha_plantation_highGR,
-                                  'PDV per ha Secondary regrowth 62% SL (tC/ha)': pdv_per_ha_regrowth_optimalSL,
-                                  'PDV per ha Agricultural land conversion (tC/ha)': pdv_per_ha_agriland,
-                                  # Save output
-                                  'Output per ha Agricultural land conversion (tC/ha)': output_ha_agriland,
-                                  # Save wood supply
-                                  'Default: Plantation supply wood (mega tC)': plantation_wood_default,
-                                  'Default: Secondary forest supply wood (mega tC)': secondary_wood_default,
-                                  '125% GR: Plantation supply wood (mega tC)': plantation_wood_highGR,
-                                  '125% GR: Secondary forest supply wood (mega tC)': secondary_wood_highGR,
-                                  '62% SL: Plantation supply wood (mega tC)': plantation_wood_optimalSL,
-                                  '62% SL: Secondary forest supply wood (mega tC)': secondary_wood_optimalSL,
-                                  'WFL50less: Plantation supply wood (mega tC)': plantation_wood_WFL50less,
-                                  'WFL50less: Secondary forest supply wood (mega tC)': secondary_wood_WFL50less,
-
-                                  # Save plantation area
-                                  'Plantation area (ha)': area_plantation,
-
-                                  # S1
-                                  'S1 regrowth: Secondary area (ha)': area_regrowth,
-                                  'S1 regrowth: total PDV (mega tC)': carbon_regrowth,
-                                  'S1 regrowth: PDV plantation (mega tC)': carbon_existing_plantation,
-                                  'S1 regrowth: PDV secondary (mega tC)': carbon_secondary_regrowth,
-
-                                  # S2
-                                  'S2 conversion: Secondary area (ha)': area_conversion,
-                                  'S2 conversion: total PDV (mega tC)': carbon_conversion,
-
-                                  # S3
-                                  'S3 mixture: Secondary area (ha)': area_mixture,
-                                  'S3 mixture: total PDV (mega tC)': carbon_mixture,
-                                  'S3 mixture: Secondary middle aged area (ha)': area_mixture_middle,
-                                  'S3 mixture: Secondary mature area (ha)': area_mixture_mature,
-
-                                  # S4
-                                  'S4 125% GR: Secondary area (ha)': area_regrowth_highGR,
-                                  'S4 125% GR: total PDV (mega tC)': carbon_regrowth_highGR,
-
-                                  # S5
-                                  'S5 62% SL: Secondary area (ha)': area_regrowth_optimalSL,
-                                  'S5 62% SL: total PDV (mega tC)': carbon_regrowth_optimalSL,
-
-                                  # S6
-                                  'S6 WFL 50% less: Secondary area (ha)': area_regrowth_WFL50less,
-                                  'S6 WFL 50% less: total PDV (mega tC)': carbon_regrowth_WFL50less,
-
-                                  })
-
-        def write_excel(filename, sheetname, dataframe):
-            "This function will overwrite the Outputs sheet"
-            with pd.ExcelWriter(filename, engine='openpyxl', mode='a') as writer:
-                workbook = writer.book
-                try:
-                    workbook.remove(workbook[sheetname])
-                    print("Updating Outputs sheet...")
-                except:
-                    print("Creating Outputs sheet...")
-                finally:
-                    dataframe.to_excel(writer, sheet_name=sheetname, index=False)
-                    writer.save()
-
-        # Prepare output tab name
-        output_tabname = f'{future_demand_level_input}_{substitution_mode_input}_{vslp_input_control_input}'
-        write_excel(datafile, output_tabname, dataframe)
+        tables[f'{future_demand_level_input}_{substitution_mode_input}_{vslp_input_control_input}'] = run_countries(
+            datafile, run_country_all_scenarios, future_demand_level_input, substitution_mode_input, vslp_input_control_input, run_settings, incremental=incremental, dtype=dtype, pool_storage=pool_storage, cache=result_cache, checkpoints=checkpoints, resume=resume, pool_store=pool_store)
 
 
     ################## Run the experiments ###################
@@ -332,24 +457,35 @@ def run_model_all_scenarios(years, discount_rate, version, path):
         return
 
     run_all_input_permutations()
+    # All the output tabs are written, the checkpoints are no longer needed
+    checkpoints.clear()
+    if pool_store is not None:
+        pool_store.write(Carbon_pool_export.default_filename(datafile))
 
-    return
+    return tables
 
 
-def run_model_main_scenario(years, discount_rate, version, sensdir, sensexp, path):
+def run_model_main_scenario(years, discount_rate, version, sensdir, sensexp, path, dtype='float64', pool_storage='dense', incremental=False, cache=False, resume=False, export_pools=False):
     """
     Created and Edited: 2022/11
     This is a driver for running global analysis for forestry land and carbon consequences.
     This is only for the main regrowth scenario 1, to save running time for sensitivity analysis
+    dtype: 'float64' (default) or 'float32' for the carbon pool matrices, see Global_by_country.Parameters
+    pool_storage: 'dense' (default) or 'banded' carbon pool matrices, 'banded' uses less memory for the long runs with many cycles, see Global_by_country.Parameters
+    incremental: only recompute the countries changed since the last run, see Run_manifest
+    cache: reuse the land area and carbon cost results computed in the previous runs, see Result_cache
+    resume: skip the countries completed before an interrupted run, see Checkpoint_store
+    export_pools: write the annual carbon pool series of all the countries and scenarios next to the data file, see Carbon_pool_export
+    Returns the output tabs {tab name: DataFrame}
     """
     # Read input/output data excel file.
     datafile = f'{path}/data/processed/{sensdir}/CHARM global - YR_{years} - DR_{discount_rate} - V{version} - {sensexp}.xlsx'
-
-    # Read in countries
-    countries = pd.read_excel(datafile, sheet_name='Inputs', usecols="A:B", skiprows=1)
-    # Read in input data
-    input_data = pd.read_excel(datafile, sheet_name='Inputs', skiprows=1)
-    # If the cell has formula, it will be read as NaN
+    run_settings = {'years': years, 'discount_rate': discount_rate, 'version': version, 'sensitivity_experiment': sensexp}
+    result_cache = Result_cache.ResultCache(Result_cache.default_directory(path)) if cache else None
+    checkpoints = Checkpoint_store.CheckpointStore(path, datafile)
+    pool_store = Carbon_pool_export.PoolSeriesStore() if export_pools else None
+    # Output tabs of the run, also written to the data file
+    tables = {}
 
     def single_run_with_combination_input(future_demand_level_input='BAU', substitution_mode_input='SUBON', vslp_input_control_input='ALL'):
         """
@@ -359,119 +495,8 @@ def run_model_main_scenario(years, discount_rate, version, sensdir, sensexp, pat
         :param vslp_input_control_input: select VSLP option from "ALL" total roundwood (VSLP_WFL+VSLP_IND) or "IND" industrial roundwood (VSLP_IND)
         :return:
         """
-        # Initiate the output variables.
-        # country name, code
-        countrynames, codes = [], []
-        # wood supply
-        secondary_wood_default, plantation_wood_default = [], []
-        # pdv
-        pdv_per_ha_plantation_default = []
-        pdv_per_ha_regrowth = []
-        # area
-        area_plantation = []
-        area_regrowth, carbon_regrowth, carbon_existing_plantation, carbon_secondary_regrowth = [], [], [], []
-        output_ha_agriland = []
-
-        # For each country, calculate the results for all scenarios. Each variable collects a list of the countries' results.
-        for country, code in zip(countries['Country'], countries['ISO']):
-            # Test if the parameters are set up for this country, if there is one parameter missing, no calculation will be done for this country.
-            input_country = input_data.loc[input_data['Country'] == country]
-            input_country = input_country.drop(['Emissions substitution factor for LLP (tC saved/tons C in LLP)'], axis=1)
-            if input_country.isnull().values.any():
-                print(f"Please fill in the abbreviation and all the missing parameters for country '{country}'!")
-            else:
-                ################################### Execute model runs ##################################
-                nyears_harvest_settings = Global_by_country.SetupTime(datafile, country_iso=code, nyears_run_control='harvest')
-                nyears_growth_settings = Global_by_country.SetupTime(datafile, country_iso=code, nyears_run_control='growth')
-                ### Default plantation scenarios, (1) secondary harvest regrowth and (2) conversion
-                ### Read in global parameters ###
-                global_harvest_settings = Global_by_country.Parameters(datafile, nyears_harvest_settings,
-                                                                        country_iso=code,
-                                                                       future_demand_level=future_demand_level_input,
-                                                                       substitution_mode=substitution_mode_input,
-                                                                       vslp_input_control=vslp_input_control_input)
-                global_growth_settings = Global_by_country.Parameters(datafile, nyears_growth_settings,
-                                                                       country_iso=code,
-                                                                       future_demand_level=future_demand_level_input,
-                                                                       substitution_mode=substitution_mode_input,
-                                                                       vslp_input_control=vslp_input_control_input)
-                # run different policy scenarios
-                result_plantation_default = Plantation_counterfactual_secondary_plantation_age_scenario.CarbonTracker(global_harvest_settings)
-                # result_conversion_default = Secondary_conversion_scenario.CarbonTracker(global_harvest_settings)
-                result_regrowth_default = Secondary_regrowth_scenario.CarbonTracker(global_harvest_settings)
-                # result_agriland_default = Agricultural_land_tropical_scenario.CarbonTracker(global_harvest_settings)
-
-                # run the land area calculator
-                LAC_default = Land_area_calculator.LandCalculator(global_harvest_settings)
-                if global_harvest_settings.rotation_length_harvest == 10:
-                    output_ha_agriland_default = LAC_default.output_ha_agriland[global_harvest_settings.year_index_harvest_plantation[1]-1]
-                else:
-                    output_ha_agriland_default = 0
-                # run the carbon cost calculator
-                CCC_default = Carbon_cost_calculator.CarbonCalculator(global_harvest_settings, global_growth_settings, LAC_default)
-
-                ################################### Prepare output ##################################
-                countrynames.append(country)
-                codes.append(code)
-
-                # Carbon tracker
-                pdv_per_ha_plantation_default.append(np.sum(result_plantation_default.annual_discounted_value))
-                pdv_per_ha_regrowth.append(np.sum(result_regrowth_default.annual_discounted_value))
-
-                # Get output per ha for new plantation
-                output_ha_agriland.append(output_ha_agriland_default)
-
-                # Default situation
-                secondary_wood_default.append(sum(LAC_default.output_need_secondary / 1000000))
-                plantation_wood_default.append(sum(LAC_default.product_total_carbon) / 1000000 - sum(LAC_default.output_need_secondary) / 1000000)
-                area_plantation.append(sum(CCC_default.area_harvested_new_plantation))
-
-                # Scenario 1
-                area_regrowth.append(sum(LAC_default.area_harvested_new_secondary_regrowth_combined))
-                carbon_regrowth.append(CCC_default.total_pdv_plantation_secondary_regrowth)
-                carbon_existing_plantation.append(CCC_default.total_pdv_plantation_sum)
-                carbon_secondary_regrowth.append(CCC_default.total_pdv_secondary_regrowth_sum)
-
-
-        # Save to the excel file
-        dataframe = pd.DataFrame({'Country': countrynames,
-                                  'ISO': codes,
-                                  # Save PDV
-                                  'PDV per ha Secondary middle regrowth (tC/ha)': pdv_per_ha_regrowth,
-                                  'PDV per ha Plantation (tC/ha)': pdv_per_ha_plantation_default,
-                                  # Save output
-                                  'Output per ha Agricultural land conversion (tC/ha)': output_ha_agriland,
-                                  # Save wood supply
-                                  'Default: Plantation supply wood (mega tC)': plantation_wood_default,
-                                  'Default: Secondary forest supply wood (mega tC)': secondary_wood_default,
-
-                                  # Save plantation area
-                                  'Plantation area (ha)': area_plantation,
-
-                                  # S1
-                                  'S1 regrowth: Secondary area (ha)': area_regrowth,
-                                  'S1 regrowth: total PDV (mega tC)': carbon_regrowth,
-                                  'S1 regrowth: PDV plantation (mega tC)': carbon_existing_plantation,
-                                  'S1 regrowth: PDV secondary (mega tC)': carbon_secondary_regrowth,
-
-                                  })
-
-        def write_excel(filename, sheetname, dataframe):
-            "This function will overwrite the Outputs sheet"
-            with pd.ExcelWriter(filename, engine='openpyxl', mode='a') as writer:
-                workbook = writer.book
-                try:
-                    workbook.remove(workbook[sheetname])
-                    print("Updating Outputs sheet...")
-                except:
-                    print("Creating Outputs sheet...")
-                finally:
-                    dataframe.to_excel(writer, sheet_name=sheetname, index=False)
-                    writer.save()
-
-        # Prepare output tab name
-        output_tabname = f'{future_demand_level_input}_{substitution_mode_input}_{vslp_input_control_input}'
-        write_excel(datafile, output_tabname, dataframe)
+        tables[f'{future_demand_level_input}_{substitution_mode_input}_{vslp_input_control_input}'] = run_countries(
+            datafile, run_country_main_scenario, future_demand_level_input, substitution_mode_input, vslp_input_control_input, run_settings, incremental=incremental, dtype=dtype, pool_storage=pool_storage, cache=result_cache, checkpoints=checkpoints, resume=resume, pool_store=pool_store)
 
 
     ################## Run the experiments ###################
@@ -491,8 +516,63 @@ def run_model_main_scenario(years, discount_rate, version, sensdir, sensexp, pat
         return
 
     run_key_input_permutations()
+    # All the output tabs are written, the checkpoints are no longer needed
+    checkpoints.clear()
+    if pool_store is not None:
+        pool_store.write(Carbon_pool_export.default_filename(datafile))
+
+    return tables
+
 
-    return
+def parse_sweep(text):
+    """Values of a sweep from 'start:stop:step' (stop included), e.g. '0:0.1:0.0025', or from a list, e.g. '0,0.02,0.04,0.06'"""
+    if ':' in text:
+        start, stop, step = [float(value) for value in text.split(':')]
+        return list(np.round(np.arange(start, stop + step / 2, step), 10))
+    return [float(value) for value in text.split(',')]
+
+
+def run_model_sweep(years, version, path, discount_rates=None, years_growth=None, main_scenario=False, dtype='float64', pool_storage='dense', cache=False):
+    """
+    Created and Edited: 2023/06
+    Run the model once per country and input permutation, and apply all the discount rates and years of growth to the same run,
+    instead of one full run per discount rate data file (DR_0p, DR_2p, ...) or years of growth data file (YR_40, YR_100).
+    The growth is simulated once to the longest years of growth. The shorter ones are prefix sums of the single harvest regrowth scenarios,
+    the plantation and conversion scenarios are run again to each years of growth (see Carbon_cost_calculator.CarbonCalculatorAtYearsGrowth), so that a row is the same as a separate run.
+    The results are written to a new workbook, one tab per input permutation, one row per country, discount rate and years of growth.
+    main_scenario: only the main regrowth scenario 1 and the key input permutations, as run_model_main_scenario
+    Returns the output tabs {tab name: DataFrame}, see results_summary_analysis.tables_by_discount_rate
+    """
+    datafile = f'{path}/data/processed/CHARM global - YR_{years} - DR_4p - V{version}.xlsx'
+    outfile = f'{path}/data/processed/CHARM global - YR_{years} - DR_4p - V{version} - sweep.xlsx'
+    result_cache = Result_cache.ResultCache(Result_cache.default_directory(path)) if cache else None
+    run_country = run_country_main_scenario if main_scenario else run_country_all_scenarios
+    if main_scenario:
+        input_permutations = [('BAU', 'NOSUB', 'ALL'), ('CST', 'NOSUB', 'ALL')]
+    else:
+        input_permutations = [(future_demand_level, substitution_mode, vslp_input_control) for vslp_input_control in ['ALL', 'IND', 'WFL'] for substitution_mode in ['NOSUB', 'SUBON'] for future_demand_level in ['BAU', 'CST']]
+
+    # Read the Inputs sheet once for all the countries and permutations
+    input_data = Global_by_country.read_inputs(datafile)
+    if years_growth is not None:
+        years_growth = [int(years) for years in years_growth]
+        input_data = input_data.copy()
+        input_data['Years of growth'] = max(years_growth)
+    tables = {}
+    with pd.ExcelWriter(outfile, engine='openpyxl') as writer:
+        for future_demand_level, substitution_mode, vslp_input_control in input_permutations:
+            output_rows = []
+            for country, code in zip(input_data['Country'], input_data['ISO']):
+                if not has_complete_inputs(input_data.loc[input_data['Country'] == country]):
+                    print(f"Please fill in the abbreviation and all the missing parameters for country '{country}'!")
+                    continue
+                output_rows.extend(run_country(input_data, country, code, future_demand_level_input=future_demand_level, substitution_mode_input=substitution_mode,
+                                               vslp_input_control_input=vslp_input_control, dtype=dtype, pool_storage=pool_storage, cache=result_cache, discount_rates=discount_rates, years_growth=years_growth))
+            output_tabname = f'{future_demand_level}_{substitution_mode}_{vslp_input_control}'
+            tables[output_tabname] = pd.DataFrame(output_rows)
+            tables[output_tabname].to_excel(writer, sheet_name=output_tabname, index=False)
+
+    return tables
 
 
 if __name__ == "__main__": # to avoid import run
@@ -511,12 +591,23 @@ if __name__ == "__main__": # to avoid import run
     parser.add_argument('--years-growth', default=40, help='The number of years of growth')
     parser.add_argument('--discount-rate', default='4p', help='The discount rate')
     parser.add_argument('--path', default=root, help='The root path of running the model')
+    parser.add_argument('--dtype', default='float64', choices=['float64', 'float32'], help='The floating point type of the carbon pool matrices')
+    parser.add_argument('--pool-storage', default='dense', choices=['dense', 'banded'], help='The storage of the carbon pool matrices, banded uses less memory for long runs')
+    parser.add_argument('--incremental', default=False, type=lambda x: (str(x).lower() in ['true', '1', 'yes']), help='Only recompute the countries changed since the last run')
+    parser.add_argument('--cache', default=False, type=lambda x: (str(x).lower() in ['true', '1', 'yes']), help='Reuse the land area and carbon cost results cached in data/interim')
+    parser.add_argument('--export-pools', default=False, type=lambda x: (str(x).lower() in ['true', '1', 'yes']), help='Write the annual carbon pool series of all the countries and scenarios next to the data file')
+    parser.add_argument('--resume', default=False, type=lambda x: (str(x).lower() in ['true', '1', 'yes']), help='Skip the countries completed before an interrupted run')
+    parser.add_argument('--discount-rate-sweep', default=None, type=parse_sweep, help="Discount rates applied to one run of all the scenarios, e.g. '0:0.1:0.0025' or '0,0.02,0.04,0.06'")
+    parser.add_argument('--years-growth-sweep', default=None, type=parse_sweep, help="Years of growth from one run of all the scenarios to the longest, e.g. '40:150:10' or '40,100'")
 
     args = parser.parse_args()
 
     if args.run_main == True:
         for discount_rate in ['4p', '0p', '2p', '6p']:
-            run_model_all_scenarios(args.years_growth, discount_rate, '20230125', args.path)
+            run_model_all_scenarios(args.years_growth, discount_rate, '20230125', args.path, dtype=args.dtype, pool_storage=args.pool_storage, incremental=args.incremental, cache=args.cache, resume=args.resume, export_pools=args.export_pools)
+
+    if args.discount_rate_sweep is not None or args.years_growth_sweep is not None:
+        run_model_sweep(args.years_growth, '20230125', args.path, discount_rates=args.discount_rate_sweep, years_growth=args.years_growth_sweep, dtype=args.dtype, pool_storage=args.pool_storage, cache=args.cache)
 
     if args.run_sensitivity == True:
 
@@ -526,5 +617,5 @@ if __name__ == "__main__": # to avoid import run
         trade_exps = ['Trade_50U', 'Trade_50D']
 
         for experiment in growth_exps:
-            run_model_main_scenario(args.years_growth, args.discount_rate, '20230125', 'run_NatSensitivity_20230125', experiment, args.path)
+            run_model_main_scenario(args.years_growth, args.discount_rate, '20230125', 'run_NatSensitivity_20230125', experiment, args.path, dtype=args.dtype, pool_storage=args.pool_storage, incremental=args.incremental, cache=args.cache, resume=args.resume, export_pools=args.export_pools)
 
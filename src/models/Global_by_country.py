@@ -29,7 +29,17 @@ __version__ = "1.0"
 
 import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
+import Carbon_pool_kernel
+
+
+def read_inputs(datafile):
+    """
+    Inputs table of the data file
+    datafile: path of the excel data file, or the Inputs table already loaded (DataFrame), e.g. with the overrides of a sensitivity experiment
+    """
+    if isinstance(datafile, pd.DataFrame):
+        return datafile
+    return pd.read_excel(datafile, sheet_name='Inputs', skiprows=1)
 
 
 class SetupTime:
@@ -38,7 +48,7 @@ class SetupTime:
         """Read in time inputs
         Preparing output of the nyears for Class Parameters
         """
-        input_data = pd.read_excel(datafile, sheet_name='Inputs', skiprows=1)
+        input_data = read_inputs(datafile)
         self.input_country = input_data.loc[input_data['ISO'] == country_iso]  # Country ISO code
         self.country_name = self.input_country['Country'].values[0]
         self.nyears_run_control = nyears_run_control
@@ -71,10 +81,17 @@ class SetupTime:
 
 class Parameters:
 
-    def __init__(self, datafile, nyears_setup, country_iso='BRA', discount_rate_input=None, future_demand_level='BAU', substitution_mode='SUB', vslp_input_control='ALL', vslp_future_demand='default', secondary_mature_wood_share=0, plantation_growth_increase_ratio=1.0, slash_rate_mode='natural'):
-        """Read in inputs"""
+    def __init__(self, datafile, nyears_setup, country_iso='BRA', discount_rate_input=None, future_demand_level='BAU', substitution_mode='SUB', vslp_input_control='ALL', vslp_future_demand='default', secondary_mature_wood_share=0, plantation_growth_increase_ratio=1.0, slash_rate_mode='natural', dtype='float64', pool_storage='dense'):
+        """Read in inputs
+        dtype: floating point type of the per cycle pool matrices in the carbon trackers and the PDV matrices in the carbon cost calculator.
+            'float32' halves their memory. Each pool value is rounded to 2**-24 relative (about 7 significant digits), while the totals and PDVs are accumulated in float64.
+            Error bound of the PDV per ha: |PDV_float32 - PDV_float64| <= 2 * nyears * 2**-24 * maximum total carbon stock (tC/ha), e.g. 0.004 tC/ha for 100 years and 300 tC/ha.
+            The total PDVs (mega tC) scale with the area, so their relative error is the same, in practice about 1e-5 or less.
+        pool_storage: 'dense' (default) numpy (ncycles, arraylength) matrices for the per cycle pools in the carbon trackers,
+            or 'banded' Cycle_pool_matrix that only stores each cycle from its year of harvest/thinning. Same results, less memory with many cycles.
+        """
 
-        input_data = pd.read_excel(datafile, sheet_name='Inputs', skiprows=1)
+        input_data = read_inputs(datafile)
         self.input_country = input_data.loc[input_data['ISO']==country_iso] # Country ISO code
         self.country_name = self.input_country['Country'].values[0]
         self.nyears = nyears_setup.nyears
@@ -88,6 +105,8 @@ class Parameters:
         self.secondary_mature_wood_share = secondary_mature_wood_share  # for secondary wood supply distribution among the secondary forest
         self.plantation_growth_increase_ratio = plantation_growth_increase_ratio  # for productivity increase ratio
         self.slash_rate_mode = slash_rate_mode
+        self.dtype = np.dtype(dtype)  # for the carbon pool matrices, float64 or float32
+        self.pool_storage = pool_storage  # for the carbon pool matrices, dense or banded
         del input_data
 
         ### Run the functions
@@ -145,6 +164,9 @@ class Parameters:
         # Experiment 1: root_shoot_coef increases 25 %, Experiment 2: root_shoot_coef decreases 25%
         # self.root_shoot_coef = 0.489 * self.input_country['Root to Shoot ratio scaling factor'].values[0]
         # FIXME in the future, build the parameter into the parameter file
+        # 2023/06 The scaling factor is applied when the column is in the Inputs table, e.g. added by a sensitivity experiment override (see Sensitivity)
+        if 'Root to Shoot ratio scaling factor' in self.input_country.columns:
+            self.root_shoot_coef = 0.489 * self.input_country['Root to Shoot ratio scaling factor'].values[0]
 
         self.root_shoot_power = 0.89
         self.carbon_wood_ratio = 0.5
@@ -450,15 +472,7 @@ class Parameters:
         ### Step.3 To get the staggered array for slash percentage
         def staircase(array):
             # Piecewise array for aboveground biomass actually harvested/thinned during rotation harvest/thinning
-            outarray = np.zeros(array.shape)
-            if len(array.shape) == 1:
-                df = pd.DataFrame(array)
-                outarray = df.replace(to_replace=0, method='ffill').values.reshape(array.shape)
-            else: # array.shape = 2
-                for row in range(array.shape[0]):
-                    df = pd.DataFrame(array[row, :])
-                    outarray[row, :] = df.replace(to_replace=0, value=None, method='ffill').values.reshape(array.shape[1])
-            return outarray
+            return Carbon_pool_kernel.forward_fill_zeros(array)
 
         self.slash_percentage_plantation, self.slash_percentage_secondary_conversion, self.slash_percentage_secondary_regrowth = [staircase(slash_percentage) for slash_percentage in [slash_percentage_plantation, slash_percentage_secondary_conversion, slash_percentage_secondary_regrowth]]
 
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+Global sensitivity analysis of the carbon costs over the input parameters
+In addition to the one-at-a-time experiments (Sensitivity), the parameters are varied together within their bounds:
+1. Sobol: variance based first order (S1) and total order (ST) indices, from a Saltelli design of N * (n_params + 2) evaluations
+    Saltelli et al. 2010, Variance based sensitivity analysis of model output. Design and estimator for the total sensitivity index
+2. Morris: elementary effects (mu, mu_star, sigma), from r one-at-a-time trajectories of (n_params + 1) evaluations on a grid of levels
+    Morris 1991, Campolongo et al. 2007
+
+The designs are evaluated by Sensitivity.evaluate_batch, one full Driver country run per sample in a process pool, the indices are reported per country and output variable.
+
+Example:
+    parameters = [Sensitivity.Parameter('GR1_GR2', ['Young Secondary GR', 'Middle Secondary GR'], 0.75, 1.25),
+                  Sensitivity.Parameter('LLP half life', 'LLP half life', 20, 40, relative=False)]
+    indices = sobol_analysis(datafile, parameters, nsamples=256)
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import numpy as np
+import pandas as pd
+import Sensitivity
+
+
+def _scale_to_bounds(U, parameters):
+    """Unit hypercube samples to the parameter bounds"""
+    low = np.array([parameter.low for parameter in parameters], dtype=np.float64)
+    high = np.array([parameter.high for parameter in parameters], dtype=np.float64)
+    return low + U * (high - low)
+
+
+######################## Sobol ##############################
+def saltelli_design(parameters, nsamples, seed=None):
+    """
+    Saltelli design: the rows of A, B and AB_i (A with the column i from B) for each parameter i
+    :return: (nsamples * (n_params + 2), n_params) matrix, in the order A, B, AB_1, ..., AB_n
+    """
+    rng = np.random.default_rng(seed)
+    nparams = len(parameters)
+    U = rng.random((nsamples, 2 * nparams))
+    A, B = U[:, :nparams], U[:, nparams:]
+    blocks = [A, B]
+    for i in range(nparams):
+        AB = A.copy()
+        AB[:, i] = B[:, i]
+        blocks.append(AB)
+    return _scale_to_bounds(np.concatenate(blocks), parameters)
+
+
+def sobol_indices(Y, nparams):
+    """
+    First and total order Sobol indices from the outputs of the Saltelli design
+    :param Y: (nsamples * (n_params + 2), ...) outputs, in the order of saltelli_design
+    :return: S1, ST of shape (n_params, ...)
+    """
+    nsamples = Y.shape[0] // (nparams + 2)
+    Y_A, Y_B = Y[:nsamples], Y[nsamples:2 * nsamples]
+    variance = np.var(np.concatenate([Y_A, Y_B]), axis=0)
+    S1, ST = [np.zeros((nparams,) + Y.shape[1:]) for _ in range(2)]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(nparams):
+            Y_AB = Y[(i + 2) * nsamples:(i + 3) * nsamples]
+            # Saltelli 2010 first order, Jansen total order
+            # An output that does not vary (zero variance) has NaN indices
+            S1[i] = np.mean(Y_B * (Y_AB - Y_A), axis=0) / variance
+            ST[i] = 0.5 * np.mean((Y_A - Y_AB) ** 2, axis=0) / variance
+    return S1, ST
+
+
+def sobol_analysis(datafile, parameters, nsamples, seed=None, **kwargs):
+    """
+    Sobol indices per country and output variable
+    kwargs are passed to Sensitivity.evaluate_batch (variables, scenario settings, processes)
+    :return: DataFrame with the columns ISO, variable, parameter, S1, ST
+    """
+    X = saltelli_design(parameters, nsamples, seed=seed)
+    Y, codes, variables = Sensitivity.evaluate_batch(datafile, parameters, X, **kwargs)
+    S1, ST = sobol_indices(Y, len(parameters))
+    return _indices_frame(codes, variables, parameters, {'S1': S1, 'ST': ST})
+
+
+######################## Morris ##############################
+def morris_design(parameters, ntrajectories, nlevels=4, seed=None):
+    """
+    Morris trajectories on a grid of nlevels in the unit hypercube, each parameter moves once by +/- delta in a random order
+    :return: X of (ntrajectories * (n_params + 1), n_params), and the (ntrajectories, n_params) parameter moved at each step and its signed delta
+    """
+    rng = np.random.default_rng(seed)
+    nparams = len(parameters)
+    delta = nlevels / (2 * (nlevels - 1))
+    # Base points on the levels from which +delta stays in [0, 1]
+    base_levels = np.arange(nlevels // 2) / (nlevels - 1)
+    U = np.zeros((ntrajectories, nparams + 1, nparams))
+    moved = np.zeros((ntrajectories, nparams), dtype=int)
+    steps = np.zeros((ntrajectories, nparams))
+    for trajectory in range(ntrajectories):
+        point = rng.choice(base_levels, nparams)
+        # Start from the upper end for half of the parameters, so that they move down
+        direction = rng.choice([-1, 1], nparams)
+        point = np.where(direction < 0, point + delta, point)
+        U[trajectory, 0] = point
+        moved[trajectory] = rng.permutation(nparams)
+        for step, i in enumerate(moved[trajectory]):
+            point = point.copy()
+            point[i] += direction[i] * delta
+            U[trajectory, step + 1] = point
+            steps[trajectory, step] = direction[i] * delta
+    return _scale_to_bounds(U.reshape(-1, nparams), parameters), moved, steps
+
+
+def morris_indices(Y, moved, steps):
+    """
+    Elementary effects statistics from the outputs of the Morris design, in units of the output per unit of the normalized parameter range
+    :return: mu, mu_star, sigma of shape (n_params, ...)
+    """
+    ntrajectories, nparams = moved.shape
+    Y = Y.reshape((ntrajectories, nparams + 1) + Y.shape[1:])
+    effects = np.zeros((ntrajectories, nparams) + Y.shape[2:])
+    for trajectory in range(ntrajectories):
+        for step, i in enumerate(moved[trajectory]):
+            effects[trajectory, i] = (Y[trajectory, step + 1] - Y[trajectory, step]) / steps[trajectory, step]
+    return np.mean(effects, axis=0), np.mean(np.abs(effects), axis=0), np.std(effects, axis=0, ddof=1) if ntrajectories > 1 else np.zeros(effects.shape[1:])
+
+
+def morris_analysis(datafile, parameters, ntrajectories, nlevels=4, seed=None, **kwargs):
+    """
+    Morris elementary effects per country and output variable
+    kwargs are passed to Sensitivity.evaluate_batch (variables, scenario settings, processes)
+    :return: DataFrame with the columns ISO, variable, parameter, mu, mu_star, sigma
+    """
+    X, moved, steps = morris_design(parameters, ntrajectories, nlevels=nlevels, seed=seed)
+    Y, codes, variables = Sensitivity.evaluate_batch(datafile, parameters, X, **kwargs)
+    mu, mu_star, sigma = morris_indices(Y, moved, steps)
+    return _indices_frame(codes, variables, parameters, {'mu': mu, 'mu_star': mu_star, 'sigma': sigma})
+
+
+def _indices_frame(codes, variables, parameters, indices):
+    """Tidy table of the (n_params, n_countries, n_variables) indices"""
+    rows = []
+    for iparam, parameter in enumerate(parameters):
+        for icode, code in enumerate(codes):
+            for ivariable, variable in enumerate(variables):
+                rows.append({'ISO': code, 'variable': variable, 'parameter': parameter.name,
+                             **{name: index[iparam, icode, ivariable] for name, index in indices.items()}})
+    return pd.DataFrame(rows)
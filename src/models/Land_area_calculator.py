@@ -22,14 +22,14 @@ __email__ = "liqing.peng@wri.org"
 __version__ = "1.0"
 
 import numpy as np
-import pandas as pd
 import Secondary_conversion_scenario, Secondary_regrowth_scenario, Secondary_mature_regrowth_scenario, Agricultural_land_tropical_scenario
 import Plantation_counterfactual_secondary_plantation_age_scenario
+import Carbon_pool_kernel
 
 
 class LandCalculator:
 
-    def __init__(self, Global):
+    def __init__(self, Global, keep_intermediates=True):
         # set up the country profile
         # this is for 40 years
         self.Global = Global
@@ -37,19 +37,19 @@ class LandCalculator:
         # calculate output per ha.
         # Use the first year of PDV (default), as it does not matter which year it starts, all the biomass after full harvest is the same.
         # output per ha for plantation
-        self.output_ha_plantation = self.calculate_output_ha(Plantation_counterfactual_secondary_plantation_age_scenario.CarbonTracker(self.Global, year_start_for_PDV=0), self.Global.slash_percentage_plantation)
+        self.output_ha_plantation = self.calculate_output_ha(Plantation_counterfactual_secondary_plantation_age_scenario.CarbonTracker(self.Global, year_start_for_PDV=0, keep_intermediates=False), self.Global.slash_percentage_plantation)
 
         # output per ha for secondary
-        self.output_ha_secondary_conversion = self.calculate_output_ha(Secondary_conversion_scenario.CarbonTracker(self.Global, year_start_for_PDV=0),
+        self.output_ha_secondary_conversion = self.calculate_output_ha(Secondary_conversion_scenario.CarbonTracker(self.Global, year_start_for_PDV=0, keep_intermediates=False),
             self.Global.slash_percentage_secondary_conversion)
-        self.output_ha_secondary_regrowth = self.calculate_output_ha(Secondary_regrowth_scenario.CarbonTracker(self.Global, year_start_for_PDV=0),
+        self.output_ha_secondary_regrowth = self.calculate_output_ha(Secondary_regrowth_scenario.CarbonTracker(self.Global, year_start_for_PDV=0, keep_intermediates=False),
             self.Global.slash_percentage_secondary_regrowth)
         # Add new scenario for mature secondary forest regrowth (>120 years)
-        self.output_ha_secondary_mature_regrowth = self.calculate_output_ha(Secondary_mature_regrowth_scenario.CarbonTracker(self.Global, year_start_for_PDV=0),
+        self.output_ha_secondary_mature_regrowth = self.calculate_output_ha(Secondary_mature_regrowth_scenario.CarbonTracker(self.Global, year_start_for_PDV=0, keep_intermediates=False),
             self.Global.slash_percentage_secondary_regrowth)
 
         # Add new scenario for tropical agricultural land converted to plantation
-        self.output_ha_agriland = self.calculate_output_ha(Agricultural_land_tropical_scenario.CarbonTracker(self.Global, year_start_for_PDV=0),
+        self.output_ha_agriland = self.calculate_output_ha(Agricultural_land_tropical_scenario.CarbonTracker(self.Global, year_start_for_PDV=0, keep_intermediates=False),
             self.Global.slash_percentage_plantation)
 
 
@@ -67,6 +67,10 @@ class LandCalculator:
         # Add secondary regrowth and secondary mature regrowth together
         self.area_harvested_new_secondary_regrowth_combined = self.area_harvested_new_secondary_regrowth + self.area_harvested_new_secondary_mature_regrowth
 
+        # The output per ha of the secondary forests is a year to year matrix, only needed for the area calculation
+        if not keep_intermediates:
+            del self.output_ha_secondary_conversion, self.output_ha_secondary_regrowth, self.output_ha_secondary_mature_regrowth
+
 
     ####################################################### OUTPUT per ha ###########################################################
 
@@ -87,15 +91,11 @@ class LandCalculator:
             if len(product_share_slash.shape) == 1:
                 # Get the output = production by removing the slash share (depending whether it is a harvest/thinning)
                 output_ha = aboveground_biomass_diff * (1 - product_share_slash[1:])
-                df = pd.DataFrame(output_ha)
-                output_ha_outarray = df.replace(to_replace=0, method='ffill').values.reshape(output_ha.shape)
+                output_ha_outarray = Carbon_pool_kernel.forward_fill_zeros(output_ha)
             else: # array.shape = 2
                 # FIXME change the slash rate to a 42x41 matrix to store different start year 40 year cycle
                 output_ha = aboveground_biomass_diff[None, :] * (1 - product_share_slash[:, 1:])  # [None:, ] means a new axis
-                output_ha_outarray = np.zeros(output_ha.shape)
-                for row in range(output_ha.shape[0]):
-                    df = pd.DataFrame(output_ha[row, :])
-                    output_ha_outarray[row, :] = df.replace(to_replace=0, value=None, method='ffill').values.reshape(output_ha.shape[1])
+                output_ha_outarray = Carbon_pool_kernel.forward_fill_zeros(output_ha)
             return output_ha_outarray
 
         output_ha_staircase = exclude_slash_staircase()
@@ -126,8 +126,7 @@ class LandCalculator:
         # Get the output = production by removing the slash share (depending whether it is a harvest/thinning)
         output_ha_thinning = aboveground_biomass_diff_thinning * (1 - product_share_slash[1:])
         # Piecewise array for aboveground biomass actually harvested/thinned during rotation harvest/thinning
-        output_ha_thinning = pd.DataFrame(output_ha_thinning)
-        output_ha_thinning = output_ha_thinning.replace(to_replace=0, method='ffill').values.reshape(self.Global.nyears)
+        output_ha_thinning = Carbon_pool_kernel.forward_fill_zeros(output_ha_thinning)
 
         return output_ha_thinning
 
@@ -181,40 +180,14 @@ class LandCalculator:
             # Add the first year to calculate the duration of first cycle
             year_index_thinning.insert(0, 1)
 
-            # Get the period lengths for all cycles
-            cycle_lengths = np.diff(year_index_thinning)
-            ncycles_thinning = len(cycle_lengths)
-            # print(year_index_thinning, cycle_lengths)
-
             # Get the output per ha
             output_ha_plantation_thinning = self.calculate_output_ha_thinning(
-                Plantation_counterfactual_secondary_plantation_age_scenario.CarbonTracker(self.Global, year_start_for_PDV=0),
+                Plantation_counterfactual_secondary_plantation_age_scenario.CarbonTracker(self.Global, year_start_for_PDV=0, keep_intermediates=False),
                 self.Global.slash_percentage_plantation)
 
-            for current_cycle in range(0, ncycles_thinning):
-                ### st year and end year of each period, shift -1 to remove the first initial condition
-                st_cycle = year_index_thinning[current_cycle] - 1
-                if current_cycle < ncycles_thinning - 1:
-                    ed_cycle = year_index_thinning[current_cycle + 1] - 1
-                else:
-                    ed_cycle = self.Global.nyears
-
-                for year in range(st_cycle, ed_cycle):
-                    # calculate wood thinning accumulation for one year except for the first cycle Current cycle = 0, no wood accumulation
-                    # Current cycle > 0
-                    for previous_cycle in range(0, current_cycle):
-                        Nyears_Ncycles_before = 0
-                        Nyears_Ncycles_ahead = 0
-                        for i in range(previous_cycle, current_cycle):
-                            Nyears_Ncycles_before = Nyears_Ncycles_before + cycle_lengths[i]
-                        for j in range(0, previous_cycle):
-                            Nyears_Ncycles_ahead = Nyears_Ncycles_ahead + cycle_lengths[j]
-                        # staggered array only for thinning production output
-                        self.wood_thinning_accumulate_plantation[year] = self.wood_thinning_accumulate_plantation[year] + \
-                                                                    self.area_harvested_plantation[
-                                                                        year - Nyears_Ncycles_before] * \
-                                                                    output_ha_plantation_thinning[
-                                                                        year - Nyears_Ncycles_ahead]
+            # calculate wood thinning accumulation for one year except for the first cycle Current cycle = 0, no wood accumulation
+            # staggered array only for thinning production output
+            self.wood_thinning_accumulate_plantation = Carbon_pool_kernel.thinning_accumulate(self.area_harvested_plantation, output_ha_plantation_thinning, year_index_thinning, self.Global.nyears)
 
 
     def calculate_new_area_secondary_conversion(self, output_ha_secondary):
@@ -222,47 +195,14 @@ class LandCalculator:
         Calculate the total new area being harvested from the secondary forest converted to plantation
         use year index both for plantation, ncycles_harvest
         """
-        # Initialize two variables
-        area_harvested_new_secondary = np.zeros((self.Global.nyears))
-        wood_harvest_accumulate_secondary = np.zeros((self.Global.nyears))
-
-        year_index_harvest_thinning = self.Global.year_index_both_plantation.copy()
-        # Add the last year to calculate the duration
-        year_index_harvest_thinning.insert(self.Global.ncycles_harvest, self.Global.nyears)
-        # Get the period lengths for all cycles
-        cycle_lengths = np.diff(year_index_harvest_thinning)
-
-        for current_cycle in range(0, self.Global.ncycles_harvest):
-            ### st year and end year of each period, shift -1 to remove the first initial condition
-            st_cycle = self.Global.year_index_both_plantation[current_cycle] - 1
-            if current_cycle < self.Global.ncycles_harvest - 1:
-                ed_cycle = self.Global.year_index_both_plantation[current_cycle + 1] - 1
-            else:
-                ed_cycle = self.Global.nyears
-
-            # calculating the area harvested between year zero and the first thinning, the secondary area harvested (assuming all supply is not met by plantation) is simply:
-            # area_harvested_secondary_new = output_need_secondary / output_ha_secondary_first_harvest
-            for year in range(st_cycle, ed_cycle):
-                # calculating the area harvested AFTER a thinning, account for the wood that you are getting from the secondary thinning and plantation harvest/thinning.
-                # Because, in a perfectly managed forest, the thinnings and harvests would be able to supply all the wood required, thus eliminating the need to harvest any ADDITIONAL hectares.
-                # Then for each subsequent harvest/thinning, you subtract another (output from thinning * area harvested in year (x-rotation))
-
-                # Current cycle > 0
-                for previous_cycle in range(0, current_cycle):
-                    Nyears_Ncycles_before = 0
-                    Nyears_Ncycles_ahead = 0
-                    for i in range(previous_cycle, current_cycle):
-                        Nyears_Ncycles_before = Nyears_Ncycles_before + cycle_lengths[i]
-                    for j in range(0, previous_cycle):
-                        Nyears_Ncycles_ahead = Nyears_Ncycles_ahead + cycle_lengths[j]
-                    # This is the wood from the second harvest. output_need_secondary - wood_harvest_accumulate_secondary is the first harvest quantity
-                    wood_harvest_accumulate_secondary[year] = wood_harvest_accumulate_secondary[year] + area_harvested_new_secondary[year - Nyears_Ncycles_before] * output_ha_secondary[year, year - Nyears_Ncycles_ahead]   # 2D array output_ha_secondary[year - Nyears_Ncycles_ahead]
-                if (self.output_need_secondary[year] - wood_harvest_accumulate_secondary[year] - self.wood_thinning_accumulate_plantation[year]) > 0:
-                    # !!!! divide by output from first harvest !!!!
-                    # This is to track the secondary area that is first harvested (not the wood reharvesting from the same ha)
-                    area_harvested_new_secondary[year] = (self.output_need_secondary[year] - wood_harvest_accumulate_secondary[year] - self.wood_thinning_accumulate_plantation[year]) / output_ha_secondary[year, 0]    # output_ha_secondary[0]
-                else:
-                    area_harvested_new_secondary[year] = 0
+        # calculating the area harvested between year zero and the first thinning, the secondary area harvested (assuming all supply is not met by plantation) is simply:
+        # area_harvested_secondary_new = output_need_secondary / output_ha_secondary_first_harvest
+        # calculating the area harvested AFTER a thinning, account for the wood that you are getting from the secondary thinning and plantation harvest/thinning.
+        # Because, in a perfectly managed forest, the thinnings and harvests would be able to supply all the wood required, thus eliminating the need to harvest any ADDITIONAL hectares.
+        # Then for each subsequent harvest/thinning, you subtract another (output from thinning * area harvested in year (x-rotation))
+        # This is to track the secondary area that is first harvested (not the wood reharvesting from the same ha)
+        area_harvested_new_secondary, wood_harvest_accumulate_secondary = Carbon_pool_kernel.new_area_secondary(
+            self.output_need_secondary, self.wood_thinning_accumulate_plantation, output_ha_secondary, self.Global.year_index_both_plantation, self.Global.nyears)
 
         return area_harvested_new_secondary, wood_harvest_accumulate_secondary
 
@@ -275,42 +215,8 @@ class LandCalculator:
         # Add a parameter to mix the percentage of wood from secondary middle aged and secondary mature forest
         secondary_wood_share = 1 - self.Global.secondary_mature_wood_share
 
-        # Initialize two variables
-        area_harvested_new_secondary = np.zeros((self.Global.nyears))
-        wood_harvest_accumulate_secondary = np.zeros((self.Global.nyears))
-
-        year_index_harvest_thinning = self.Global.year_index_both_regrowth.copy()
-        # Add the last year to calculate the duration
-        year_index_harvest_thinning.insert(self.Global.ncycles_regrowth, self.Global.nyears)
-        # Get the period lengths for all cycles
-        cycle_lengths = np.diff(year_index_harvest_thinning)
-        # print(year_index_harvest_thinning, cycle_lengths)
-
-
-        for current_cycle in range(0, self.Global.ncycles_regrowth):
-            ### st year and end year of each period, shift -1 to remove the first initial condition
-            st_cycle = self.Global.year_index_both_regrowth[current_cycle] - 1
-            if current_cycle < self.Global.ncycles_regrowth - 1:
-                ed_cycle = self.Global.year_index_both_regrowth[current_cycle + 1] - 1
-            else:
-                ed_cycle = self.Global.nyears
-            for year in range(st_cycle, ed_cycle):
-                for previous_cycle in range(0, current_cycle):
-                    Nyears_Ncycles_before = 0
-                    Nyears_Ncycles_ahead = 0
-                    for i in range(previous_cycle, current_cycle):
-                        Nyears_Ncycles_before = Nyears_Ncycles_before + cycle_lengths[i]
-                    for j in range(0, previous_cycle):
-                        Nyears_Ncycles_ahead = Nyears_Ncycles_ahead + cycle_lengths[j]
-                    # This is the wood from the second harvest. output_need_secondary - wood_harvest_accumulate_secondary is the first harvest quantity
-                    wood_harvest_accumulate_secondary[year] = wood_harvest_accumulate_secondary[year] + area_harvested_new_secondary[year - Nyears_Ncycles_before] * output_ha_secondary[year, year - Nyears_Ncycles_ahead]     # 2D array output_ha_secondary[year - Nyears_Ncycles_ahead]
-
-
-                if (self.output_need_secondary[year] * secondary_wood_share - wood_harvest_accumulate_secondary[year] - self.wood_thinning_accumulate_plantation[year]) > 0:
-                    # !!!! divide by output from first harvest !!!!
-                    area_harvested_new_secondary[year] = (self.output_need_secondary[year] * secondary_wood_share - wood_harvest_accumulate_secondary[year] - self.wood_thinning_accumulate_plantation[year]) / output_ha_secondary[year, 0]    # output_ha_secondary[0]
-                else:
-                    area_harvested_new_secondary[year] = 0
+        area_harvested_new_secondary, wood_harvest_accumulate_secondary = Carbon_pool_kernel.new_area_secondary(
+            self.output_need_secondary * secondary_wood_share, self.wood_thinning_accumulate_plantation, output_ha_secondary, self.Global.year_index_both_regrowth, self.Global.nyears)
 
         return area_harvested_new_secondary, wood_harvest_accumulate_secondary
 
@@ -323,40 +229,7 @@ class LandCalculator:
         # Add a parameter to mix the percentage of wood from secondary middle aged and secondary mature forest
         secondary_wood_share = self.Global.secondary_mature_wood_share
 
-        # Initialize two variables
-        area_harvested_new_secondary = np.zeros((self.Global.nyears))
-        wood_harvest_accumulate_secondary = np.zeros((self.Global.nyears))
-
-        year_index_harvest_thinning = self.Global.year_index_both_regrowth.copy()
-        # Add the last year to calculate the duration
-        year_index_harvest_thinning.insert(self.Global.ncycles_regrowth, self.Global.nyears)
-        # Get the period lengths for all cycles
-        cycle_lengths = np.diff(year_index_harvest_thinning)
-        # print(year_index_harvest_thinning, cycle_lengths)
-
-        for current_cycle in range(0, self.Global.ncycles_regrowth):
-            ### st year and end year of each period, shift -1 to remove the first initial condition
-            st_cycle = self.Global.year_index_both_regrowth[current_cycle] - 1
-            if current_cycle < self.Global.ncycles_regrowth - 1:
-                ed_cycle = self.Global.year_index_both_regrowth[current_cycle + 1] - 1
-            else:
-                ed_cycle = self.Global.nyears
-            for year in range(st_cycle, ed_cycle):
-                for previous_cycle in range(0, current_cycle):
-                    Nyears_Ncycles_before = 0
-                    Nyears_Ncycles_ahead = 0
-                    for i in range(previous_cycle, current_cycle):
-                        Nyears_Ncycles_before = Nyears_Ncycles_before + cycle_lengths[i]
-                    for j in range(0, previous_cycle):
-                        Nyears_Ncycles_ahead = Nyears_Ncycles_ahead + cycle_lengths[j]
-                    # This is the wood from the second harvest. output_need_secondary - wood_harvest_accumulate_secondary is the first harvest quantity
-                    wood_harvest_accumulate_secondary[year] = wood_harvest_accumulate_secondary[year] +  area_harvested_new_secondary[year - Nyears_Ncycles_before] * output_ha_secondary[year, year - Nyears_Ncycles_ahead]   # 2D array output_ha_secondary[year - Nyears_Ncycles_ahead]
-
-
-                if (self.output_need_secondary[year] * secondary_wood_share - wood_harvest_accumulate_secondary[year] - self.wood_thinning_accumulate_plantation[year]) > 0:
-                    # !!!! divide by output from first harvest !!!!
-                    area_harvested_new_secondary[year] = (self.output_need_secondary[year] * secondary_wood_share - wood_harvest_accumulate_secondary[year] - self.wood_thinning_accumulate_plantation[year]) / output_ha_secondary[year, 0]   # output_ha_secondary[0]
-                else:
-                    area_harvested_new_secondary[year] = 0
+        area_harvested_new_secondary, wood_harvest_accumulate_secondary = Carbon_pool_kernel.new_area_secondary(
+            self.output_need_secondary * secondary_wood_share, self.wood_thinning_accumulate_plantation, output_ha_secondary, self.Global.year_index_both_regrowth, self.Global.nyears)
 
         return area_harvested_new_secondary, wood_harvest_accumulate_secondary
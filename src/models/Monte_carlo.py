@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+"""
+Monte Carlo uncertainty of the carbon costs over the input parameters
+1. Draw N samples of selected columns of the Inputs table (growth rates, half lives, slash rates, root to shoot scaling factor, substitution factors)
+   from user specified distributions, either as a scaling factor of the input value or as the input value itself
+   The draws are kept as one compact (nsamples x nparams) array per country, the overridden Inputs rows are only built in the workers.
+2. Run the scenarios for every (sample, country) in a process pool, on the Inputs table in memory (no excel re-read, see Sensitivity).
+   The Inputs table is sent once to each worker, the tasks are blocks of samples of one country, submitted in a bounded window
+   so that the memory does not grow with the number of samples.
+3. Stream the percentile summaries per country and for the global total while the samples complete
+
+Example:
+    samples = [ScaleSample(['Young Secondary GR', 'Middle Secondary GR'], Triangular(0.75, 1.0, 1.25)),
+               ReplaceSample('LLP half life', Uniform(20, 40)),
+               ReplaceSample('Root to Shoot ratio scaling factor', Normal(1.0, 0.1))]
+    for nsamples_done, summary in iter_monte_carlo(datafile, samples, nsamples=10000):
+        print(nsamples_done, summary.loc[summary['ISO'] == 'Global'])
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import os
+import concurrent.futures
+import numpy as np
+import pandas as pd
+import Global_by_country, Driver, Sensitivity
+
+
+######################## Distributions ##############################
+class Uniform:
+    def __init__(self, low, high):
+        self.low, self.high = low, high
+
+    def sample(self, rng, size):
+        return rng.uniform(self.low, self.high, size)
+
+
+class Normal:
+    def __init__(self, mean, sd):
+        self.mean, self.sd = mean, sd
+
+    def sample(self, rng, size):
+        return rng.normal(self.mean, self.sd, size)
+
+
+class LogNormal:
+    def __init__(self, mean, sigma):
+        """mean and sigma of the underlying normal distribution"""
+        self.mean, self.sigma = mean, sigma
+
+    def sample(self, rng, size):
+        return rng.lognormal(self.mean, self.sigma, size)
+
+
+class Triangular:
+    def __init__(self, low, mode, high):
+        self.low, self.mode, self.high = low, mode, high
+
+    def sample(self, rng, size):
+        return rng.triangular(self.low, self.mode, self.high, size)
+
+
+######################## Sampled inputs ##############################
+class ScaleSample:
+
+    def __init__(self, columns, distribution, per_country=False):
+        """
+        Scale the columns by a factor drawn from the distribution
+        per_country: draw a factor for each country, otherwise one factor per sample for all countries
+        """
+        self.columns = columns
+        self.distribution = distribution
+        self.per_country = per_country
+
+    def draw(self, rng, nsamples, ncountries):
+        """(nsamples, ncountries) factors"""
+        if self.per_country:
+            return self.distribution.sample(rng, (nsamples, ncountries))
+        return np.repeat(self.distribution.sample(rng, nsamples)[:, np.newaxis], ncountries, axis=1)
+
+    def override(self, value):
+        """Sensitivity override of one drawn factor"""
+        return Sensitivity.Scale(self.columns, value)
+
+
+class ReplaceSample:
+
+    def __init__(self, column, distribution, per_country=False):
+        """
+        Replace the column by a value drawn from the distribution
+        per_country: draw a value for each country, otherwise one value per sample for all countries
+        """
+        self.column = column
+        self.distribution = distribution
+        self.per_country = per_country
+
+    def draw(self, rng, nsamples, ncountries):
+        """(nsamples, ncountries) values"""
+        if self.per_country:
+            return self.distribution.sample(rng, (nsamples, ncountries))
+        return np.repeat(self.distribution.sample(rng, nsamples)[:, np.newaxis], ncountries, axis=1)
+
+    def override(self, value):
+        """Sensitivity override of one drawn value"""
+        return Sensitivity.Replace(self.column, value)
+
+
+def draw_samples(samples, nsamples, ncountries, seed=None):
+    """
+    Draws of all the samples, without building the Inputs tables
+    :return: (ncountries, nsamples, n_params) array, one column per ScaleSample/ReplaceSample
+    """
+    rng = np.random.default_rng(seed)
+    draws = np.zeros((ncountries, nsamples, len(samples)))
+    for iparam, sample in enumerate(samples):
+        draws[:, :, iparam] = sample.draw(rng, nsamples, ncountries).T
+    return draws
+
+
+######################## Run and summarize ##############################
+# Inputs table of the complete countries, samples and run settings of the worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(inputs, samples, settings):
+    _worker.update(inputs=inputs, samples=samples, settings=settings)
+
+
+def _run_task(icountry, isample_start, draws_task):
+    """Output rows of a block of samples of one country, in a worker process. The country's row is overridden with each sample's draws."""
+    inputs, samples, settings = _worker['inputs'], _worker['samples'], _worker['settings']
+    input_country = inputs.iloc[[icountry]]
+    country, code = input_country['Country'].iloc[0], input_country['ISO'].iloc[0]
+    run_country = Driver.run_country_main_scenario if settings['main_scenario'] else Driver.run_country_all_scenarios
+    output_rows = []
+    for values in draws_task:
+        input_sample = Sensitivity.apply_overrides(input_country, [sample.override(value) for sample, value in zip(samples, values)])
+        output_rows.append(run_country(input_sample, country, code, future_demand_level_input=settings['future_demand_level'], substitution_mode_input=settings['substitution_mode'],
+                                       vslp_input_control_input=settings['vslp_input_control'], dtype=settings['dtype'], pool_storage=settings['pool_storage']))
+    return icountry, isample_start, output_rows
+
+
+def summarize(values, codes, variables, nsamples_done, percentiles):
+    """
+    Percentile summary per country and for the global total of the first nsamples_done samples
+    values: (n_countries, n_variables, n_samples) array of the outputs
+    The global total is the sum over the countries of each sample, for the variables that add up (totals and areas, not the per ha values)
+    """
+    summary = []
+    for icode, code in enumerate(codes):
+        for ivariable, variable in enumerate(variables):
+            summary.append(_summary_row(code, variable, values[icode, ivariable, :nsamples_done], percentiles))
+    for ivariable, variable in enumerate(variables):
+        if 'per ha' in variable:
+            continue
+        summary.append(_summary_row('Global', variable, values[:, ivariable, :nsamples_done].sum(axis=0), percentiles))
+    return pd.DataFrame(summary)
+
+
+def _summary_row(code, variable, values, percentiles):
+    values = np.asarray(values, dtype=np.float64)
+    row = {'ISO': code, 'variable': variable, 'nsamples': len(values), 'mean': np.mean(values) if len(values) else np.nan}
+    for percentile, value in zip(percentiles, np.percentile(values, percentiles) if len(values) else [np.nan] * len(percentiles)):
+        row[f'p{percentile:g}'] = value
+    return row
+
+
+def iter_monte_carlo(datafile, samples, nsamples, seed=None, future_demand_level='BAU', substitution_mode='SUBON', vslp_input_control='ALL',
+                     main_scenario=False, variables=None, percentiles=(5, 50, 95), processes=None, report_every=None, samples_per_task=8, dtype='float64', pool_storage='dense'):
+    """
+    Run the Monte Carlo samples and yield (number of completed samples, percentile summary DataFrame) every report_every samples and at the end
+    :param datafile: path of the excel data file, or the Inputs table (DataFrame)
+    :param samples: list of ScaleSample/ReplaceSample
+    :param main_scenario: only the main regrowth scenario 1 (run_country_main_scenario), otherwise all the scenarios (run_country_all_scenarios)
+    :param variables: output columns to summarize, default all the numeric outputs
+    :param processes: number of worker processes, default the number of CPUs, 1 to run in this process
+    :param samples_per_task: number of samples of one country run by a worker task
+    :param dtype, pool_storage: the carbon pool matrices, see Global_by_country.Parameters
+    """
+    inputs = Global_by_country.read_inputs(datafile)
+    # Same test as in the Driver, no calculation for a country with a missing parameter
+    complete = [Driver.has_complete_inputs(inputs.loc[[index]]) for index in inputs.index]
+    for country in inputs.loc[[not flag for flag in complete], 'Country']:
+        print(f"Please fill in the abbreviation and all the missing parameters for country '{country}'!")
+    inputs = inputs.loc[complete].reset_index(drop=True)
+    codes = list(inputs['ISO'])
+    draws = draw_samples(samples, nsamples, len(codes), seed=seed)
+    settings = {'future_demand_level': future_demand_level, 'substitution_mode': substitution_mode, 'vslp_input_control': vslp_input_control,
+                'main_scenario': main_scenario, 'dtype': dtype, 'pool_storage': pool_storage}
+
+    # Tasks are (country, block of samples), the blocks in the order of the samples so that the samples complete one after another
+    tasks = ((icountry, isample_start, draws[icountry, isample_start:isample_start + samples_per_task])
+             for isample_start in range(0, nsamples, samples_per_task) for icountry in range(len(codes)))
+    report_every = max(nsamples // 10, 1) if report_every is None else report_every
+
+    # (n_countries, n_variables, n_samples) outputs, allocated with the first output row
+    values = None
+    ncountries_done = np.zeros(nsamples, dtype=int)
+    nsamples_done, nsamples_reported = 0, 0
+
+    def collect(icountry, isample_start, output_rows):
+        nonlocal variables, values
+        if variables is None:
+            variables = [name for name in output_rows[0] if name not in ('Country', 'ISO')]
+        if values is None:
+            values = np.full((len(codes), len(variables), nsamples), np.nan)
+        for isample, output_row in enumerate(output_rows, start=isample_start):
+            values[icountry, :, isample] = [output_row[variable] for variable in variables]
+            ncountries_done[isample] += 1
+
+    processes = os.cpu_count() if processes is None else processes
+    if processes > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(inputs, samples, settings))
+        completed_tasks = Sensitivity.bounded_map(executor, _run_task, tasks, window=2 * processes)
+    else:
+        executor = None
+        _init_worker(inputs, samples, settings)
+        completed_tasks = (_run_task(*task) for task in tasks)
+    try:
+        for icountry, isample_start, output_rows in completed_tasks:
+            collect(icountry, isample_start, output_rows)
+            # The samples done by all the countries, from the first one
+            while nsamples_done < nsamples and ncountries_done[nsamples_done] == len(codes):
+                nsamples_done += 1
+            # A block of samples may complete several reports at once, each report is on its first multiple of report_every samples
+            while nsamples_reported + report_every <= nsamples_done and nsamples_reported + report_every < nsamples:
+                nsamples_reported += report_every
+                yield nsamples_reported, summarize(values, codes, variables, nsamples_reported, percentiles)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    if values is None:
+        values = np.zeros((len(codes), len(variables or []), nsamples))
+    yield nsamples_done, summarize(values, codes, variables or [], nsamples_done, percentiles)
+
+
+def run_monte_carlo(datafile, samples, nsamples, **kwargs):
+    """Final percentile summary of iter_monte_carlo"""
+    for nsamples_done, summary in iter_monte_carlo(datafile, samples, nsamples, **kwargs):
+        pass
+    return summary
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+"""
+Content addressed on-disk cache of the land area calculator and carbon cost calculator results
+1. The key is the digest of all the fields of the Parameters (the country inputs and the scenario settings) plus the digest of the scripts of the scenario modules and calculators
+2. Each result is one .npz file of the arrays and scalars of the calculator, by default under ./data/interim/result_cache/
+3. Least recently used files are removed when the cache grows beyond max_bytes
+4. Invalidation: ResultCache(directory).clear(), or from the command line
+    python Result_cache.py --clear --path ../..
+
+The same country results are then computed once across the runs, e.g. the unchanged countries in the sensitivity experiments of run_model_main_scenario.
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import os
+import glob
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import Land_area_calculator, Carbon_cost_calculator
+import Secondary_regrowth_scenario, Secondary_mature_regrowth_scenario, Secondary_conversion_scenario, Secondary_regrowth_closed_form
+import Plantation_counterfactual_secondary_plantation_age_scenario, Agricultural_land_tropical_scenario
+import Carbon_pool_kernel, Cycle_pool_matrix, Tracker_result
+
+# The modules computing the land area calculator and carbon cost calculator results, a change in any of them invalidates the cache
+SCENARIO_MODULES = [Land_area_calculator, Carbon_cost_calculator,
+                    Secondary_regrowth_scenario, Secondary_mature_regrowth_scenario, Secondary_conversion_scenario, Secondary_regrowth_closed_form,
+                    Plantation_counterfactual_secondary_plantation_age_scenario, Agricultural_land_tropical_scenario,
+                    Carbon_pool_kernel, Cycle_pool_matrix, Tracker_result]
+
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+
+def scenario_module_version():
+    """Digest of the scripts of the scenario modules and calculators"""
+    digest = hashlib.sha256()
+    for module in SCENARIO_MODULES:
+        digest.update(module.__name__.encode())
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _update_digest(digest, value):
+    """Add one Parameters field to the digest, exact for the arrays and floats"""
+    if isinstance(value, np.ndarray):
+        digest.update(f'ndarray{value.dtype.str}{value.shape}'.encode())
+        digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, pd.DataFrame):
+        digest.update(json.dumps([list(value.columns), value.values.tolist()], default=str).encode())
+    elif isinstance(value, np.generic):
+        digest.update(repr(value.item()).encode())
+    else:
+        digest.update(repr(value).encode())
+
+
+# Scenario settings of the Parameters that are only read in Global_by_country to derive the other fields (growth rates, product shares, slash rates, ...).
+# They are left out of the digest so that a scenario variant with the same effective parameters has the same digest,
+# e.g. the optimal slash rate where it equals the natural one, or the 50% less WFL demand under the constant demand.
+SETTING_FIELDS = ('discount_rate_input', 'future_demand_level', 'substitution_mode', 'vslp_input_control', 'vslp_future_demand', 'plantation_growth_increase_ratio', 'slash_rate_mode')
+
+# Fields of the Parameters that a scenario of the carbon cost calculator does not read, so that its annual flux is reused when only they change:
+# the secondary wood share is only read by the land area calculator, the plantation growth rates only by the plantation scenarios
+LAND_AREA_FIELDS = ('secondary_mature_wood_share',)
+PLANTATION_GROWTH_FIELDS = ('GR_young_plantation', 'GR_old_plantation')
+SCENARIO_UNUSED_FIELDS = {'plantation': LAND_AREA_FIELDS,
+                          'secondary_conversion': LAND_AREA_FIELDS + PLANTATION_GROWTH_FIELDS,
+                          'secondary_regrowth': LAND_AREA_FIELDS + PLANTATION_GROWTH_FIELDS,
+                          'secondary_mature_regrowth': LAND_AREA_FIELDS + PLANTATION_GROWTH_FIELDS}
+
+
+def parameters_digest(Global, exclude=()):
+    """Digest of the effective fields of a Parameters object, i.e. the country inputs and the arrays derived from them with the scenario settings, except the exclude fields"""
+    digest = hashlib.sha256()
+    for name, value in sorted(vars(Global).items()):
+        if name in SETTING_FIELDS or name in exclude:
+            continue
+        digest.update(name.encode())
+        _update_digest(digest, value)
+    return digest.hexdigest()
+
+
+class CachedResult:
+    """Calculator result loaded from the cache, with the same result attributes as the calculator"""
+
+    def __init__(self, **attributes):
+        for name, value in attributes.items():
+            setattr(self, name, value)
+
+
+class ResultCache:
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.module_version = scenario_module_version()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, calculator_name, *Globals):
+        digest = hashlib.sha256()
+        digest.update(calculator_name.encode())
+        digest.update(self.module_version.encode())
+        for Global in Globals:
+            digest.update(parameters_digest(Global).encode())
+        return digest.hexdigest()
+
+    def _filename(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key):
+        """Arrays and scalars of a cached result, None if not cached"""
+        filename = self._filename(key)
+        if not os.path.exists(filename):
+            return None
+        with np.load(filename) as npz:
+            result = {name: (npz[name][()] if npz[name].ndim == 0 else npz[name]) for name in npz.files}
+        # Mark as recently used
+        os.utime(filename)
+        return result
+
+    def put(self, key, calculator):
+        """Save the array and scalar results of a calculator, the Parameters and other objects are not saved"""
+        results = {name: value for name, value in vars(calculator).items() if isinstance(value, (np.ndarray, np.generic, int, float))}
+        filename = self._filename(key)
+        # Write to a temporary file first so that an interrupted run does not leave a broken entry
+        with open(filename + '.tmp', 'wb') as f:
+            np.savez(f, **results)
+        os.replace(filename + '.tmp', filename)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used results until the cache is within max_bytes"""
+        files = sorted(glob.glob(os.path.join(self.directory, '*.npz')), key=os.path.getmtime)
+        total_bytes = sum(os.path.getsize(filename) for filename in files)
+        while files and total_bytes > self.max_bytes:
+            filename = files.pop(0)
+            total_bytes -= os.path.getsize(filename)
+            os.remove(filename)
+
+    def clear(self):
+        """Invalidate all the cached results"""
+        for filename in glob.glob(os.path.join(self.directory, '*.npz')):
+            os.remove(filename)
+
+
+def land_calculator(Global, cache=None):
+    """LandCalculator(Global, keep_intermediates=False), read from the cache if it was computed before"""
+    if cache is None:
+        return Land_area_calculator.LandCalculator(Global, keep_intermediates=False)
+    key = cache.key('LandCalculator', Global)
+    result = cache.get(key)
+    if result is None:
+        calculator = Land_area_calculator.LandCalculator(Global, keep_intermediates=False)
+        cache.put(key, calculator)
+        return calculator
+    return CachedResult(Global=Global, **result)
+
+
+def carbon_calculator(Global_harvest, Global_growth, Land_area, cache=None, flux_memo=None):
+    """CarbonCalculator(Global_harvest, Global_growth, Land_area, flux_memo), read from the cache if it was computed before. The land area only depends on Global_harvest."""
+    if cache is None:
+        return Carbon_cost_calculator.CarbonCalculator(Global_harvest, Global_growth, Land_area, flux_memo=flux_memo)
+    key = cache.key('CarbonCalculator', Global_harvest, Global_growth)
+    result = cache.get(key)
+    if result is None:
+        calculator = Carbon_cost_calculator.CarbonCalculator(Global_harvest, Global_growth, Land_area, flux_memo=flux_memo)
+        cache.put(key, calculator)
+        return calculator
+    return CachedResult(Global_harvest=Global_harvest, Global_growth=Global_growth, Land_area=Land_area, **result)
+
+
+class RunMemo:
+    """
+    In-memory results of the scenario variants of one country run, keyed by the parameters digests.
+    A variant whose effective parameters equal those of a computed one reuses its results instead of re-running the carbon trackers and calculators,
+    e.g. the optimal slash rate outside the tropics, the 50% less WFL demand under the constant demand,
+    the annual flux of the 50:50 secondary supply and of the secondary scenarios with the plantation growth increase.
+    """
+
+    def __init__(self, cache=None):
+        # On-disk ResultCache of the calculators, None to compute without it
+        self.cache = cache
+        self.results = {}
+        self.digests = {}
+        self.nreused = 0
+
+    def digest(self, Global, exclude=()):
+        # The Parameters are kept with their digest so that the id is not reused
+        key = (id(Global), exclude)
+        if key not in self.digests:
+            self.digests[key] = (Global, parameters_digest(Global, exclude=exclude))
+        return self.digests[key][1]
+
+    def _get(self, key, compute):
+        if key in self.results:
+            self.nreused += 1
+        else:
+            self.results[key] = compute()
+        return self.results[key]
+
+    def tracker(self, scenario_module, Global):
+        """Slim result of CarbonTracker(Global, keep_intermediates=False) of the scenario module"""
+        return self._get((scenario_module.__name__, self.digest(Global)), lambda: scenario_module.CarbonTracker(Global, keep_intermediates=False).slim_result())
+
+    def land_calculator(self, Global):
+        return self._get(('LandCalculator', self.digest(Global)), lambda: land_calculator(Global, self.cache))
+
+    def carbon_calculator(self, Global_harvest, Global_growth, Land_area):
+        return self._get(('CarbonCalculator', self.digest(Global_harvest), self.digest(Global_growth)),
+                         lambda: carbon_calculator(Global_harvest, Global_growth, Land_area, self.cache, flux_memo=self))
+
+    def flux(self, scenario, Global, nyears_start, compute):
+        """(annual flux, discounted year) of a scenario of the carbon cost calculator"""
+        return self._get(('flux', scenario, nyears_start, self.digest(Global, exclude=SCENARIO_UNUSED_FIELDS.get(scenario, ()))), compute)
+
+
+def default_directory(path):
+    return f'{path}/data/interim/result_cache'
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(prog='Result_cache', description='Manage the cache of the CHARM land area and carbon cost results', usage='%(prog)s [options]')
+    parser.add_argument('--path', default='../..', help='The root path of running the model')
+    parser.add_argument('--clear', default=False, action='store_true', help='Remove all the cached results')
+    args = parser.parse_args()
+
+    cache = ResultCache(default_directory(args.path))
+    if args.clear:
+        cache.clear()
+        print(f"Cleared the result cache {cache.directory}")
+    else:
+        files = glob.glob(os.path.join(cache.directory, '*.npz'))
+        print(f"{len(files)} cached results, {sum(os.path.getsize(filename) for filename in files) / 1024 ** 2:.1f} MB in {cache.directory}")
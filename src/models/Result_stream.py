@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Streaming of the country results from the Driver runs to the writers
+1. Each country result is emitted as a CountryRecord onto a queue as soon as it is ready
+2. A writer thread consumes the queue concurrently with the model runs and passes each record to the writers:
+    ColumnStore: the output tab, each row appended to a temporary file so that the rows are not kept in memory during the run,
+                 the DataFrame is built at the end of the tab to be written to the excel file
+    ProgressReport: one line per country with the number of countries done, the source of the result and the run time
+    PartialCSV: appends the output row to "<data file name> - <output tab> - partial.csv" next to the data file,
+                so that the partial results of a long run can be read while it runs. It is removed once the tab is written.
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import os
+import csv
+import pickle
+import queue
+import tempfile
+import threading
+import pandas as pd
+
+
+class CountryRecord:
+
+    __slots__ = ('tabname', 'country', 'code', 'source', 'seconds', 'output_row')
+
+    def __init__(self, tabname, country, code, source, seconds, output_row):
+        """
+        One country's row of an output tab
+        source: 'computed', 'unchanged' (kept from the last run, see Run_manifest) or 'checkpoint' (see Checkpoint_store)
+        """
+        self.tabname = tabname
+        self.country = country
+        self.code = code
+        self.source = source
+        self.seconds = seconds
+        self.output_row = output_row
+
+    def __repr__(self):
+        return f"CountryRecord({self.tabname!r}, {self.code!r}, source={self.source!r}, seconds={self.seconds:.1f})"
+
+
+class ColumnStore:
+    """Output tab, in the order of the columns of the first row. The rows are pickled one after another to a temporary file and read back by to_frame."""
+
+    def __init__(self):
+        # Removed when closed or garbage collected
+        self.file = tempfile.TemporaryFile()
+        self.nrows = 0
+
+    def write(self, record):
+        pickle.dump(record.output_row, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.nrows += 1
+
+    def close(self):
+        self.file.flush()
+
+    def to_frame(self):
+        self.file.seek(0)
+        # A column missing in some rows is filled with NaN
+        frame = pd.DataFrame([pickle.load(self.file) for _ in range(self.nrows)])
+        self.file.seek(0, os.SEEK_END)
+        return frame
+
+
+class ProgressReport:
+
+    def __init__(self, tabname, ncountries):
+        self.tabname = tabname
+        self.ncountries = ncountries
+        self.ndone = 0
+        self.seconds = 0
+
+    def write(self, record):
+        self.ndone += 1
+        self.seconds += record.seconds
+        print(f"[{self.tabname}] {self.ndone}/{self.ncountries} {record.country} ({record.source}, {record.seconds:.1f} s)")
+
+    def close(self):
+        print(f"[{self.tabname}] {self.ndone} countries done in {self.seconds:.1f} s")
+
+
+def partial_filename(datafile, tabname):
+    return f'{os.path.splitext(datafile)[0]} - {tabname} - partial.csv'
+
+
+class PartialCSV:
+
+    def __init__(self, filename):
+        """Start a new partial file, a file left by an interrupted run is replaced"""
+        self.filename = filename
+        self.fieldnames = None
+        if os.path.exists(filename):
+            os.remove(filename)
+
+    def write(self, record):
+        if self.fieldnames is None:
+            self.fieldnames = list(record.output_row)
+        new_fieldnames = [name for name in record.output_row if name not in self.fieldnames]
+        if new_fieldnames:
+            # A column missing in the previous rows, the file is written again with all the columns, the previous rows are empty in the new columns
+            self.fieldnames += new_fieldnames
+            with open(self.filename, newline='') as f:
+                rows = list(csv.DictReader(f))
+            with open(self.filename, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=self.fieldnames)
+                writer.writeheader()
+                writer.writerows(rows)
+        # Open and close the file for each row, so that the rows can be read during the run
+        with open(self.filename, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=self.fieldnames)
+            if f.tell() == 0:
+                writer.writeheader()
+            writer.writerow(record.output_row)
+
+    def close(self):
+        pass
+
+    def remove(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+
+class ResultStream:
+
+    def __init__(self, writers):
+        """Queue of the CountryRecords, passed to each writer (write(record) and close()) by a writer thread"""
+        self.writers = writers
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._consume, daemon=True)
+        self.thread.start()
+
+    def _consume(self):
+        while True:
+            record = self.queue.get()
+            if record is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                for writer in self.writers:
+                    writer.write(record)
+            except Exception as error:
+                # Raised in the model thread by close, the remaining records are drained
+                self.error = error
+
+    def emit(self, record):
+        self.queue.put(record)
+
+    def close(self, raise_error=True):
+        """Wait for the writers to consume all the records, and raise the error of a writer if raise_error"""
+        self.queue.put(None)
+        self.thread.join()
+        for writer in self.writers:
+            writer.close()
+        if self.error is not None and raise_error:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # An error of the model loop is raised as it is, not replaced by an error of a writer
+        self.close(raise_error=exc_type is None)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Run manifest for incremental re-runs of the Driver
+The manifest is a json file next to the data file. For every output tab it records a digest per country of
+1. the country's row in the Inputs sheet
+2. the scenario settings of the run (years, discount rate, demand level, substitution mode, VSLP input, dtype)
+3. the code version, a digest of the scripts of the country run in ./src/models/ (Driver and the model modules it runs, see country_run_scripts)
+
+In an incremental re-run, a country whose digest did not change keeps its row of the existing output tab,
+only the changed countries are recomputed and spliced into the table.
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import os
+import ast
+import json
+import hashlib
+import pandas as pd
+
+
+def manifest_path(datafile):
+    """The manifest of 'CHARM global - ... .xlsx' is 'CHARM global - ... - manifest.json' in the same folder"""
+    return os.path.splitext(datafile)[0] + ' - manifest.json'
+
+
+# The country run: the run_country_* functions of the Driver, and the model modules it calls, with the model modules they import.
+# The other modules of the Driver (manifest, checkpoints, result stream, ...) and the scripts outside the run (Scenario_service, Monte_carlo, ...) are not included.
+COUNTRY_RUN_SCRIPT = 'Driver'
+COUNTRY_RUN_MODULES = ['Global_by_country', 'Result_cache', 'Plantation_counterfactual_secondary_plantation_age_scenario', 'Secondary_conversion_scenario',
+                       'Secondary_regrowth_scenario', 'Secondary_mature_regrowth_scenario', 'Agricultural_land_tropical_scenario', 'Carbon_cost_calculator', 'Tracker_result']
+
+
+def _imported_models(script):
+    """Model modules imported at the top level of a script, the imports inside the functions (e.g. Carbon_pool_plot) are not run by the model"""
+    directory = os.path.dirname(script)
+    with open(script) as f:
+        tree = ast.parse(f.read())
+    names = [alias.name for node in tree.body if isinstance(node, ast.Import) for alias in node.names]
+    return [name for name in names if os.path.isfile(os.path.join(directory, f'{name}.py'))]
+
+
+def country_run_scripts():
+    """Scripts of the country run, sorted"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    scripts, pending = set(), list(COUNTRY_RUN_MODULES)
+    while pending:
+        script = os.path.join(directory, f'{pending.pop()}.py')
+        if script not in scripts:
+            scripts.add(script)
+            pending.extend(_imported_models(script))
+    scripts.add(os.path.join(directory, f'{COUNTRY_RUN_SCRIPT}.py'))
+    return sorted(scripts)
+
+
+def code_version():
+    """Digest of the scripts of the country run, any change in their code invalidates all the countries"""
+    digest = hashlib.sha256()
+    for script in country_run_scripts():
+        digest.update(os.path.basename(script).encode())
+        with open(script, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def country_digest(input_country, run_settings, code_digest=None):
+    """
+    Digest of one country run
+    input_country: the country's row of the Inputs sheet (one row DataFrame)
+    run_settings: dict of the scenario settings of the run
+    """
+    digest = hashlib.sha256()
+    # json keeps the full float precision, the NaN (formula cells) and the column names
+    digest.update(json.dumps(list(zip(input_country.columns, input_country.iloc[0].tolist())), default=str).encode())
+    digest.update(json.dumps(run_settings, sort_keys=True, default=str).encode())
+    digest.update((code_digest if code_digest is not None else code_version()).encode())
+    return digest.hexdigest()
+
+
+def read_output_tab(datafile, tabname):
+    """Existing output tab of the data file, None if the tab does not exist yet"""
+    try:
+        return pd.read_excel(datafile, sheet_name=tabname)
+    except ValueError:
+        # Worksheet not found
+        return None
+
+
+class RunManifest:
+
+    def __init__(self, datafile):
+        self.path = manifest_path(datafile)
+        self.code_digest = code_version()
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.tabs = json.load(f)['tabs']
+        else:
+            self.tabs = {}
+
+    def digest(self, input_country, run_settings):
+        return country_digest(input_country, run_settings, code_digest=self.code_digest)
+
+    def is_current(self, tabname, code, digest):
+        """The country was already run with the same inputs, settings and code"""
+        return self.tabs.get(tabname, {}).get(code) == digest
+
+    def update_tab(self, tabname, country_digests):
+        """Replace the digests of one output tab after it is written, country_digests is {ISO: digest}"""
+        self.tabs[tabname] = dict(country_digests)
+
+    def save(self):
+        with open(self.path, 'w') as f:
+            json.dump({'code_version': self.code_digest, 'tabs': self.tabs}, f, indent=1, sort_keys=True)
+
+
+def reuse_row(existing_tab, code):
+    """Row of a country in the existing output tab as a dict, None if the country is not in the tab"""
+    if existing_tab is None:
+        return None
+    rows = existing_tab.loc[existing_tab['ISO'] == code]
+    if len(rows) != 1:
+        return None
+    return rows.iloc[0].to_dict()
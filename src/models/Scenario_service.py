@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""
+Local HTTP service for the scenario evaluation of one country
+The Inputs table is read once at start-up and kept in the worker processes, with the model code loaded (and compiled with numba) by a warm-up run,
+so that a 'what if' request only runs the country's scenarios, e.g. BRA under the constant demand with 30% higher plantation growth rates:
+
+    POST /evaluate
+    {"country": "BRA", "future_demand_level": "CST", "substitution_mode": "SUBON", "vslp_input_control": "ALL",
+     "scale": {"Young Plantation GR": 1.3, "Middle Plantation GR": 1.3}, "replace": {"LLP half life": 30}}
+
+The optional "scale" and "replace" are the overrides of the Inputs columns (see Sensitivity.Scale and Sensitivity.Replace),
+"scenarios" is "main" (the main regrowth scenario 1, default) or "all" (all the scenarios of the output tabs).
+The response is the country's output row (PDV, areas and wood supply) as in the output tabs, with the run time in seconds.
+The requests are run in a process pool, the same request is only run once and its result is kept in memory.
+
+    GET /countries: the countries of the Inputs table
+
+From the command line, e.g. in ./src/models
+    python Scenario_service.py --years-growth 40 --discount-rate 4p --port 8050
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import os
+import json
+import math
+import time
+import threading
+import collections
+import concurrent.futures
+import http.server
+import numpy as np
+import pandas as pd
+import Global_by_country, Driver, Sensitivity, Result_cache
+
+SCENARIO_LEVELS = {'future_demand_level': ['BAU', 'CST'], 'substitution_mode': ['SUBON', 'NOSUB'], 'vslp_input_control': ['ALL', 'IND', 'WFL']}
+RUN_COUNTRY = {'main': Driver.run_country_main_scenario, 'all': Driver.run_country_all_scenarios}
+
+
+class InvalidRequest(Exception):
+    """The request cannot be evaluated, answered with 400"""
+
+
+class UnknownCountry(Exception):
+    """The country of the request is not in the Inputs table, answered with 404"""
+
+######################## Worker processes ##############################
+# Inputs table and result cache of the worker process, set by _init_worker
+_inputs = None
+_cache = None
+
+
+def _init_worker(inputs, cache_directory):
+    global _inputs, _cache
+    _inputs = inputs
+    _cache = Result_cache.ResultCache(cache_directory) if cache_directory is not None else None
+    # Warm-up run of the first country, to load the model and compile the numba kernels before the first request
+    code = next(code for code in _inputs['ISO'] if Driver.has_complete_inputs(_inputs.loc[_inputs['ISO'] == code]))
+    _run_request({'country': code, 'scenarios': 'main'})
+
+
+def _worker_ready():
+    return _inputs is not None
+
+
+def _run_request(request):
+    """Output row of one normalized request (see ScenarioService.normalize), in a worker process"""
+    start = time.perf_counter()
+    overrides = [Sensitivity.Scale(column, factor) for column, factor in request.get('scale', {}).items()] + \
+                [Sensitivity.Replace(column, value) for column, value in request.get('replace', {}).items()]
+    input_country = Sensitivity.apply_overrides(_inputs.loc[_inputs['ISO'] == request['country']], overrides)
+    if not Driver.has_complete_inputs(input_country):
+        raise InvalidRequest(f"Missing parameters for country '{request['country']}'")
+    country = input_country['Country'].iloc[0]
+    output_row = RUN_COUNTRY[request['scenarios']](input_country, country, request['country'], dtype='float64', cache=_cache,
+                                                   **{f'{name}_input': request.get(name, levels[0]) for name, levels in SCENARIO_LEVELS.items()})
+    return output_row, time.perf_counter() - start
+
+
+######################## Service ##############################
+class ScenarioService:
+
+    def __init__(self, datafile, processes=None, cache_directory=None, max_results=4096):
+        """
+        :param datafile: path of the excel data file, or the Inputs table (DataFrame)
+        :param processes: number of worker processes, default the number of CPUs
+        :param cache_directory: directory of the Result_cache.ResultCache shared by the workers, None to compute without it
+        :param max_results: number of request results kept in memory
+        """
+        self.inputs = Global_by_country.read_inputs(datafile)
+        processes = os.cpu_count() if processes is None else processes
+        self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(self.inputs, cache_directory))
+        # The workers are started (and warmed up) at once, not at the first requests
+        concurrent.futures.wait([self.executor.submit(_worker_ready) for _ in range(processes)])
+        # Futures of the requests, so that a request already running or done is not run again
+        self.results = collections.OrderedDict()
+        self.max_results = max_results
+        self.lock = threading.Lock()
+
+    def countries(self):
+        return [{'Country': country, 'ISO': code} for country, code in zip(self.inputs['Country'], self.inputs['ISO'])]
+
+    def normalize(self, request):
+        """Check the request and fill in the defaults, raises UnknownCountry for an unknown country and InvalidRequest for an invalid request"""
+        if not isinstance(request, dict) or 'country' not in request:
+            raise InvalidRequest("The request must be a JSON object with the 'country'")
+        unknown = set(request) - {'country', 'scenarios', 'scale', 'replace'} - set(SCENARIO_LEVELS)
+        if unknown:
+            raise InvalidRequest(f"Unknown request fields {sorted(unknown)}")
+        if request['country'] not in set(self.inputs['ISO']):
+            raise UnknownCountry(f"Country '{request['country']}' is not in the Inputs table")
+        normalized = {'country': request['country'], 'scenarios': request.get('scenarios', 'main')}
+        if normalized['scenarios'] not in RUN_COUNTRY:
+            raise InvalidRequest(f"'scenarios' must be one of {list(RUN_COUNTRY)}")
+        for name, levels in SCENARIO_LEVELS.items():
+            normalized[name] = request.get(name, levels[0])
+            if normalized[name] not in levels:
+                raise InvalidRequest(f"'{name}' must be one of {levels}")
+        for kind in ['scale', 'replace']:
+            overrides = request.get(kind, {})
+            if not isinstance(overrides, dict) or not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in overrides.values()):
+                raise InvalidRequest(f"'{kind}' must be an object of {{Inputs column: number}}")
+            missing = [column for column in overrides if column not in self.inputs.columns]
+            if missing:
+                raise InvalidRequest(f"Columns {missing} are not in the Inputs table")
+            not_numeric = [column for column in overrides if not pd.api.types.is_numeric_dtype(self.inputs[column])]
+            if not_numeric:
+                raise InvalidRequest(f"Columns {not_numeric} are not numeric parameters of the Inputs table")
+            normalized[kind] = {column: float(overrides[column]) for column in sorted(overrides)}
+        return normalized
+
+    def evaluate(self, request):
+        """Output row of the request and the run time, {column name: value}"""
+        request = self.normalize(request)
+        key = json.dumps(request, sort_keys=True)
+        with self.lock:
+            future = self.results.get(key)
+            if future is None:
+                future = self.results[key] = self.executor.submit(_run_request, request)
+                if len(self.results) > self.max_results:
+                    self.results.popitem(last=False)
+            else:
+                self.results.move_to_end(key)
+        try:
+            output_row, seconds = future.result()
+        except Exception:
+            # A failed request is run again next time
+            with self.lock:
+                if self.results.get(key) is future:
+                    del self.results[key]
+            raise
+        return {**{name: _json_value(value) for name, value in output_row.items()}, 'seconds': seconds}
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+def _json_value(value):
+    """numpy scalars as Python numbers, NaN as null"""
+    if isinstance(value, (np.generic, float)):
+        value = value.item() if isinstance(value, np.generic) else value
+        if isinstance(value, float) and not math.isfinite(value):
+            return None
+    return value
+
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+
+    def send_json(self, status, body):
+        content = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if self.path == '/countries':
+            self.send_json(200, self.server.service.countries())
+        else:
+            self.send_json(404, {'error': f"Unknown path '{self.path}', please use GET /countries or POST /evaluate"})
+
+    def do_POST(self):
+        if self.path != '/evaluate':
+            self.send_json(404, {'error': f"Unknown path '{self.path}', please use GET /countries or POST /evaluate"})
+            return
+        try:
+            # Also the invalid JSON (json.JSONDecodeError) and Content-Length
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+        except ValueError as error:
+            self.send_json(400, {'error': str(error)})
+            return
+        try:
+            self.send_json(200, self.server.service.evaluate(request))
+        except UnknownCountry as error:
+            self.send_json(404, {'error': str(error)})
+        except InvalidRequest as error:
+            self.send_json(400, {'error': str(error)})
+        except Exception as error:
+            self.send_json(500, {'error': f'{type(error).__name__}: {error}'})
+
+
+def serve(datafile, host='127.0.0.1', port=8050, processes=None, cache_directory=None):
+    """Run the service until interrupted (Ctrl+C)"""
+    service = ScenarioService(datafile, processes=processes, cache_directory=cache_directory)
+    server = http.server.ThreadingHTTPServer((host, port), RequestHandler)
+    server.service = service
+    print(f"Serving the scenario evaluation of {len(service.inputs)} countries on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__": # to avoid import run
+    import argparse
+    parser = argparse.ArgumentParser(prog='Scenario_service', description='Serve the CHARM scenario evaluation of one country over HTTP', usage='%(prog)s [options]')
+    parser.add_argument('--years-growth', default=40, help='The number of years of growth')
+    parser.add_argument('--discount-rate', default='4p', help='The discount rate')
+    parser.add_argument('--version', default='20230125', help='The version of the data file')
+    parser.add_argument('--path', default='../..', help='The root path of running the model')
+    parser.add_argument('--host', default='127.0.0.1', help='The address to listen on, only this computer by default')
+    parser.add_argument('--port', default=8050, type=int, help='The port to listen on')
+    parser.add_argument('--processes', default=None, type=int, help='The number of worker processes, default the number of CPUs')
+    parser.add_argument('--cache', default=False, type=lambda x: (str(x).lower() in ['true', '1', 'yes']), help='Reuse the land area and carbon cost results cached in data/interim')
+    args = parser.parse_args()
+
+    datafile = f'{args.path}/data/processed/CHARM global - YR_{args.years_growth} - DR_{args.discount_rate} - V{args.version}.xlsx'
+    serve(datafile, host=args.host, port=args.port, processes=args.processes,
+          cache_directory=Result_cache.default_directory(args.path) if args.cache else None)
@@ -14,13 +14,12 @@ __email__ = "liqing.peng@wri.org"
 __version__ = "1.0"
 
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
+import Carbon_pool_kernel, Cycle_pool_matrix, Tracker_result
 
 
 class CarbonTracker:
 
-    def __init__(self, Global, year_start_for_PDV=0):
+    def __init__(self, Global, year_start_for_PDV=0, keep_intermediates=True):
         # To set up when to start calculating total PDV in one year.
         # For example, if it is year 2010 year = 0, then the total PDV in year 0 will be sum of the entire 40 years period until 2050. If it is year 2020, year = 10, the calculator will still be run for the 40 years. But the total PDV in year 10 will be sum of the only first 30 years (40-10), the 31-40 years will be valid for the total PDV in year 2051-2060, which is not relevant.
         # This will be used to select the product share ratio, as well. For example, if it is year 2020 year = 10, then the product share will be obtained from 10 years from the 2010.
@@ -41,27 +40,27 @@ class CarbonTracker:
 
         ##### Set up carbon flow variables
         ### Biomass pool: Aboveground biomass leftover + belowground/roots
-        self.aboveground_biomass_secondary, self.belowground_biomass_decay_secondary, self.belowground_biomass_live_secondary = [np.zeros((self.Global.ncycles_regrowth, self.Global.arraylength)) for _ in range(3)]
+        self.aboveground_biomass_secondary, self.belowground_biomass_decay_secondary, self.belowground_biomass_live_secondary = [Cycle_pool_matrix.allocate(self.Global, self.Global.year_index_both_regrowth) for _ in range(3)]
         ### Product pool: VSLP/SLP/LLP
         # Original, VSLP pool exists.
         # Update: 06/03/21. Now VSLP pool no longer exists, because VSLP disappear when the harvest happens
-        self.product_LLP_pool_secondary, self.product_SLP_pool_secondary = [np.zeros((self.Global.ncycles_regrowth, self.Global.arraylength)) for _ in range(2)]
+        self.product_LLP_pool_secondary, self.product_SLP_pool_secondary = [Cycle_pool_matrix.allocate(self.Global, self.Global.year_index_both_regrowth) for _ in range(2)]
         # Update: 06/03/21. Adding LLP harvest and VSLP harvest for substitution benefit calculation.
-        self.product_LLP_harvest_secondary, self.product_VSLP_harvest_secondary = [np.zeros((self.Global.ncycles_regrowth, self.Global.arraylength)) for _ in range(2)]
+        self.product_LLP_harvest_secondary, self.product_VSLP_harvest_secondary = [Cycle_pool_matrix.allocate(self.Global, self.Global.year_index_both_regrowth) for _ in range(2)]
 
         ### Slash pool
-        self.slash_pool_secondary = np.zeros((self.Global.ncycles_regrowth, self.Global.arraylength))
+        self.slash_pool_secondary = Cycle_pool_matrix.allocate(self.Global, self.Global.year_index_both_regrowth)
         ### Landfill pool
         # End-use of LLP -> landfill cumulative
-        self.landfill_cumulative_secondary = np.zeros((self.Global.ncycles_regrowth, self.Global.arraylength))
+        self.landfill_cumulative_secondary = Cycle_pool_matrix.allocate(self.Global, self.Global.year_index_both_regrowth)
         # Emissions from landfill
         self.landfill_emission_secondary, self.landfill_methane_emission_secondary = [
-            np.zeros((self.Global.ncycles_regrowth, self.Global.arraylength)) for _ in range(2)]
+            Cycle_pool_matrix.allocate(self.Global, self.Global.year_index_both_regrowth) for _ in range(2)]
         # Landfill pool = LLP cumulative after emission (decay)
-        self.landfill_pool_secondary = np.zeros((self.Global.ncycles_regrowth, self.Global.arraylength))
+        self.landfill_pool_secondary = Cycle_pool_matrix.allocate(self.Global, self.Global.year_index_both_regrowth)
 
         ### The counterfactual scenario: biomass growth as a secondary forest
-        self.counterfactual_biomass = np.zeros((self.Global.arraylength))
+        self.counterfactual_biomass = np.zeros((self.Global.arraylength), dtype=self.Global.dtype)
 
         #################################### Main functions #####################
         self.initialization()
@@ -69,18 +68,22 @@ class CarbonTracker:
         self.total_carbon_benefit()
         self.counterfactual()
         self.calculate_PDV()
+        # Only the totals and PDV are needed in the land area and carbon cost calculators
+        if not keep_intermediates:
+            self.release_intermediates()
+
+    def release_intermediates(self):
+        """Drop the per cycle pool matrices, keep the total pools and PDV"""
+        for name in [name for name, value in vars(self).items() if getattr(value, 'ndim', 0) == 2]:
+            delattr(self, name)
+
+    def slim_result(self):
+        """Slim record of the totals and PDV, see Tracker_result"""
+        return Tracker_result.TrackerResult(self)
 
     def staircase(self, array):
         # Piecewise array for aboveground biomass actually harvested/thinned during rotation harvest/thinning
-        outarray = np.zeros(array.shape)
-        if len(array.shape) == 1:
-            df = pd.DataFrame(array)
-            outarray = df.replace(to_replace=0, method='ffill').values.reshape(array.shape)
-        else:  # array.shape = 2
-            for row in range(array.shape[0]):
-                df = pd.DataFrame(array[row, :])
-                outarray[row, :] = df.replace(to_replace=0, value=None, method='ffill').values.reshape(array.shape[1])
-        return outarray
+        return Carbon_pool_kernel.forward_fill_zeros(array)
 
     def calculate_belowground_biomass(self, aboveground_biomass):
         belowground_biomass = self.Global.root_shoot_coef * aboveground_biomass ** self.Global.root_shoot_power
@@ -148,30 +151,18 @@ class CarbonTracker:
                 self.product_VSLP_harvest_secondary[cycle, year_harvest_thinning] = aboveground_biomass_before_harvest * self.Global.harvest_percentage_regrowth[year_harvest_thinning] * self.Global.product_share_VSLP_thinning
 
             # ### Stand pool grows back within the rotation cycle
-            for year in range(st_cycle, ed_cycle):
-                # 2022/01/19 Monod function growth curve.
-                # Shifting back 1 year is necessary because in year 1 it is zero carbon, instead of year 0 (initial condition)
-                self.aboveground_biomass_secondary[cycle, year] = self.Global.agb_max * (year - 1) / (year - 1 + self.Global.age_50perc)
-                self.belowground_biomass_live_secondary[cycle, year] = self.calculate_belowground_biomass(self.aboveground_biomass_secondary[cycle, year])
+            # 2022/01/19 Monod function growth curve.
+            # Shifting back 1 year is necessary because in year 1 it is zero carbon, instead of year 0 (initial condition)
+            years_regrowth = np.arange(st_cycle, ed_cycle)
+            self.aboveground_biomass_secondary[cycle, st_cycle:ed_cycle] = self.Global.agb_max * (years_regrowth - 1) / (years_regrowth - 1 + self.Global.age_50perc)
+            self.belowground_biomass_live_secondary[cycle, st_cycle:ed_cycle] = self.calculate_belowground_biomass(self.aboveground_biomass_secondary[cycle, st_cycle:ed_cycle])
 
             ### For each product pool, slash pool, roots leftover, landfill, the carbon decay for the entire self.Global.arraylength
-            for year in range(st_cycle, self.Global.arraylength):
-                ### Product pool
-                self.product_LLP_pool_secondary[cycle, year] = self.product_LLP_pool_secondary[cycle, year_harvest_thinning] * np.exp(- np.log(2) / self.Global.half_life_LLP * (year - year_harvest_thinning))
-                self.product_SLP_pool_secondary[cycle, year] = self.product_SLP_pool_secondary[cycle, year_harvest_thinning] * np.exp(- np.log(2) / self.Global.half_life_SLP * (year - year_harvest_thinning))
-                # self.product_VSLP_pool_secondary[cycle, year] = self.product_VSLP_pool_secondary[cycle, year_harvest_thinning] * np.exp(- np.log(2) / self.Global.half_life_VSLP * (year - year_harvest_thinning))
-                # Current version 06/02/21: the VSLP product pool does not mean the leftover of VSLP, it means the burnt emission (it should be considered emission pool, not the product pool)
-                self.slash_pool_secondary[cycle, year] = self.slash_pool_secondary[cycle, year_harvest_thinning] * (1 - self.Global.slash_burn) * np.exp(- np.log(2) / self.Global.half_life_slash * (year - year_harvest_thinning))
-                self.belowground_biomass_decay_secondary[cycle, year] = self.belowground_biomass_decay_secondary[cycle, year_harvest_thinning] * np.exp(- np.log(2) / self.Global.half_life_root * (year - year_harvest_thinning))
-
-                ### Landfill pool
-                # Landfill cumulative = sum of the LLP product pool yearly difference deltaC: C(yr-1) - C(yr)
-                # Landfill pool = cumulative amount in landfill – emissions
-                self.landfill_cumulative_secondary[cycle, year] = self.landfill_pool_secondary[cycle, year - 1] + self.product_LLP_pool_secondary[cycle, year - 1] - self.product_LLP_pool_secondary[cycle, year]
-                self.landfill_pool_secondary[cycle, year] = self.landfill_cumulative_secondary[cycle, year] * np.exp(-np.log(2) / self.Global.half_life_landfill)
-                # Landfill carbon and methane emission, Methane is a stronger GHG, 34 times over CO2
-                self.landfill_emission_secondary[cycle, year] = self.landfill_cumulative_secondary[cycle, year] * (1 - np.exp(-np.log(2) / self.Global.half_life_landfill))
-                self.landfill_methane_emission_secondary[cycle, year] = - self.landfill_emission_secondary[cycle, year] * self.Global.landfill_methane_ratio * 34 * 12 / 44
+            # Current version 06/02/21: the VSLP product pool does not mean the leftover of VSLP, it means the burnt emission (it should be considered emission pool, not the product pool)
+            Carbon_pool_kernel.decay_harvested_pools(self.product_LLP_pool_secondary[cycle, year_harvest_thinning:], self.product_SLP_pool_secondary[cycle, year_harvest_thinning:],
+                                                     self.slash_pool_secondary[cycle, year_harvest_thinning:], self.belowground_biomass_decay_secondary[cycle, year_harvest_thinning:],
+                                                     self.landfill_cumulative_secondary[cycle, year_harvest_thinning:], self.landfill_pool_secondary[cycle, year_harvest_thinning:],
+                                                     self.landfill_emission_secondary[cycle, year_harvest_thinning:], self.landfill_methane_emission_secondary[cycle, year_harvest_thinning:], self.Global)
 
 
     def total_carbon_benefit(self):
@@ -180,29 +171,29 @@ class CarbonTracker:
             - Sum up multiple cycles to get the total carbon stock
         - Substitution effect
         """
-        self.totalC_aboveground_biomass_pool = np.sum(self.aboveground_biomass_secondary, axis=0)
-        self.totalC_root_live_pool = np.sum(self.belowground_biomass_live_secondary, axis=0)
+        self.totalC_aboveground_biomass_pool = np.sum(self.aboveground_biomass_secondary, axis=0, dtype=np.float64)
+        self.totalC_root_live_pool = np.sum(self.belowground_biomass_live_secondary, axis=0, dtype=np.float64)
         self.totalC_stand_pool = self.totalC_aboveground_biomass_pool + self.totalC_root_live_pool
 
-        self.totalC_product_LLP_pool = np.sum(self.product_LLP_pool_secondary, axis=0)
-        self.totalC_product_SLP_pool = np.sum(self.product_SLP_pool_secondary, axis=0)
+        self.totalC_product_LLP_pool = np.sum(self.product_LLP_pool_secondary, axis=0, dtype=np.float64)
+        self.totalC_product_SLP_pool = np.sum(self.product_SLP_pool_secondary, axis=0, dtype=np.float64)
         # Change totalC_product_LLP_harvest to totalC_product_LLP_harvest_stock to show the accumulate harvest stock for LLP substitution benefit
         # For purposes of showing the cumulative impact on carbon, the substitution value represents a permanent increased quantity of carbon that stays in the ground – a permanent increase in fossil fuels.
         # We can think of it as transferring some carbon from the original tree permanently into the ground. This is a one time “stock” gain, but it persists. It just does not grow.
         self.product_LLP_harvest_stock_secondary = self.staircase(self.product_LLP_harvest_secondary)
-        self.totalC_product_LLP_harvest_stock = np.sum(self.product_LLP_harvest_stock_secondary, axis=0)
+        self.totalC_product_LLP_harvest_stock = np.sum(self.product_LLP_harvest_stock_secondary, axis=0, dtype=np.float64)
 
         self.product_VSLP_harvest_stock_secondary = self.staircase(self.product_VSLP_harvest_secondary)
-        self.totalC_product_VSLP_harvest_stock = np.sum(self.product_VSLP_harvest_stock_secondary, axis=0)
+        self.totalC_product_VSLP_harvest_stock = np.sum(self.product_VSLP_harvest_stock_secondary, axis=0, dtype=np.float64)
         # Exclude VSLP product pool from total product pool
         self.totalC_product_pool = self.totalC_product_LLP_pool + self.totalC_product_SLP_pool   # + self.totalC_product_VSLP_pool
 
-        self.totalC_root_decay_pool = np.sum(self.belowground_biomass_decay_secondary, axis=0)
-        self.totalC_slash_pool = np.sum(self.slash_pool_secondary, axis=0)
+        self.totalC_root_decay_pool = np.sum(self.belowground_biomass_decay_secondary, axis=0, dtype=np.float64)
+        self.totalC_slash_pool = np.sum(self.slash_pool_secondary, axis=0, dtype=np.float64)
         self.totalC_slash_root = self.totalC_slash_pool + self.totalC_root_decay_pool
 
-        self.totalC_landfill_pool = np.sum(self.landfill_pool_secondary, axis=0)
-        self.totalC_methane_emission = np.sum(self.landfill_methane_emission_secondary, axis=0)
+        self.totalC_landfill_pool = np.sum(self.landfill_pool_secondary, axis=0, dtype=np.float64)
+        self.totalC_methane_emission = np.sum(self.landfill_methane_emission_secondary, axis=0, dtype=np.float64)
 
         # Account for timber product substitution effect = avoided concrete/steel usage's GHG emission
         self.LLP_substitution_benefit = self.totalC_product_LLP_harvest_stock * self.Global.llp_construct_ratio * self.Global.llp_displaced_CS_ratio * self.Global.coef_construt_substitution
@@ -234,58 +225,14 @@ class CarbonTracker:
         for year in range(0, self.Global.nyears):
             discounted_year[year] = year
 
+        # Keep the discounting years, so that other discount rates can be applied to the undiscounted flux (see Tracker_result.TrackerResult.pdv)
+        self.discounted_year = discounted_year
         self.annual_discounted_value = self.benefit_minus_counterfactual_diff / (1 + self.Global.discount_rate) ** discounted_year
 
         print("year_start_for_PDV:", self.year_start_for_PDV)
 
 
     def plot_C_pools_counterfactual_print_PDV(self):
-        present_discounted_carbon_fullperiod = np.sum(self.annual_discounted_value)
-        print('PDV (tC/ha): ', present_discounted_carbon_fullperiod)
-
-        nyears = self.Global.nyears
-        df_stack = pd.DataFrame({'Displaced VSLP emissions': self.VSLP_substitution_benefit[1:],
-                                 'Displaced concrete & steel emissions': self.LLP_substitution_benefit[1:],
-                                 'Live tree stand & root storage': self.totalC_stand_pool[1:],
-                                 'Slash & decaying root storage': self.totalC_slash_root[1:],
-                                 'Wood products storage': self.totalC_product_pool[1:],
-                                 'Landfill storage': self.totalC_landfill_pool[1:],
-                                 'Methane emission': self.totalC_methane_emission[1:]
-                                 }, index=np.arange(2010, 2010 + nyears))
-        df_line = pd.DataFrame({'Non-harvest scenario': self.counterfactual_biomass[1:],
-                                'Harvest scenario - total carbon (all pools)': self.total_carbon_benefit[1:]},
-                               index=np.arange(2010, 2010 + nyears))
-
-        colornames = ['Brown', 'Darkgrey', 'DarkGreen', 'Sienna', 'Goldenrod', 'Darkorange', 'Steelblue']
-
-        # Positive carbon flux
-        fig, ax = plt.subplots(figsize=(11, 5))
-        plt.stackplot(df_stack.index, df_stack['Displaced VSLP emissions'],df_stack['Displaced concrete & steel emissions'],
-                      df_stack['Live tree stand & root storage'], df_stack['Slash & decaying root storage'],
-                      df_stack['Wood products storage'], df_stack['Landfill storage'], labels=df_stack.columns,
-                      colors=colornames[:-1])
-        # Negative carbon flux
-        # plt.stackplot(df_stack.index, df_stack['Methane emission'], labels=['Methane emission'], color=colornames[-1])
-        plt.stackplot(df_stack.index, df_stack['Methane emission'], labels=[''], color=colornames[-1])
-
-        # Two lines
-        df_line.plot(ax=ax, style=['--', '-'], color=["limegreen", "k"], lw=2.5, legend=False)
-        ax.set_ylabel('Carbon storage (tCeq/ha)', fontsize=18)
-        ax.set_xlabel('Year', fontsize=18)
-        ax.tick_params(axis='both', which='major', labelsize=16)
-        ax.annotate('PDV including substitution: {:.1f} tCeq/ha'.format(present_discounted_carbon_fullperiod), xy=(0.05, 0.84),
-                    xycoords='axes fraction', fontsize=11, fontweight='bold')
-
-        ax.set_title(self.Global.country_name, fontsize=16)
-
-        handles, labels = ax.get_legend_handles_labels()
-        # fig.legend(handles, labels, loc=(0.68, 0.04), fontsize=12)
-        fig.legend(handles[:2], labels[:2], loc=(0.62, 0.6), fontsize=11, frameon=False)
-        fig.legend(handles[2:], labels[2:], loc=(0.62, 0.2), fontsize=11, title='Subpools in harvest scenario',
-                   title_fontsize=11, frameon=False)
-
-        fig.tight_layout()
-        fig.subplots_adjust(top=0.82, right=0.6, left=0.1)
-        plt.show(); exit()
-
-        return
+        """Plot the carbon pools, matplotlib is only imported for the plot (see Carbon_pool_plot)"""
+        import Carbon_pool_plot
+        Carbon_pool_plot.plot_C_pools_counterfactual_print_PDV(self)
@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+"""
+Closed form of the secondary regrowth and secondary mature regrowth scenarios
+Without thinning, the regrowth scenarios only have the first harvest in year 1 (index=1), so every carbon pool is a known function of time:
+1. Aboveground biomass regrows along the Monod growth curve from zero after the harvest, belowground from the root shoot ratio
+2. Products, slash and decaying roots decay exponentially from the harvest
+3. The landfill pool of a first order decay fed by the LLP decay is a geometric sum
+4. The counterfactual keeps growing along the Monod growth curve from the initial age
+
+The harvested pools depend on the year_start_for_PDV only through the product shares and slash rate of that year, scaling a fixed shape.
+The PDV matrix of all the starting years is then one outer product, instead of one carbon tracker per starting year.
+With thinning (more than one cycle), the full carbon tracker is run instead.
+The closed form is evaluated in float64 regardless of Global.dtype.
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import numpy as np
+import Secondary_regrowth_scenario, Secondary_mature_regrowth_scenario, Tracker_result
+
+# Years added to the age for harvest of the initial stand in the mature regrowth scenario, as in Secondary_mature_regrowth_scenario
+MATURE_AGE_OFFSET = 40
+
+
+def is_single_harvest(Global):
+    """The closed form holds when the only cycle is the harvest in year 1"""
+    return (Global.ncycles_regrowth == 1) and (list(Global.year_index_both_regrowth) == [1])
+
+
+def _tracker_module(mature):
+    return Secondary_mature_regrowth_scenario if mature else Secondary_regrowth_scenario
+
+
+def _calculate_belowground_biomass(Global, aboveground_biomass):
+    return Global.root_shoot_coef * aboveground_biomass ** Global.root_shoot_power
+
+
+def _landfill_pool_unit(Global, nyears_after_harvest):
+    """
+    Landfill pool after 1 tC of LLP harvested, for nyears_after_harvest >= 1
+    pool(m) = (1-r) * k * sum_{i<m} r^i k^(m-1-i) = (1-r) * k * r^(m-1) * (exp((b-a)m)-1) / (exp(b-a)-1)
+    with r = exp(-b) the LLP decay factor and k = exp(-a) the landfill retention. expm1 keeps it exact when the half lives are close.
+    """
+    decay_LLP = np.log(2) / Global.half_life_LLP
+    decay_landfill = np.log(2) / Global.half_life_landfill
+    factor_LLP = np.exp(-decay_LLP)
+    retention = np.exp(-decay_landfill)
+    if decay_LLP == decay_landfill:
+        geometric_sum = nyears_after_harvest * factor_LLP ** (nyears_after_harvest - 1)
+    else:
+        geometric_sum = factor_LLP ** (nyears_after_harvest - 1) * np.expm1((decay_LLP - decay_landfill) * nyears_after_harvest) / np.expm1(decay_LLP - decay_landfill)
+    return (1 - factor_LLP) * retention * geometric_sum, retention
+
+
+def _pool_shapes(Global, mature):
+    """
+    Pools of the regrowth scenario that do not depend on year_start_for_PDV, and the unit shapes of the harvested pools (per 1 tC harvested into the pool)
+    All arrays are of Global.arraylength, index=0 is the initial condition and index=1 is the year of harvest
+    """
+    age_initial = Global.age_for_harvest + (MATURE_AGE_OFFSET if mature else 0)
+    years = np.arange(Global.arraylength, dtype=np.float64)
+    years_after_harvest = np.zeros(Global.arraylength)
+    years_after_harvest[1:] = years[1:] - 1
+
+    shapes = {}
+    ### Stand pool: initial stand, leftover at harvest, then the Monod growth curve from zero
+    aboveground_biomass_before_harvest = Global.agb_max * age_initial / (age_initial + Global.age_50perc)
+    harvest_percentage = Global.harvest_percentage_regrowth[1]
+    aboveground_biomass = Global.agb_max * (years - 1) / (years - 1 + Global.age_50perc)
+    aboveground_biomass[0] = aboveground_biomass_before_harvest
+    aboveground_biomass[1] = aboveground_biomass_before_harvest * (1 - harvest_percentage)
+    shapes['aboveground_biomass'] = aboveground_biomass
+    shapes['root_live'] = _calculate_belowground_biomass(Global, aboveground_biomass)
+    shapes['aboveground_biomass_harvested'] = aboveground_biomass_before_harvest * harvest_percentage
+
+    ### Decaying roots from the harvested aboveground biomass
+    root_decay = np.zeros(Global.arraylength)
+    root_decay[1:] = _calculate_belowground_biomass(Global, shapes['aboveground_biomass_harvested']) * np.exp(- np.log(2) / Global.half_life_root * years_after_harvest[1:])
+    shapes['root_decay'] = root_decay
+
+    ### Unit shapes of the harvested pools
+    shapes['LLP'], shapes['SLP'], shapes['slash'], shapes['landfill'], shapes['methane'], shapes['harvest_stock'] = [np.zeros(Global.arraylength) for _ in range(6)]
+    shapes['LLP'][1:] = np.exp(- np.log(2) / Global.half_life_LLP * years_after_harvest[1:])
+    shapes['SLP'][1:] = np.exp(- np.log(2) / Global.half_life_SLP * years_after_harvest[1:])
+    shapes['slash'][1] = 1
+    shapes['slash'][2:] = (1 - Global.slash_burn) * np.exp(- np.log(2) / Global.half_life_slash * years_after_harvest[2:])
+    shapes['landfill'][2:], retention = _landfill_pool_unit(Global, years_after_harvest[2:])
+    # Landfill cumulative = landfill pool / retention, emission = cumulative * (1 - retention)
+    shapes['methane'][2:] = - shapes['landfill'][2:] / retention * (1 - retention) * Global.landfill_methane_ratio * 34 * 12 / 44
+    # The harvest stock for the substitution benefit persists after the harvest
+    shapes['harvest_stock'][1:] = 1
+
+    ### The counterfactual scenario: biomass keeps growing from the initial age
+    counterfactual_biomass = Global.agb_max * (age_initial + years - 1) / (age_initial + years - 1 + Global.age_50perc)
+    counterfactual_biomass[0] = 0
+    shapes['counterfactual_biomass'] = counterfactual_biomass + _calculate_belowground_biomass(Global, counterfactual_biomass)
+    return shapes
+
+
+def _harvested_carbon(Global, shapes, year_start_for_PDV):
+    """Carbon harvested into the LLP, SLP, VSLP and slash pools in year 1, for each year_start_for_PDV (scalar or array)"""
+    year_start_for_PDV = np.asarray(year_start_for_PDV)
+    # The shifted product share of year 1 is the product share of year_start_for_PDV, net of the slash of that year
+    slash_percentage = Global.slash_percentage_secondary_regrowth[year_start_for_PDV, 1]
+    harvested = shapes['aboveground_biomass_harvested']
+    return (harvested * Global.product_share_LLP[year_start_for_PDV] * (1 - slash_percentage),
+            harvested * Global.product_share_SLP[year_start_for_PDV] * (1 - slash_percentage),
+            harvested * Global.product_share_VSLP[year_start_for_PDV] * (1 - slash_percentage),
+            harvested * slash_percentage)
+
+
+def discounted_year(Global):
+    """Discounting year of each annual flux, the regrowth scenarios discount to the first year"""
+    return np.arange(Global.nyears, dtype=np.float64)
+
+
+def _discount(Global):
+    return (1 + Global.discount_rate) ** discounted_year(Global)
+
+
+def CarbonTracker(Global, year_start_for_PDV=0, mature=False):
+    """
+    Slim result (Tracker_result) of the secondary regrowth (mature=False) or secondary mature regrowth (mature=True) carbon tracker
+    Uses the closed form for the single harvest, the full carbon tracker otherwise
+    """
+    if not is_single_harvest(Global):
+        return _tracker_module(mature).CarbonTracker(Global, year_start_for_PDV=year_start_for_PDV, keep_intermediates=False).slim_result()
+
+    shapes = _pool_shapes(Global, mature)
+    LLP_harvested, SLP_harvested, VSLP_harvested, slash_harvested = _harvested_carbon(Global, shapes, year_start_for_PDV)
+
+    totals = {'Global': Global, 'year_start_for_PDV': year_start_for_PDV}
+    totals['totalC_aboveground_biomass_pool'] = shapes['aboveground_biomass']
+    totals['totalC_root_live_pool'] = shapes['root_live']
+    totals['totalC_stand_pool'] = shapes['aboveground_biomass'] + shapes['root_live']
+    totals['totalC_product_LLP_pool'] = LLP_harvested * shapes['LLP']
+    totals['totalC_product_SLP_pool'] = SLP_harvested * shapes['SLP']
+    totals['totalC_product_pool'] = totals['totalC_product_LLP_pool'] + totals['totalC_product_SLP_pool']
+    totals['totalC_product_LLP_harvest_stock'] = LLP_harvested * shapes['harvest_stock']
+    totals['totalC_product_VSLP_harvest_stock'] = VSLP_harvested * shapes['harvest_stock']
+    totals['totalC_root_decay_pool'] = shapes['root_decay']
+    totals['totalC_slash_pool'] = slash_harvested * shapes['slash']
+    totals['totalC_slash_root'] = totals['totalC_slash_pool'] + totals['totalC_root_decay_pool']
+    totals['totalC_landfill_pool'] = LLP_harvested * shapes['landfill']
+    totals['totalC_methane_emission'] = LLP_harvested * shapes['methane']
+    totals['LLP_substitution_benefit'] = totals['totalC_product_LLP_harvest_stock'] * Global.llp_construct_ratio * Global.llp_displaced_CS_ratio * Global.coef_construt_substitution
+    totals['VSLP_substitution_benefit'] = totals['totalC_product_VSLP_harvest_stock'] * Global.coef_bioenergy_substitution
+    totals['total_carbon_benefit'] = totals['totalC_stand_pool'] + totals['totalC_product_pool'] + totals['totalC_root_decay_pool'] + totals['totalC_landfill_pool'] + totals['totalC_slash_pool'] + totals['totalC_methane_emission'] + totals['LLP_substitution_benefit'] + totals['VSLP_substitution_benefit']
+    totals['counterfactual_biomass'] = shapes['counterfactual_biomass']
+
+    # Present discounted value, same as the carbon tracker
+    totals['benefit_minus_counterfactual_diff'] = np.diff(totals['total_carbon_benefit'][1:] - totals['counterfactual_biomass'][1:], prepend=0)
+    totals['discounted_year'] = discounted_year(Global)
+    totals['annual_discounted_value'] = totals['benefit_minus_counterfactual_diff'] / _discount(Global)
+    return Tracker_result.TrackerResult(**totals)
+
+
+def annual_flux_matrix(Global, nyears_start, mature=False, dtype=None):
+    """
+    Undiscounted annual flux (benefit_minus_counterfactual_diff) (nyears, nyears_start) for year_start_for_PDV = 0..nyears_start-1, one column per starting year
+    Uses the closed form for the single harvest, one full carbon tracker per starting year otherwise
+    """
+    dtype = Global.dtype if dtype is None else dtype
+    if not is_single_harvest(Global):
+        matrix = np.zeros((Global.nyears, nyears_start), dtype=dtype)
+        for year in range(nyears_start):
+            matrix[:, year] = _tracker_module(mature).CarbonTracker(Global, year_start_for_PDV=year, keep_intermediates=False).benefit_minus_counterfactual_diff[:]
+        return matrix
+
+    shapes = _pool_shapes(Global, mature)
+    LLP_harvested, SLP_harvested, VSLP_harvested, slash_harvested = _harvested_carbon(Global, shapes, np.arange(nyears_start))
+
+    # Total carbon benefit is the part independent of the starting year plus the harvested pools scaled by the carbon harvested of each starting year
+    LLP_unit = shapes['LLP'] + shapes['landfill'] + shapes['methane'] + shapes['harvest_stock'] * Global.llp_construct_ratio * Global.llp_displaced_CS_ratio * Global.coef_construt_substitution
+    total_carbon_benefit = (shapes['aboveground_biomass'] + shapes['root_live'] + shapes['root_decay'])[:, None] \
+        + np.outer(LLP_unit, LLP_harvested) + np.outer(shapes['SLP'], SLP_harvested) + np.outer(shapes['slash'], slash_harvested) \
+        + np.outer(shapes['harvest_stock'] * Global.coef_bioenergy_substitution, VSLP_harvested)
+
+    return np.diff(total_carbon_benefit[1:] - shapes['counterfactual_biomass'][1:, None], axis=0, prepend=0).astype(dtype)
+
+
+def annual_discounted_value_matrix(Global, nyears_start, mature=False, dtype=None):
+    """
+    Annual discounted value (nyears, nyears_start) for year_start_for_PDV = 0..nyears_start-1, one column per starting year, as filled in the CarbonCalculator
+    Uses the closed form for the single harvest, one full carbon tracker per starting year otherwise
+    """
+    dtype = Global.dtype if dtype is None else dtype
+    return (annual_flux_matrix(Global, nyears_start, mature=mature, dtype=np.float64) / _discount(Global)[:, None]).astype(dtype)
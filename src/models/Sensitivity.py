@@ -0,0 +1,247 @@
+#!/usr/bin/env python
+"""
+Sensitivity experiments as overrides of the Inputs table
+Instead of one pre-built workbook per experiment, the Inputs table is read once and each experiment is a list of declarative overrides:
+1. Scale: multiply columns by a factor, e.g. the secondary forest growth rates GR1 and GR2 by 1.25
+2. Replace: set a column to new values, one value for all countries or one per country ISO, e.g. the 2050 demand of another projection
+
+The experiments are run for the countries in parallel processes and returned as one tidy table
+(experiment, scenario settings, country, output variable, value), no workbook is written.
+evaluate_batch runs a design matrix of parameter values (Parameter) for Global_sensitivity, as full Driver country runs in a process pool.
+
+Example:
+    experiments = {'GR1_GR2_25U': [Scale(['Young Secondary GR', 'Middle Secondary GR'], 1.25)],
+                   'Demand_OECD': [Replace('LLP 2050', {'BRA': 10.5, 'USA': 80.1})]}
+    results = run_experiments('../../data/processed/CHARM global - YR_40 - DR_4p - V20230125.xlsx', experiments)
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import os
+import concurrent.futures
+import numpy as np
+import pandas as pd
+import Global_by_country, Driver
+
+
+# The key BAU and CST without substitution, as run_model_main_scenario
+KEY_INPUT_PERMUTATIONS = [('BAU', 'NOSUB', 'ALL'), ('CST', 'NOSUB', 'ALL')]
+
+
+class Scale:
+
+    def __init__(self, columns, factor, countries=None):
+        """Multiply the columns by the factor, for all countries or the list of country ISO"""
+        self.columns = [columns] if isinstance(columns, str) else list(columns)
+        self.factor = factor
+        self.countries = countries
+
+    def apply(self, inputs):
+        rows = inputs.index if self.countries is None else inputs.index[inputs['ISO'].isin(self.countries)]
+        inputs.loc[rows, self.columns] = inputs.loc[rows, self.columns] * self.factor
+        return inputs
+
+    def __repr__(self):
+        return f"Scale({self.columns!r}, {self.factor!r}, countries={self.countries!r})"
+
+
+class Replace:
+
+    def __init__(self, column, values):
+        """Set the column to values, one value for all countries or a dict of {country ISO: value}. A new column is added if it is not in the Inputs table."""
+        self.column = column
+        self.values = values
+
+    def apply(self, inputs):
+        if isinstance(self.values, dict):
+            if self.column not in inputs.columns:
+                raise KeyError(f"Column '{self.column}' is not in the Inputs table, only a single value can add a new column")
+            rows = inputs['ISO'].isin(self.values.keys())
+            inputs.loc[rows, self.column] = inputs.loc[rows, 'ISO'].map(self.values)
+        else:
+            inputs[self.column] = self.values
+        return inputs
+
+    def __repr__(self):
+        return f"Replace({self.column!r}, {self.values!r})"
+
+
+# Experiments of the sensitivity analysis that only change the Inputs table.
+# The demand and trade experiments replace the demand columns with the values of the other projections, which are not in the Inputs table.
+# GR_25U/GR_25D scale all the plantation and secondary forest growth rates, not the mature to middle secondary GR ratio.
+GROWTH_RATE_COLUMNS = ['Young Plantation GR', 'Middle Plantation GR', 'Converted Plantation GR', 'Young Secondary GR', 'Middle Secondary GR']
+GROWTH_EXPERIMENTS = {'GR_25U': [Scale(GROWTH_RATE_COLUMNS, 1.25)],
+                      'GR_25D': [Scale(GROWTH_RATE_COLUMNS, 0.75)],
+                      'GR1_GR2_25U': [Scale(['Young Secondary GR', 'Middle Secondary GR'], 1.25)],
+                      'GR1_GR2_25D': [Scale(['Young Secondary GR', 'Middle Secondary GR'], 0.75)],
+                      'GR1_GR2_50U': [Scale(['Young Secondary GR', 'Middle Secondary GR'], 1.5)]}
+ROOTSHOOT_EXPERIMENTS = {'RSR_25U': [Replace('Root to Shoot ratio scaling factor', 1.25)],
+                         'RSR_25D': [Replace('Root to Shoot ratio scaling factor', 0.75)]}
+
+
+def apply_overrides(inputs, overrides):
+    """New Inputs table with the overrides applied in order, the original table is not changed"""
+    inputs = inputs.copy()
+    for override in overrides:
+        inputs = override.apply(inputs)
+    return inputs
+
+
+class Parameter:
+
+    def __init__(self, name, columns, low, high, relative=True):
+        """
+        Input parameter of a batch evaluation, e.g. Parameter('GR1_GR2', ['Young Secondary GR', 'Middle Secondary GR'], 0.75, 1.25)
+        relative: the values are scaling factors of the columns (Scale), otherwise the values of the columns (Replace)
+        """
+        self.name = name
+        self.columns = [columns] if isinstance(columns, str) else list(columns)
+        self.low, self.high = low, high
+        self.relative = relative
+
+    def overrides(self, value):
+        if self.relative:
+            return [Scale(self.columns, value)]
+        return [Replace(column, value) for column in self.columns]
+
+    def __repr__(self):
+        return f"Parameter({self.name!r}, {self.columns!r}, {self.low!r}, {self.high!r}, relative={self.relative!r})"
+
+
+def _run_unit(input_country, experiment, country, code, future_demand_level, substitution_mode, vslp_input_control, main_scenario, dtype, pool_storage):
+    """One (experiment, scenario settings, country) run, in a worker process"""
+    run_country = Driver.run_country_main_scenario if main_scenario else Driver.run_country_all_scenarios
+    output_row = run_country(input_country, country, code, future_demand_level_input=future_demand_level, substitution_mode_input=substitution_mode,
+                             vslp_input_control_input=vslp_input_control, dtype=dtype, pool_storage=pool_storage)
+    return {'experiment': experiment, 'future_demand_level': future_demand_level, 'substitution_mode': substitution_mode, 'vslp_input_control': vslp_input_control, **output_row}
+
+
+def run_experiments(datafile, experiments, input_permutations=KEY_INPUT_PERMUTATIONS, main_scenario=True, processes=None, dtype='float64', pool_storage='dense'):
+    """
+    Run the sensitivity experiments on one Inputs table
+    :param datafile: path of the excel data file, or the Inputs table (DataFrame)
+    :param experiments: {experiment name: list of overrides}, an empty list is the reference run
+    :param input_permutations: list of (future_demand_level, substitution_mode, vslp_input_control)
+    :param main_scenario: only the main regrowth scenario 1 as run_model_main_scenario, otherwise all scenarios as run_model_all_scenarios
+    :param processes: number of worker processes, default the number of CPUs, 1 to run in this process
+    :param dtype, pool_storage: the carbon pool matrices, see Global_by_country.Parameters
+    :return: tidy DataFrame with the columns experiment, future_demand_level, substitution_mode, vslp_input_control, Country, ISO, variable, value
+    """
+    inputs = Global_by_country.read_inputs(datafile)
+    units = []
+    for experiment, overrides in experiments.items():
+        inputs_experiment = apply_overrides(inputs, overrides)
+        for country, code in zip(inputs_experiment['Country'], inputs_experiment['ISO']):
+            input_country = inputs_experiment.loc[inputs_experiment['Country'] == country]
+            # Same test as in the Driver, no calculation for a country with a missing parameter
+            if not Driver.has_complete_inputs(input_country):
+                print(f"Please fill in the abbreviation and all the missing parameters for country '{country}'!")
+                continue
+            # Each worker receives only the country's row of the experiment
+            for future_demand_level, substitution_mode, vslp_input_control in input_permutations:
+                units.append((input_country, experiment, country, code, future_demand_level, substitution_mode, vslp_input_control, main_scenario, dtype, pool_storage))
+
+    processes = os.cpu_count() if processes is None else processes
+    if processes == 1 or len(units) == 0:
+        output_rows = [_run_unit(*unit) for unit in units]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            output_rows = list(executor.map(_run_unit, *zip(*units)))
+
+    id_columns = ['experiment', 'future_demand_level', 'substitution_mode', 'vslp_input_control', 'Country', 'ISO']
+    return pd.DataFrame(output_rows).melt(id_vars=id_columns, var_name='variable', value_name='value')
+
+
+######################## Batch evaluation ##############################
+# Inputs table of the complete countries, parameters and run settings of the worker process, set by _init_batch_worker
+_batch_worker = {}
+
+
+def _init_batch_worker(inputs, parameters, settings):
+    _batch_worker.update(inputs=inputs, parameters=parameters, settings=settings)
+
+
+def _run_batch_task(icountry, isample_start, X_task):
+    """Output rows of a block of samples of one country, in a worker process. The country's row is overridden with each sample's parameter values."""
+    inputs, parameters, settings = _batch_worker['inputs'], _batch_worker['parameters'], _batch_worker['settings']
+    input_country = inputs.iloc[[icountry]]
+    country, code = input_country['Country'].iloc[0], input_country['ISO'].iloc[0]
+    run_country = Driver.run_country_main_scenario if settings['main_scenario'] else Driver.run_country_all_scenarios
+    output_rows = []
+    for x in X_task:
+        input_sample = apply_overrides(input_country, [override for parameter, value in zip(parameters, x) for override in parameter.overrides(value)])
+        output_rows.append(run_country(input_sample, country, code, future_demand_level_input=settings['future_demand_level'], substitution_mode_input=settings['substitution_mode'],
+                                       vslp_input_control_input=settings['vslp_input_control'], dtype=settings['dtype'], pool_storage=settings['pool_storage']))
+    return icountry, isample_start, output_rows
+
+
+def bounded_map(executor, function, tasks, window):
+    """Results of the function on the tasks as they complete, with at most window tasks submitted at a time"""
+    pending = set()
+    for task in tasks:
+        pending.add(executor.submit(function, *task))
+        if len(pending) >= window:
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    for future in concurrent.futures.as_completed(pending):
+        yield future.result()
+
+
+def evaluate_batch(datafile, parameters, X, variables=None, future_demand_level='BAU', substitution_mode='SUBON', vslp_input_control='ALL', main_scenario=True, processes=None,
+                   samples_per_task=8, dtype='float64', pool_storage='dense'):
+    """
+    Evaluation of the model on a design matrix, e.g. for Global_sensitivity: one Driver country run per (sample, country) in a process pool
+    The Inputs table is sent once to each worker process, the tasks are blocks of rows of X of one country
+    :param datafile: path of the excel data file, or the Inputs table (DataFrame)
+    :param parameters: list of Parameter, one per column of X
+    :param X: (n_samples, n_params) matrix of the parameter values
+    :param variables: output columns to return, default all the numeric outputs
+    :param processes: number of worker processes, default the number of CPUs, 1 to run in this process
+    :param samples_per_task: number of samples of one country run by a worker task
+    :param dtype, pool_storage: the carbon pool matrices, see Global_by_country.Parameters
+    :return: (Y, codes, variables), Y is the (n_samples, n_countries, n_variables) array of the outputs
+    """
+    X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+    if X.shape[1] != len(parameters):
+        raise ValueError(f"The design matrix has {X.shape[1]} columns for {len(parameters)} parameters")
+    inputs = Global_by_country.read_inputs(datafile)
+    # Same test as in the Driver, no calculation for a country with a missing parameter
+    complete = [Driver.has_complete_inputs(inputs.loc[[index]]) for index in inputs.index]
+    inputs = inputs.loc[complete].reset_index(drop=True)
+    codes = list(inputs['ISO'])
+    settings = {'future_demand_level': future_demand_level, 'substitution_mode': substitution_mode, 'vslp_input_control': vslp_input_control,
+                'main_scenario': main_scenario, 'dtype': dtype, 'pool_storage': pool_storage}
+    tasks = ((icountry, isample_start, X[isample_start:isample_start + samples_per_task])
+             for isample_start in range(0, X.shape[0], samples_per_task) for icountry in range(len(codes)))
+
+    # (n_samples, n_countries, n_variables) outputs, allocated with the first output rows
+    Y = None
+    processes = os.cpu_count() if processes is None else processes
+    if processes > 1:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=_init_batch_worker, initargs=(inputs, parameters, settings))
+        completed_tasks = bounded_map(executor, _run_batch_task, tasks, window=2 * processes)
+    else:
+        executor = None
+        _init_batch_worker(inputs, parameters, settings)
+        completed_tasks = (_run_batch_task(*task) for task in tasks)
+    try:
+        for icountry, isample_start, output_rows in completed_tasks:
+            if variables is None:
+                variables = [name for name in output_rows[0] if name not in ('Country', 'ISO')]
+            if Y is None:
+                Y = np.full((X.shape[0], len(codes), len(variables)), np.nan)
+            for isample, output_row in enumerate(output_rows, start=isample_start):
+                Y[isample, icountry] = [output_row[variable] for variable in variables]
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+    if Y is None:
+        variables = variables or []
+        Y = np.full((X.shape[0], len(codes), len(variables)), np.nan)
+    return Y, codes, variables
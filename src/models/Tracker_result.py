@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Slim result record of a carbon tracker run
+Keeps the total pools, the substitution benefits, the counterfactual and the PDV of one carbon tracker,
+without the per cycle pool matrices, so that many results can be held at once (e.g. in the Driver) with little memory.
+"""
+__author__ = "Liqing Peng"
+__copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
+__license__ = "MIT"
+__date__ = "2023.6"
+__maintainer__ = "Liqing Peng"
+__email__ = "liqing.peng@wri.org"
+__version__ = "1.0"
+
+import numpy as np
+
+
+class TrackerResult:
+
+    __slots__ = ('Global', 'year_start_for_PDV',
+                 # Present discounted value
+                 'annual_discounted_value', 'benefit_minus_counterfactual_diff', 'discounted_year',
+                 # Harvest and counterfactual scenario
+                 'total_carbon_benefit', 'counterfactual_biomass',
+                 # Total pools
+                 'totalC_aboveground_biomass_pool', 'totalC_root_live_pool', 'totalC_stand_pool',
+                 'totalC_product_LLP_pool', 'totalC_product_SLP_pool', 'totalC_product_pool',
+                 'totalC_product_LLP_harvest_stock', 'totalC_product_VSLP_harvest_stock',
+                 'totalC_root_decay_pool', 'totalC_slash_pool', 'totalC_slash_root',
+                 'totalC_landfill_pool', 'totalC_methane_emission',
+                 # Substitution effect
+                 'LLP_substitution_benefit', 'VSLP_substitution_benefit')
+
+    def __init__(self, tracker=None, **values):
+        """
+        Copy the references of the totals from a finished carbon tracker of any scenario,
+        or take them as keyword values (e.g. from the closed form in Secondary_regrowth_closed_form)
+        """
+        for name in self.__slots__:
+            setattr(self, name, getattr(tracker, name) if tracker is not None else values[name])
+
+    def pdv(self, discount_rates):
+        """
+        PDV (tC/ha) for any discount rates, from the undiscounted annual flux without re-running the carbon tracker
+        :param discount_rates: scalar or array of discount rates, e.g. np.arange(0, 0.1001, 0.0025)
+        :return: PDV of the same shape as discount_rates
+        """
+        return discount_annual_flux(self.benefit_minus_counterfactual_diff, self.discounted_year, discount_rates)
+
+    def at_discount_rate(self, discount_rate):
+        """Same result with the annual discounted value of another discount rate"""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values['annual_discounted_value'] = self.benefit_minus_counterfactual_diff / (1 + discount_rate) ** self.discounted_year
+        return TrackerResult(**values)
+
+    def __repr__(self):
+        return f"TrackerResult(country={self.Global.country_name!r}, year_start_for_PDV={self.year_start_for_PDV}, PDV={self.annual_discounted_value.sum():.3f} tC/ha)"
+
+
+def discount_annual_flux(annual_flux, discounted_year, discount_rates):
+    """
+    Sum of the annual flux discounted by each discount rate, as calculate_PDV of the carbon trackers
+    :param annual_flux: (nyears, ...) undiscounted annual flux, e.g. one column per starting year
+    :param discounted_year: discounting year of each flux value, same shape as annual_flux or (nyears,)
+    :return: (n_discount_rates, ...) array, or (...) for a scalar discount rate
+    """
+    discount_rates = np.asarray(discount_rates, dtype=np.float64)
+    annual_flux = np.asarray(annual_flux, dtype=np.float64)
+    discounted_year = np.broadcast_to(discounted_year, annual_flux.shape)
+    # (n_discount_rates, nyears, ...) discounted values, summed over the years
+    pdv = np.sum(annual_flux / (1 + discount_rates.reshape((-1,) + (1,) * annual_flux.ndim)) ** discounted_year, axis=1)
+    return pdv.reshape(discount_rates.shape + pdv.shape[1:])
@@ -4,6 +4,18 @@ New Tropical Plantation Module
 1. Grab the national results from the result file
 2. Calculate the global results
 3. Calculate the new tropical plantation scneario based on global results
+
+The yearly PDV per ha of the new plantations on agricultural land only depends on the country inputs (including the discount rate)
+and the years of harvest and growth, not on the output table of the demand and substitution permutation.
+It is calculated once per country inputs and kept in AGRILAND_PDV_CACHE, so it is reused across the permutations of summarize_results_all.
+
+run_new_tropical_plantations_batch evaluates the scenario on Parameters objects and output tables already in memory,
+for many permutations and annual establishment areas or schedules (e.g. with a ramp-up) in one call, e.g. 0-5 Mha/yr:
+    global_harvest_settings, global_growth_settings = tropical_parameters(datafile)
+    outputs = run_new_tropical_plantations_batch(results_tables, global_harvest_settings, global_growth_settings, np.arange(0, 5.1, 0.1) * 1000000)
+    schedules = establishment_schedules(global_harvest_settings['BRA'].nyears, np.arange(0, 5.1, 0.1) * 1000000, ramp_up_years=10)
+    outputs = run_new_tropical_plantations_batch(results_tables, global_harvest_settings, global_growth_settings, schedules)
+PlantationCalculator is the single permutation and 2 Mha/yr run of the workbook.
 """
 __author__ = "Liqing Peng"
 __copyright__ = "Copyright (C) 2023 Liqing Peng, Timothy D. Searchinger, Jessica Zionts, Richard Waite"
@@ -14,170 +26,254 @@ __email__ = "liqing.peng@wri.org"
 __version__ = "1.0"
 
 import numpy as np
-import Global_by_country, Agricultural_land_tropical_scenario
+import pandas as pd
+import Global_by_country, Agricultural_land_tropical_scenario, Result_cache
+
+
+# 2023/Jan: Change the rotation year from exactly 10 years to all countries that are below 10 years
+# only tropical countries that are shorter than 10 years rotation period: Brazil, Congo, Ethiopia, Indonesia, Vietnam (Add Ethiopia)
+TROPICAL_COUNTRIES_ISO = ['BRA', 'COD', 'ETH', 'IDN', 'VNM']
+
+# 2022 Jan Lists
+CARBON_LISTS = ['Default: Plantation supply wood (mega tC)', 'Default: Secondary forest supply wood (mega tC)',
+                'S1 regrowth: total PDV (mega tC)', 'S1 regrowth: PDV plantation (mega tC)',
+                'S1 regrowth: PDV secondary (mega tC)', 'S2 conversion: total PDV (mega tC)',
+                'S3 mixture: total PDV (mega tC)', 'S4 125% GR: total PDV (mega tC)',
+                'S5 62% SL: total PDV (mega tC)', 'S6 WFL 50% less: total PDV (mega tC)']
+AREA_LISTS = ['Plantation area (ha)', 'S1 regrowth: Secondary area (ha)', 'S2 conversion: Secondary area (ha)',
+              'S3 mixture: Secondary area (ha)', 'S3 mixture: Secondary middle aged area (ha)',
+              'S3 mixture: Secondary mature area (ha)', 'S4 125% GR: Secondary area (ha)',
+              'S5 62% SL: Secondary area (ha)', 'S6 WFL 50% less: Secondary area (ha)']
+
+# Outputs of the scenario, in the order returned by PlantationCalculator.run_new_tropical_plantations_scenario
+SCENARIO_OUTPUTS = ['carbon_cost_annual', 'updated_secondary_area', 'new_plantation_area', 'total_wood_secondary_after_replace', 'total_wood_plantation_after_replace']
+
+# {(digest of the harvest settings, digest of the growth settings): yearly PDV per ha of the new plantations on agricultural land}
+AGRILAND_PDV_CACHE = {}
+
+
+def agriland_pdv_yearly(global_harvest_settings, global_growth_settings):
+    """
+    Total PDV per ha (tC/ha) of the new plantation established on agricultural land in each year of harvest
+    Calculated once per country inputs, discount rate and years of harvest and growth, then taken from AGRILAND_PDV_CACHE
+    """
+    key = (Result_cache.parameters_digest(global_harvest_settings), Result_cache.parameters_digest(global_growth_settings))
+    if key not in AGRILAND_PDV_CACHE:
+        annual_discounted_value_nyears_agriland = np.zeros((global_growth_settings.nyears, global_harvest_settings.nyears))
+        for year in range(global_harvest_settings.nyears):
+            #### This is the only line that requires the CHARM model run ####
+            annual_discounted_value_nyears_agriland[:, year] = Agricultural_land_tropical_scenario.CarbonTracker(global_growth_settings, year_start_for_PDV=year, keep_intermediates=False).annual_discounted_value[:]
+        AGRILAND_PDV_CACHE[key] = np.sum(annual_discounted_value_nyears_agriland, axis=0)
+    return AGRILAND_PDV_CACHE[key]
+
+
+def tropical_parameters(datafile, countries_iso=TROPICAL_COUNTRIES_ISO, discount_rate_input=None):
+    """
+    Parameters of the tropical countries for the new plantation scenario, read from the Inputs table once
+    :param datafile: path of the excel data file, or the Inputs table (DataFrame)
+    :param discount_rate_input: discount rate instead of the one of the Inputs table, e.g. 0.02, see Global_by_country.Parameters
+    :return: {ISO: Parameters} with the years of harvest, {ISO: Parameters} with the years of growth
+    """
+    inputs = Global_by_country.read_inputs(datafile)
+    global_harvest_settings, global_growth_settings = {}, {}
+    for iso in countries_iso:
+        nyears_harvest_settings = Global_by_country.SetupTime(inputs, country_iso=iso, nyears_run_control='harvest')
+        nyears_growth_settings = Global_by_country.SetupTime(inputs, country_iso=iso, nyears_run_control='growth')
+        global_harvest_settings[iso] = Global_by_country.Parameters(inputs, nyears_harvest_settings, country_iso=iso, discount_rate_input=discount_rate_input)
+        global_growth_settings[iso] = Global_by_country.Parameters(inputs, nyears_growth_settings, country_iso=iso, discount_rate_input=discount_rate_input)
+    return global_harvest_settings, global_growth_settings
+
+
+def prepare_global_outputs_for_new_tropical_scenario(results):
+    """Extract outputs for the new tropical plantation scenario"""
+    # Get global carbon and area numbers
+    carbon_global = results[results.select_dtypes(include=['number']).columns][CARBON_LISTS].sum() / 0.8 * 1000000  # mega tC to tC
+    area_global = results[results.select_dtypes(include=['number']).columns][AREA_LISTS].sum() / 0.8
+
+    return carbon_global, area_global
+
+
+def establishment_schedules(nyears, areas_annual, ramp_up_years=0):
+    """
+    Annual establishment schedules of new plantations on agricultural land, one per annual area
+    :param areas_annual: area established per year after the ramp-up (ha), a scalar or an array of areas, e.g. np.arange(0, 5.1, 0.1) * 1000000
+    :param ramp_up_years: number of years of linear increase to the annual area, 0 for a constant rate from year 0
+    :return: (n_areas, nyears) array
+    """
+    areas_annual = np.atleast_1d(np.asarray(areas_annual, dtype=np.float64))
+    ramp_up = np.minimum((np.arange(nyears) + 1) / ramp_up_years, 1) if ramp_up_years > 0 else np.ones(nyears)
+    return areas_annual[:, None] * ramp_up
+
+
+def prepare_new_tropical_plantations_area(nyears, rotation_length, area_established_agriland_annual_global):
+    """
+        This is for the Tropical New Plantation Scenario, 4th scenario's input
+        Set up plantation establishment rate per year, time and total area for harvest
+        area_established_agriland_annual_global: area established every year (ha), or the established area of each year
+            as a (nyears,) schedule or a (n_schedules, nyears) array of schedules, e.g. from establishment_schedules.
+            The area established in the last rotation is not harvested before the last year and is not counted.
+        Returns the accumulated established and harvested areas and the first harvested area of each year,
+        with a leading n_schedules dimension for an array of schedules
+    """
+    area_established_agriland_annual_global = np.asarray(area_established_agriland_annual_global, dtype=np.float64)
+    if area_established_agriland_annual_global.ndim == 0:
+        schedule = np.full(nyears, area_established_agriland_annual_global)
+    elif area_established_agriland_annual_global.shape[-1] == nyears:
+        schedule = area_established_agriland_annual_global
+    else:
+        raise ValueError(f'The establishment schedule has {area_established_agriland_annual_global.shape[-1]} years instead of {nyears}')
+
+    # The first established plantation is in year 0, 2010; the last established plantation is in one rotation ahead of the last year.
+    # No new plantation if the rotation is longer than the years
+    year_new_plantation_st, year_new_plantation_ed = 0, max(nyears - rotation_length, 0)
+    # The first harvested year of the established plantation is in one rotation behind of the first established year; the last harvested year is in last year, nyears - 1
+    year_harvest_st, year_harvest_ed = year_new_plantation_st + rotation_length, nyears - 1
+
+    # This is the area establishing plantation starting from year 0
+    area_established_new_agriland = np.zeros(schedule.shape)
+    area_established_new_agriland[..., year_new_plantation_st:year_new_plantation_ed] = schedule[..., year_new_plantation_st:year_new_plantation_ed]
+    # Count the number of rotation for each year's plantation (there may be multiple harvests in the same area over the course), divide the rotation length and round down
+    nrotation = (year_harvest_ed - np.arange(nyears)) // rotation_length
+    # This is the total harvested area plantation for each year's established plantation
+    area_harvested_agriland = area_established_new_agriland * nrotation
+    # This is the new established area starting from the first rotation end, after one rotation period
+    area_harvested_new_agriland = np.zeros(schedule.shape)
+    area_harvested_new_agriland[..., year_harvest_st:] = area_established_new_agriland[..., :year_new_plantation_ed]
+
+    # area_established_agriland = np.cumsum(area_established_new_agriland, axis=-1) # This is to show the accumulate agricultural land
+    area_established_new_agriland_accumulate = np.sum(area_established_new_agriland, axis=-1)
+    area_harvested_agriland_accumulate = np.sum(area_harvested_agriland, axis=-1)
+    area_harvested_new_agriland_accumulate = np.sum(area_harvested_new_agriland, axis=-1)
+
+    # CHECK - area_established_new_agriland_accumulate should EQUAL area_harvested_new_agriland_accumulate, up to the rounding of the sums of a varying schedule
+    if not np.allclose(area_harvested_new_agriland_accumulate, area_established_new_agriland_accumulate, rtol=1e-12, atol=0):
+        raise ValueError('The total new tropical plantation area does not match!')
+    return area_established_new_agriland_accumulate, area_harvested_agriland_accumulate, area_harvested_new_agriland
+
+
+def run_new_tropical_plantations_batch(results_tables, global_harvest_settings, global_growth_settings, area_established_agriland_annual_global=2 * 1000000):
+    """
+    VERY IMPORTANT FEATURE OF THIS SCRIPT!
+    Tropical New Plantation Scenario
+    This is the 4th scenario
+    require the input from the existing model outputs
+    Batch of permutations and annual establishment areas, without reading the data file
+    :param results_tables: output table (DataFrame) of a permutation, or a list of them
+    :param global_harvest_settings, global_growth_settings: {ISO: Parameters} of the tropical countries, see tropical_parameters.
+                                                            The years and rotation length are the ones of Brazil.
+    :param area_established_agriland_annual_global: area of agricultural land converted to plantation per year (ha), a scalar or an array of areas,
+                                                    or a (n_schedules, nyears) array of the area established in each year (see establishment_schedules)
+    :return: {output name (SCENARIO_OUTPUTS): (n_permutations, n_schedules) array}, one schedule per annual area for a scalar or an array of areas
+    """
+    results_tables = [results_tables] if isinstance(results_tables, pd.DataFrame) else list(results_tables)
+    nyears = global_harvest_settings['BRA'].nyears
+    rotation_length = global_harvest_settings['BRA'].rotation_length_harvest  # this is the rotation length from Brazil, currently set to 7
+
+    ### New plantation land area assumption
+    # We assume the *** 2Mha *** per year of agricultural land are converted to plantation evenly from 2010-2050, by default
+    schedules = np.asarray(area_established_agriland_annual_global, dtype=np.float64)
+    if schedules.ndim < 2:
+        schedules = establishment_schedules(nyears, schedules)
+    # (n_schedules,) and (n_schedules, nyears)
+    _, area_harvested_agriland_accumulate, area_harvested_new_agriland = prepare_new_tropical_plantations_area(nyears, rotation_length, schedules)
+
+    ### Read in the country sum parameters, one row per permutation
+    carbon_global, area_global = zip(*[prepare_global_outputs_for_new_tropical_scenario(results) for results in results_tables])
+    carbon_global, area_global = pd.DataFrame(carbon_global), pd.DataFrame(area_global)
+    total_pdv_plantation = carbon_global['S1 regrowth: PDV plantation (mega tC)'].values[:, None]  # Total PDV for existing plantation, tC
+    total_pdv_secondary_regrowth = carbon_global['S1 regrowth: PDV secondary (mega tC)'].values[:, None]  # Total PDV for secondary regrowth scenario, tC
+    area_harvested_new_secondary_sum = area_global['S1 regrowth: Secondary area (ha)'].values[:, None]  # Total area of secondary harvested for regrowth, ha
+    total_wood_secondary = carbon_global['Default: Secondary forest supply wood (mega tC)'].values[:, None]     # Total wood from secondary, tC
+    total_wood_plantation = carbon_global['Default: Plantation supply wood (mega tC)'].values[:, None]     # Total wood from secondary, tC
+
+    ############################################## Calculation #############################################
+    ### 1. Calculate Average PDV per hectare for secondary as Total PDV for secondary/Total area of secondary harvested
+    pdv_average_secondary_regrowth = total_pdv_secondary_regrowth / area_harvested_new_secondary_sum  # tC/ha
+
+    ### 2. Calculate average yield for secondary as total wood from secondary/ total area of secondary harvested, only harvest once
+    yield_average_secondary = total_wood_secondary / area_harvested_new_secondary_sum
+
+    ################################ Aggregated/Weighted Parameters
+    ### 3. Calculate average tropical plantation wood harvest
+    # weighted average of the output per ha for each harvest
+    # Get the plantation area, (n_permutations, n_countries)
+    area_plantation_tropical = np.array([[results.loc[results['ISO']==iso]['Plantation area (ha)'].values[0] for iso in TROPICAL_COUNTRIES_ISO] for results in results_tables])
+    # Get the output per ha at the 2020 year
+    output_ha_tropical = np.array([[results.loc[results['ISO']==iso]['Output per ha Agricultural land conversion (tC/ha)'].values[0] for iso in TROPICAL_COUNTRIES_ISO] for results in results_tables])
+    # Get the weighted average output per ha for the five countries
+    output_ha_tropical_average = (np.sum(area_plantation_tropical * output_ha_tropical, axis=1) / np.sum(area_plantation_tropical, axis=1))[:, None]
+
+    ### 4. Calculate the total wood harvest/production from the new plantation from agricultural land
+    # New plantation wood production for 2020-2050, tC, from the annual agricultural land with continuous harvest
+    wood_supply_agriland = area_harvested_agriland_accumulate * output_ha_tropical_average
+
+    ### 5. Calculate area reduced due to new plantation as “new plantation wood production/average yield for secondary”
+    area_reduced_secondary = wood_supply_agriland / yield_average_secondary
+
+    ### 6. Calculate new total PDV for secondary as Average PDV per hectare for secondary * (Total area of secondary harvested – area reduced due to new plantation)
+    total_pdv_secondary_after_replace = pdv_average_secondary_regrowth * (area_harvested_new_secondary_sum - area_reduced_secondary)
+
+    ### 7. Calculate total PDV for NEW plantation from agricultural land.
+    # Get the yearly PDV value from the agriland, the same for all the permutations (see agriland_pdv_yearly), (n_countries, nyears)
+    pdv_yearly_agriland = np.zeros((len(TROPICAL_COUNTRIES_ISO), nyears))
+    for icountry, iso in enumerate(TROPICAL_COUNTRIES_ISO):
+        pdv_yearly = agriland_pdv_yearly(global_harvest_settings[iso], global_growth_settings[iso])[:nyears]
+        pdv_yearly_agriland[icountry, :len(pdv_yearly)] = pdv_yearly
+    # (n_countries, n_schedules)
+    total_pdv_agriland_sum_country = pdv_yearly_agriland @ area_harvested_new_agriland.T
+    # use plantation area to weighted average from the tropical countries
+    total_pdv_tropical_weighted_average = area_plantation_tropical @ total_pdv_agriland_sum_country / np.sum(area_plantation_tropical, axis=1)[:, None]
+
+    ### 8. Calculate global PDV as Total PDV for existing plantation + Total PDV for new plantation + New total PDV for secondary
+    global_pdv = total_pdv_plantation + total_pdv_secondary_after_replace + total_pdv_tropical_weighted_average
+
+    # Convert tC to GtCO2 per year.
+    carbon_cost_annual = global_pdv / 1000000000 * 44 / 12 / nyears
+    # Convert ha to Mha
+    updated_secondary_area = (area_harvested_new_secondary_sum - area_reduced_secondary) / 1000000
+    new_plantation_area = np.broadcast_to(np.sum(area_harvested_new_agriland, axis=1) / 1000000, carbon_cost_annual.shape)
+
+    ### 9. Calculate the total secondary wood supply reduced from the new plantation
+    total_wood_secondary_after_replace = total_wood_secondary - wood_supply_agriland
+    total_wood_plantation_after_replace = total_wood_plantation + wood_supply_agriland
+
+    return dict(zip(SCENARIO_OUTPUTS, (carbon_cost_annual, updated_secondary_area, new_plantation_area, total_wood_secondary_after_replace, total_wood_plantation_after_replace)))
 
 
 class PlantationCalculator:
 
     def __init__(self, datafile, results):
-
+        """
+        datafile: path of the excel data file, or its Inputs table already loaded (Global_by_country.read_inputs), so that it is read once for all the permutations
+        results: output table of one permutation
+        """
         ### Read in model results
-        self.datafile = datafile
+        self.datafile = Global_by_country.read_inputs(datafile)
         self.results = results
-        self.nyears_harvest_settings = Global_by_country.SetupTime(datafile, country_iso='BRA', nyears_run_control='harvest')
-        self.Global = Global_by_country.Parameters(datafile, self.nyears_harvest_settings, country_iso='BRA')
+        self.global_harvest_settings, self.global_growth_settings = tropical_parameters(self.datafile)
+        self.nyears_harvest_settings = Global_by_country.SetupTime(self.datafile, country_iso='BRA', nyears_run_control='harvest')
+        self.Global = self.global_harvest_settings['BRA']
         self.nyears = self.Global.nyears
         self.rotation_length = self.Global.rotation_length_harvest # this is the rotation length from Brazil, currently set to 7
 
 
     def prepare_global_outputs_for_new_tropical_scenario(self):
         """Extract outputs for the new tropical plantation scenario"""
-        # 2022 Jan Lists
-        carbon_lists = ['Default: Plantation supply wood (mega tC)', 'Default: Secondary forest supply wood (mega tC)',
-                        'S1 regrowth: total PDV (mega tC)', 'S1 regrowth: PDV plantation (mega tC)',
-                        'S1 regrowth: PDV secondary (mega tC)', 'S2 conversion: total PDV (mega tC)',
-                        'S3 mixture: total PDV (mega tC)', 'S4 125% GR: total PDV (mega tC)',
-                        'S5 62% SL: total PDV (mega tC)', 'S6 WFL 50% less: total PDV (mega tC)']
-        area_lists = ['Plantation area (ha)', 'S1 regrowth: Secondary area (ha)', 'S2 conversion: Secondary area (ha)',
-                      'S3 mixture: Secondary area (ha)', 'S3 mixture: Secondary middle aged area (ha)',
-                      'S3 mixture: Secondary mature area (ha)', 'S4 125% GR: Secondary area (ha)',
-                      'S5 62% SL: Secondary area (ha)', 'S6 WFL 50% less: Secondary area (ha)']
-        # Get global carbon and area numbers
-        carbon_global = self.results[self.results.select_dtypes(include=['number']).columns][
-                            carbon_lists].sum() / 0.8 * 1000000  # mega tC to tC
-        area_global = self.results[self.results.select_dtypes(include=['number']).columns][area_lists].sum() / 0.8
-
-        return carbon_global, area_global
+        return prepare_global_outputs_for_new_tropical_scenario(self.results)
 
 
     def prepare_new_tropical_plantations_area(self, nyears, rotation_length, area_established_agriland_annual_global):
-        """
-            This is for the Tropical New Plantation Scenario, 4th scenario's input
-            Set up plantation establishment rate per year, time and total area for harvest
-        """
-        # The first established plantation is in year 0, 2010; the last established plantation is in one rotation ahead of the last year. nyears - 1 + 1 for the range().
-        year_new_plantation_st, year_new_plantation_ed = 0, nyears - rotation_length
-        # The first harvested year of the established plantation is in one rotation behind of the first established year; the last harvested year is in last year, nyears - 1
-        year_harvest_st, year_harvest_ed = year_new_plantation_st + rotation_length, nyears - 1
-
-        area_established_new_agriland = np.zeros(nyears) # This is the area establishing plantation starting from year 0
-        area_harvested_new_agriland = np.zeros(nyears)  # This is the new established area starting from the first rotation end
-        area_harvested_agriland = np.zeros(nyears)   # This is the total harvested area plantation for each year's established plantation
-
-        # For each year of new established plantations, accumulate the area,
-        # and then count the number of rotation for that year's plantation (there may be multiple harvests in the same area over the course)
-        for year in range(year_new_plantation_st, year_new_plantation_ed):
-            area_established_new_agriland[year] = area_established_agriland_annual_global
-            # divide the rotation length and round down
-            nrotation = (year_harvest_ed - year) // rotation_length
-            area_harvested_agriland[year] = area_established_agriland_annual_global * nrotation
-
-        # after one rotation period
-        area_harvested_new_agriland[rotation_length:] = area_established_agriland_annual_global
-
-        # area_established_agriland = np.cumsum(area_established_new_agriland) # This is to show the accumulate agricultural land
-        area_established_new_agriland_accumulate = np.sum(area_established_new_agriland)
-        area_harvested_agriland_accumulate = np.sum(area_harvested_agriland)
-        area_harvested_new_agriland_accumulate = np.sum(area_harvested_new_agriland)
-
-        # CHECK - area_established_new_agriland_accumulate should EQUAL area_harvested_new_agriland_accumulate
-        if area_harvested_new_agriland_accumulate != area_established_new_agriland_accumulate:
-            raise ValueError('The total new tropical plantation area does not match!')
-        return area_established_new_agriland_accumulate, area_harvested_agriland_accumulate, area_harvested_new_agriland
-
-
-    def run_new_tropical_plantations_scenario(self):
-        """
-        VERY IMPORTANT FEATURE OF THIS SCRIPT!
-        Tropical New Plantation Scenario
-        This is the 4th scenario
-        require the input from the existing model outputs
-        """
+        """See the module function prepare_new_tropical_plantations_area"""
+        return prepare_new_tropical_plantations_area(nyears, rotation_length, area_established_agriland_annual_global)
 
-        ### New plantation land area assumption
-        # We assume the *** 2Mha *** per year of agricultural land are converted to plantation evenly from 2010-2050
-        area_established_agriland_annual_global = 2 * 1000000  # Mha per year
-        area_established_new_agriland_accumulate, area_harvested_agriland_accumulate, area_harvested_new_agriland = self.prepare_new_tropical_plantations_area(self.nyears, self.rotation_length, area_established_agriland_annual_global)
-
-        ### Read in the country sum parameters
-        carbon_global, area_global = self.prepare_global_outputs_for_new_tropical_scenario()
-        total_pdv_plantation = carbon_global['S1 regrowth: PDV plantation (mega tC)']  # Total PDV for existing plantation, tC
-        total_pdv_secondary_regrowth = carbon_global['S1 regrowth: PDV secondary (mega tC)']  # Total PDV for secondary regrowth scenario, tC
-        area_harvested_new_secondary_sum = area_global['S1 regrowth: Secondary area (ha)']  # Total area of secondary harvested for regrowth, ha
-        total_wood_secondary = carbon_global['Default: Secondary forest supply wood (mega tC)']     # Total wood from secondary, tC
-        total_wood_plantation = carbon_global['Default: Plantation supply wood (mega tC)']     # Total wood from secondary, tC
-
-        ############################################## Calculation #############################################
-        ### 1. Calculate Average PDV per hectare for secondary as Total PDV for secondary/Total area of secondary harvested
-        pdv_average_secondary_regrowth = total_pdv_secondary_regrowth / area_harvested_new_secondary_sum  # tC/ha
-
-        ### 2. Calculate average yield for secondary as total wood from secondary/ total area of secondary harvested, only harvest once
-        yield_average_secondary = total_wood_secondary / area_harvested_new_secondary_sum
-
-        ################################ Aggregated/Weighted Parameters
-        # 2023/Jan: Change the rotation year from exactly 10 years to all countries that are below 10 years
-        # only tropical countries that are shorter than 10 years rotation period: Brazil, Congo, Ethiopia, Indonesia, Vietnam (Add Ethiopia)
-        ### 3. Calculate average tropical plantation wood harvest
-        # weighted average of the output per ha for each harvest
-        tropical_countries_iso = ['BRA', 'COD', 'ETH', 'IDN', 'VNM']
-        # Get the plantation area
-        area_plantation_tropical = [self.results.loc[self.results['ISO']==iso]['Plantation area (ha)'].values[0] for iso in tropical_countries_iso]
-        # Get the output per ha at the 2020 year
-        output_ha_tropical = [self.results.loc[self.results['ISO']==iso]['Output per ha Agricultural land conversion (tC/ha)'].values[0] for iso in tropical_countries_iso]
-        weighted_sum = sum([area_plantation_tropical[i] * output_ha_tropical[i] for i in range(len(output_ha_tropical))])
-        # Get the weighted average output per ha for the five countries
-        output_ha_tropical_average = weighted_sum / sum(area_plantation_tropical)
-
-        ### 4. Calculate the total wood harvest/production from the new plantation from agricultural land
-        # New plantation wood production for 2020-2050, tC, from the 2 Mha per year agricultural land with continuous harvest
-        wood_supply_agriland = area_harvested_agriland_accumulate * output_ha_tropical_average
-
-        ### 5. Calculate area reduced due to new plantation as “new plantation wood production/average yield for secondary”
-        area_reduced_secondary = wood_supply_agriland / yield_average_secondary
-
-        ### 6. Calculate new total PDV for secondary as Average PDV per hectare for secondary * (Total area of secondary harvested – area reduced due to new plantation)
-        total_pdv_secondary_after_replace = pdv_average_secondary_regrowth * (area_harvested_new_secondary_sum - area_reduced_secondary)
-
-        ### 7. Calculate total PDV for NEW plantation from agricultural land.
-        # Get the yearly PDV value from the agriland
-        total_pdv_agriland_sum_country = []
-        # weighted average from the several tropical countries
-        for iso in tropical_countries_iso:
-            # Global = Global_by_country.Parameters(datafile, country_iso=iso)
-            nyears_harvest_settings = Global_by_country.SetupTime(self.datafile, country_iso=iso, nyears_run_control='harvest')
-            nyears_growth_settings = Global_by_country.SetupTime(self.datafile, country_iso=iso, nyears_run_control='growth')
-            ### Default plantation scenarios, (1) secondary harvest regrowth and (2) conversion
-            ### Read in global parameters ###
-            global_harvest_settings = Global_by_country.Parameters(self.datafile, nyears_harvest_settings, country_iso=iso)
-            global_growth_settings = Global_by_country.Parameters(self.datafile, nyears_growth_settings, country_iso=iso)
-            annual_discounted_value_nyears_agriland = np.zeros((global_growth_settings.nyears, global_harvest_settings.nyears))
-            for year in range(global_harvest_settings.nyears):
-                #### This is the only line that requires the CHARM model run ####
-                annual_discounted_value_nyears_agriland[:, year] = Agricultural_land_tropical_scenario.CarbonTracker(global_growth_settings, year_start_for_PDV=year).annual_discounted_value[:]
-            pdv_yearly_agriland = np.sum(annual_discounted_value_nyears_agriland, axis=0)
-
-            total_pdv_agriland = np.zeros((global_harvest_settings.nyears))
-            for year in range(global_harvest_settings.nyears):
-                total_pdv_agriland[year] = pdv_yearly_agriland[year] * area_harvested_new_agriland[year]
-            total_pdv_agriland_sum_country.append(np.sum(total_pdv_agriland))
-
-        # use plantation area to weighted average from the tropical countries
-        pdv_weighted_sum = sum([area_plantation_tropical[i] * total_pdv_agriland_sum_country[i] for i in range(len(total_pdv_agriland_sum_country))])
-        # Get the weighted average output per ha for the four countries
-        total_pdv_tropical_weighted_average = pdv_weighted_sum / sum(area_plantation_tropical)
-
-        ### 8. Calculate global PDV as Total PDV for existing plantation + Total PDV for new plantation + New total PDV for secondary
-        global_pdv = total_pdv_plantation + total_pdv_secondary_after_replace + total_pdv_tropical_weighted_average
-
-        # Convert tC to GtCO2 per year.
-        carbon_cost_annual = global_pdv / 1000000000 * 44 / 12 / self.nyears
-        # Convert ha to Mha
-        updated_secondary_area = (area_harvested_new_secondary_sum - area_reduced_secondary) / 1000000
-        new_plantation_area = np.sum(area_harvested_new_agriland) / 1000000
-
-        ### 9. Calculate the total secondary wood supply reduced from the new plantation
-        total_wood_secondary_after_replace = total_wood_secondary - wood_supply_agriland
-        total_wood_plantation_after_replace = total_wood_plantation + wood_supply_agriland
-
-        return carbon_cost_annual, updated_secondary_area, new_plantation_area, total_wood_secondary_after_replace, total_wood_plantation_after_replace
 
+    def run_new_tropical_plantations_scenario(self, area_established_agriland_annual_global=2 * 1000000):
+        """
+        The new tropical plantation scenario of this permutation for one annual area or establishment schedule, see run_new_tropical_plantations_batch
+        We assume the *** 2Mha *** per year of agricultural land are converted to plantation evenly from 2010-2050
+        """
+        # A (nyears,) schedule is passed as a batch of one schedule, a 1-D array in the batch being annual areas
+        area_established = np.asarray(area_established_agriland_annual_global, dtype=np.float64)
+        outputs = run_new_tropical_plantations_batch(self.results, self.global_harvest_settings, self.global_growth_settings,
+                                                     area_established.reshape(1, -1) if area_established.ndim == 1 else area_established)
+        return tuple(outputs[name][0, 0] for name in SCENARIO_OUTPUTS)
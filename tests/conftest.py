@@ -0,0 +1,59 @@
+"""
+Shared fixtures of the tests: a small synthetic Inputs table, so that the model runs without the data files
+The countries cover the rotation types of the model:
+- IDN a tropical short rotation (agricultural land conversion, no thinning)
+- CHL a middle rotation with thinning
+- SWE a long rotation with thinning
+"""
+import os
+import sys
+import pandas as pd
+import pytest
+
+MODELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'models')
+if MODELS not in sys.path:
+    sys.path.insert(0, MODELS)
+
+BASE_INPUTS = {
+    'Years of harvests': 40, 'Years of growth': 40, 'Discount rate': 0.04,
+    'Young Plantation GR': 8.0, 'Middle Plantation GR': 6.0, 'Converted Plantation GR': 7.0, 'Plantation Area': 2.0e6,
+    'Young Secondary GR': 2.5, 'Middle Secondary GR': 1.2, 'Avg Secondary C Density': 60.0, 'Mature to middle secondary GR ratio': 0.5,
+    'LLP half life': 30.0, 'SLP half life': 2.0, 'VSLP half life': 1.0, 'Slash half life': 5.0, 'Roots half life': 8.0, 'Landfill half life': 20.0,
+    '% of slash burned in the field': 0.1, '% of slash left to decay': 0.9,
+    '% slash plantation': 0.3, '% slash optimal for LLP': 0.4, '% slash optimal for SLP': 0.35, '% slash optimal for VSLP': 0.2,
+    '% slash secondary for LLP': 0.6, '% slash secondary for SLP': 0.5, '% slash secondary for VSLP': 0.3,
+    '% in VSLP thinning': 0.5, '% in SLP thinning': 0.3, '% in LLP thinning': 0.1, '% in slash thinning': 0.1,
+    'SLP 2010': 3.0e6, 'SLP 2050': 5.0e6, 'LLP 2010': 4.0e6, 'LLP 2050': 6.0e6, 'VSLP 2010': 10.0e6, 'VSLP 2050': 12.0e6,
+    'VSLP-IND 2010': 4.0e6, 'VSLP-IND 2050': 5.0e6, 'VSLP-WFL 2010': 6.0e6, 'VSLP-WFL 2050': 7.0e6,
+    '% LLP for construction': 0.5, '% LLP displacing concrete and steel': 0.3,
+    'Emissions substitution factor for LLP (tC saved/tons C in LLP)': 1.2,
+    'Avoided ton concrete per ton of wood (t concrete/t wood)': 2.9, 'Avoided ton steel per ton of wood (t steel/t wood)': 0.4,
+    'Emission factor for concrete (tCO2e/t concrete)': 0.145, 'Emission factor for steel (tCO2e/t steel)': 2.11, 'Emission factor for timber (tCO2e/t wood)': 0.44,
+    'Emissions substitution factor for VSLP (tC saved/tons C in VSLP)': 0.5,
+    '% of carbon in landfill converted to methane': 0.1,
+    'Rotation Period': 7, 'Thinning period': 0, '% Removed in thinning plantation': 0.0, '% Removed in thinning regrowth': 0.0,
+}
+
+COUNTRIES = [
+    ('Indonesia', 'IDN', {'Rotation Period': 6, 'Avg Secondary C Density': 90.0}),
+    ('Chile', 'CHL', {'Rotation Period': 20, 'Thinning period': 6, '% Removed in thinning plantation': 0.2}),
+    ('Sweden', 'SWE', {'Rotation Period': 80, 'Thinning period': 15, '% Removed in thinning plantation': 0.25, '% Removed in thinning regrowth': 0.2,
+                       'Plantation Area': 5.0e5, 'LLP 2050': 3.0e6}),
+]
+
+
+def make_inputs(countries=COUNTRIES, **columns):
+    """Inputs table of the countries [(name, ISO, {column: value})], with the columns set for all of them, e.g. make_inputs(**{'Years of growth': 100})"""
+    return pd.DataFrame([{'Country': name, 'ISO': code, **BASE_INPUTS, **values, **columns} for name, code, values in countries])
+
+
+@pytest.fixture
+def inputs():
+    return make_inputs()
+
+
+def write_datafile(filename, inputs):
+    """Excel data file with the Inputs sheet as read by Global_by_country.read_inputs (one title row above the header)"""
+    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
+        inputs.to_excel(writer, sheet_name='Inputs', index=False, startrow=1)
+    return filename
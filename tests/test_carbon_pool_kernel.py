@@ -0,0 +1,117 @@
+"""
+Parity of the carbon pool kernels (Carbon_pool_kernel): the loop versions compiled with numba
+and the vectorized NumPy versions used without numba (or with CHARM_DISABLE_NUMBA=1) give the same results on random inputs.
+Without numba, the loop versions are run as plain Python.
+"""
+import os
+import sys
+import subprocess
+import numpy as np
+import pytest
+
+MODELS = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'models')
+sys.path.insert(0, MODELS)
+import Carbon_pool_kernel
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+
+def compiled(function):
+    """The loop kernel as run with numba, or as plain Python without numba"""
+    return numba.njit(function) if numba is not None else function
+
+
+RTOL, ATOL = 1e-12, 1e-9
+SEEDS = range(5)
+
+
+def random_year_index(rng, nyears, min_length=3, max_length=15):
+    """Years of harvest/thinning of the cycles, starting at 1, with cycles of random lengths within nyears"""
+    year_index = [1]
+    while True:
+        year_next = year_index[-1] + int(rng.integers(min_length, max_length + 1))
+        if year_next >= nyears:
+            return np.array(year_index, dtype=np.int64)
+        year_index.append(year_next)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_decay_harvested_pools(seed):
+    rng = np.random.default_rng(seed)
+    nyears = int(rng.integers(2, 120))
+    initial = rng.uniform(0, 100, 8)
+    parameters = (*rng.uniform(1, 60, 5), rng.uniform(0, 1), rng.uniform(0, 0.5))
+    results = []
+    for kernel in (compiled(Carbon_pool_kernel._decay_harvested_pools_loop), Carbon_pool_kernel._decay_harvested_pools_numpy):
+        pools = [np.zeros(nyears) for _ in range(8)]
+        # The harvested quantities at index 0, the landfill pools start empty
+        for pool, value in zip(pools[:4], initial[:4]):
+            pool[0] = value
+        kernel(*pools, *parameters)
+        results.append(pools)
+    for pool_loop, pool_numpy in zip(*results):
+        np.testing.assert_allclose(pool_numpy, pool_loop, rtol=RTOL, atol=ATOL)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_regrow_stand_linear(seed):
+    rng = np.random.default_rng(seed)
+    nyears = int(rng.integers(1, 120))
+    growth = rng.uniform(0, 10, nyears - 1)
+    results = []
+    for kernel in (compiled(Carbon_pool_kernel._regrow_stand_linear_loop), Carbon_pool_kernel._regrow_stand_linear_numpy):
+        aboveground_biomass = np.zeros(nyears)
+        aboveground_biomass[0] = 5.0
+        kernel(aboveground_biomass, growth)
+        results.append(aboveground_biomass)
+    np.testing.assert_allclose(results[1], results[0], rtol=RTOL, atol=ATOL)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_forward_fill_zeros(seed):
+    rng = np.random.default_rng(seed)
+    array = np.where(rng.random((6, 50)) < 0.7, 0, rng.uniform(1, 10, (6, 50)))
+    expected = array.copy()
+    for row in expected:
+        for year in range(1, row.shape[0]):
+            if row[year] == 0:
+                row[year] = row[year - 1]
+    np.testing.assert_array_equal(Carbon_pool_kernel.forward_fill_zeros(array), expected)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_thinning_accumulate(seed):
+    rng = np.random.default_rng(seed)
+    nyears = int(rng.integers(20, 120))
+    # Starts with 1 and ends with nyears, as prepared by the land area calculator
+    year_index_thinning = np.append(random_year_index(rng, nyears), nyears)
+    area_harvested_plantation = rng.uniform(0, 1e4, nyears)
+    output_ha_plantation_thinning = rng.uniform(0, 50, nyears)
+    expected = compiled(Carbon_pool_kernel._thinning_accumulate_loop)(area_harvested_plantation, output_ha_plantation_thinning, year_index_thinning, nyears)
+    result = Carbon_pool_kernel._thinning_accumulate_numpy(area_harvested_plantation, output_ha_plantation_thinning, year_index_thinning, nyears)
+    np.testing.assert_allclose(result, expected, rtol=RTOL, atol=ATOL)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_new_area_secondary(seed):
+    rng = np.random.default_rng(seed)
+    nyears = int(rng.integers(20, 120))
+    year_index_both = random_year_index(rng, nyears)
+    output_need_secondary = rng.uniform(0, 1e6, nyears)
+    wood_thinning_accumulate = rng.uniform(0, 2e5, nyears)
+    output_ha_secondary = rng.uniform(1, 100, (nyears, nyears))
+    expected = compiled(Carbon_pool_kernel._new_area_secondary_loop)(output_need_secondary, wood_thinning_accumulate, output_ha_secondary, year_index_both, nyears)
+    result = Carbon_pool_kernel._new_area_secondary_numpy(output_need_secondary, wood_thinning_accumulate, output_ha_secondary, year_index_both, nyears)
+    for array_numpy, array_loop in zip(result, expected):
+        np.testing.assert_allclose(array_numpy, array_loop, rtol=RTOL, atol=ATOL)
+
+
+def test_disable_numba_selects_numpy_kernels():
+    """CHARM_DISABLE_NUMBA=1 runs the NumPy versions even when numba is installed"""
+    code = ("import Carbon_pool_kernel as k; "
+            "assert not k.NUMBA_ENABLED; "
+            "assert k._decay_harvested_pools is k._decay_harvested_pools_numpy and k._new_area_secondary is k._new_area_secondary_numpy")
+    subprocess.run([sys.executable, '-c', code], cwd=MODELS, env=dict(os.environ, CHARM_DISABLE_NUMBA='1'), check=True)
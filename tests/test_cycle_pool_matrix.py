@@ -0,0 +1,40 @@
+"""
+Banded storage of the carbon pool matrices (Cycle_pool_matrix): same results as the dense matrices, and no silent loss of writes outside the bands
+"""
+import numpy as np
+import pytest
+import Cycle_pool_matrix, Driver
+
+
+def test_slice_before_band_is_read_only():
+    matrix = Cycle_pool_matrix.CyclePoolMatrix([0, 3], 6)
+    matrix[1, 3:6] = [1.0, 2.0, 3.0]
+    values = matrix[1, 1:5]
+    np.testing.assert_array_equal(values, [0.0, 0.0, 1.0, 2.0])
+    with pytest.raises(ValueError):
+        values += 1
+    with pytest.raises((ValueError, IndexError)):
+        matrix[1, 1:5] += 1
+    with pytest.raises(IndexError):
+        matrix[1, 1:5] = 1.0
+    np.testing.assert_array_equal(matrix.toarray()[1], [0.0, 0.0, 0.0, 1.0, 2.0, 3.0])
+
+
+def test_slice_within_band_is_a_view():
+    matrix = Cycle_pool_matrix.CyclePoolMatrix([0, 3], 6)
+    matrix[1, 4:6] += 2.0
+    np.testing.assert_array_equal(matrix.toarray()[1], [0.0, 0.0, 0.0, 0.0, 2.0, 2.0])
+    np.testing.assert_array_equal(np.sum(matrix, axis=0), matrix.toarray().sum(axis=0))
+
+
+@pytest.mark.parametrize('code', ['IDN', 'CHL', 'SWE'])
+def test_banded_same_as_dense(inputs, code):
+    country = inputs.loc[inputs['ISO'] == code, 'Country'].iloc[0]
+    dense = Driver.run_country_all_scenarios(inputs, country, code, pool_storage='dense')
+    banded = Driver.run_country_all_scenarios(inputs, country, code, pool_storage='banded')
+    assert dense.keys() == banded.keys()
+    for name, value in dense.items():
+        if isinstance(value, str):
+            assert banded[name] == value
+        else:
+            np.testing.assert_allclose(banded[name], value, rtol=1e-12, atol=0, err_msg=name)
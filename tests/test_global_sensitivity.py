@@ -0,0 +1,121 @@
+"""
+Global sensitivity indices (Global_sensitivity) on analytic models with known indices:
+the Ishigami function for the Sobol indices, and a linear model for the Sobol indices and the Morris elementary effects
+"""
+import numpy as np
+import pytest
+from conftest import make_inputs
+import Global_sensitivity, Sensitivity
+
+ISHIGAMI_A, ISHIGAMI_B = 7.0, 0.1
+
+
+def bounded_parameters(bounds):
+    return [Sensitivity.Parameter(f'x{i + 1}', f'x{i + 1}', low, high, relative=False) for i, (low, high) in enumerate(bounds)]
+
+
+def ishigami(X):
+    return np.sin(X[:, 0]) + ISHIGAMI_A * np.sin(X[:, 1]) ** 2 + ISHIGAMI_B * X[:, 2] ** 4 * np.sin(X[:, 0])
+
+
+def ishigami_indices():
+    """Analytic S1 and ST of the Ishigami function on [-pi, pi]^3"""
+    a, b, pi = ISHIGAMI_A, ISHIGAMI_B, np.pi
+    V1 = 0.5 * (1 + b * pi ** 4 / 5) ** 2
+    V2 = a ** 2 / 8
+    V13 = b ** 2 * pi ** 8 * (1 / 18 - 1 / 50)
+    V = V1 + V2 + V13
+    return np.array([V1, V2, 0.0]) / V, np.array([V1 + V13, V2, V13]) / V
+
+
+def test_saltelli_design():
+    parameters = bounded_parameters([(0.0, 1.0), (10.0, 20.0), (-5.0, 5.0)])
+    nsamples, nparams = 16, len(parameters)
+    X = Global_sensitivity.saltelli_design(parameters, nsamples, seed=1)
+    assert X.shape == (nsamples * (nparams + 2), nparams)
+    np.testing.assert_array_equal(X, Global_sensitivity.saltelli_design(parameters, nsamples, seed=1))
+    for i, parameter in enumerate(parameters):
+        assert np.all((X[:, i] >= parameter.low) & (X[:, i] <= parameter.high))
+    A, B = X[:nsamples], X[nsamples:2 * nsamples]
+    for i in range(nparams):
+        AB = X[(i + 2) * nsamples:(i + 3) * nsamples]
+        # A with the column i from B
+        np.testing.assert_array_equal(AB[:, i], B[:, i])
+        np.testing.assert_array_equal(np.delete(AB, i, axis=1), np.delete(A, i, axis=1))
+
+
+def test_sobol_indices_ishigami():
+    parameters = bounded_parameters([(-np.pi, np.pi)] * 3)
+    X = Global_sensitivity.saltelli_design(parameters, 20000, seed=0)
+    S1, ST = Global_sensitivity.sobol_indices(ishigami(X), len(parameters))
+    S1_expected, ST_expected = ishigami_indices()
+    np.testing.assert_allclose(S1, S1_expected, atol=0.03)
+    np.testing.assert_allclose(ST, ST_expected, atol=0.03)
+
+
+def test_sobol_indices_linear():
+    """Y = sum c_i x_i of independent uniform x_i: S1 = ST = c_i^2 var(x_i) / var(Y), for each of two output columns"""
+    parameters = bounded_parameters([(0.0, 1.0), (0.0, 2.0), (-1.0, 1.0)])
+    coefficients = np.array([[1.0, 0.5, 0.0], [2.0, 0.0, 3.0]]).T
+    X = Global_sensitivity.saltelli_design(parameters, 20000, seed=0)
+    S1, ST = Global_sensitivity.sobol_indices(X @ coefficients, len(parameters))
+    variances = np.array([(parameter.high - parameter.low) ** 2 / 12 for parameter in parameters])[:, None] * coefficients ** 2
+    expected = variances / variances.sum(axis=0)
+    assert S1.shape == ST.shape == (3, 2)
+    np.testing.assert_allclose(S1, expected, atol=0.02)
+    np.testing.assert_allclose(ST, expected, atol=0.02)
+
+
+def test_sobol_indices_constant_output():
+    parameters = bounded_parameters([(0.0, 1.0)] * 2)
+    X = Global_sensitivity.saltelli_design(parameters, 8, seed=0)
+    S1, ST = Global_sensitivity.sobol_indices(np.ones(X.shape[0]), len(parameters))
+    assert np.all(np.isnan(S1)) and np.all(np.isnan(ST))
+
+
+def test_morris_design():
+    parameters = bounded_parameters([(0.0, 1.0), (10.0, 20.0), (-5.0, 5.0)])
+    ntrajectories, nparams, nlevels = 10, len(parameters), 4
+    X, moved, steps = Global_sensitivity.morris_design(parameters, ntrajectories, nlevels=nlevels, seed=3)
+    assert X.shape == (ntrajectories * (nparams + 1), nparams)
+    ranges = np.array([parameter.high - parameter.low for parameter in parameters])
+    delta = nlevels / (2 * (nlevels - 1))
+    X = X.reshape(ntrajectories, nparams + 1, nparams)
+    for trajectory in range(ntrajectories):
+        # Each parameter moves once, by +/- delta of its range, within its bounds
+        assert sorted(moved[trajectory]) == list(range(nparams))
+        for step, i in enumerate(moved[trajectory]):
+            change = X[trajectory, step + 1] - X[trajectory, step]
+            np.testing.assert_allclose(change, np.where(np.arange(nparams) == i, steps[trajectory, step] * ranges, 0.0), atol=1e-12)
+            assert abs(steps[trajectory, step]) == pytest.approx(delta)
+    for i, parameter in enumerate(parameters):
+        assert np.all((X[..., i] >= parameter.low - 1e-12) & (X[..., i] <= parameter.high + 1e-12))
+
+
+def test_morris_indices_linear():
+    """The elementary effects of a linear model are its coefficients times the parameter ranges, with no spread"""
+    parameters = bounded_parameters([(0.0, 1.0), (0.0, 2.0), (-1.0, 1.0)])
+    coefficients = np.array([1.0, -0.5, 3.0])
+    X, moved, steps = Global_sensitivity.morris_design(parameters, 12, seed=4)
+    mu, mu_star, sigma = Global_sensitivity.morris_indices(X @ coefficients, moved, steps)
+    effects = coefficients * np.array([parameter.high - parameter.low for parameter in parameters])
+    np.testing.assert_allclose(mu, effects, rtol=1e-10)
+    np.testing.assert_allclose(mu_star, np.abs(effects), rtol=1e-10)
+    np.testing.assert_allclose(sigma, 0.0, atol=1e-10)
+
+
+def test_morris_indices_ishigami_ranking():
+    """x3 only acts through its interaction with x1: it has a lower mu_star than x1 and x2, and a spread of effects"""
+    parameters = bounded_parameters([(-np.pi, np.pi)] * 3)
+    X, moved, steps = Global_sensitivity.morris_design(parameters, 200, seed=5)
+    mu, mu_star, sigma = Global_sensitivity.morris_indices(ishigami(X), moved, steps)
+    assert mu_star[2] < mu_star[0] and mu_star[2] < mu_star[1]
+    assert sigma[2] > 0
+
+
+def test_morris_analysis_frame():
+    parameters = [Sensitivity.Parameter('LLP half life', 'LLP half life', 20.0, 40.0, relative=False)]
+    indices = Global_sensitivity.morris_analysis(make_inputs(), parameters, 2, seed=0, variables=['S1 regrowth: total PDV (mega tC)'], processes=1)
+    assert list(indices.columns) == ['ISO', 'variable', 'parameter', 'mu', 'mu_star', 'sigma']
+    assert list(indices['ISO']) == ['IDN', 'CHL', 'SWE']
+    assert np.all(np.isfinite(indices[['mu', 'mu_star', 'sigma']].to_numpy()))
@@ -0,0 +1,64 @@
+"""
+Closed form of the single harvest regrowth scenarios (Secondary_regrowth_closed_form): the annual flux matrix of all the starting years
+is the same as one carbon tracker of Secondary_regrowth_scenario / Secondary_mature_regrowth_scenario per starting year
+"""
+import numpy as np
+import pytest
+from conftest import make_inputs
+import Global_by_country, Secondary_regrowth_closed_form, Secondary_regrowth_scenario, Secondary_mature_regrowth_scenario
+
+RTOL, ATOL = 1e-10, 1e-9
+# Single harvest regrowth of the tropical short rotation, with other growth settings and horizons
+CASES = [('IDN', {}),
+         ('IDN', {'Years of growth': 100}),
+         ('IDN', {'Young Secondary GR': 4.0, 'Middle Secondary GR': 0.8, 'Avg Secondary C Density': 150.0, 'Mature to middle secondary GR ratio': 0.2}),
+         ('CHL', {'Discount rate': 0.0, 'LLP half life': 20.0, 'Landfill half life': 20.0})]
+
+
+def growth_settings(code, columns):
+    inputs = make_inputs(**columns)
+    nyears_harvest = Global_by_country.SetupTime(inputs, country_iso=code, nyears_run_control='harvest').nyears
+    Global = Global_by_country.Parameters(inputs, Global_by_country.SetupTime(inputs, country_iso=code, nyears_run_control='growth'), country_iso=code)
+    return Global, nyears_harvest
+
+
+def tracker_annual_flux(scenario_module, Global, nyears_start):
+    return np.stack([scenario_module.CarbonTracker(Global, year_start_for_PDV=year, keep_intermediates=False).benefit_minus_counterfactual_diff
+                     for year in range(nyears_start)], axis=1)
+
+
+@pytest.mark.parametrize('mature, scenario_module', [(False, Secondary_regrowth_scenario), (True, Secondary_mature_regrowth_scenario)], ids=['middle', 'mature'])
+@pytest.mark.parametrize('code, columns', CASES)
+def test_annual_flux_matrix_same_as_tracker(code, columns, mature, scenario_module):
+    Global, nyears_start = growth_settings(code, columns)
+    assert Secondary_regrowth_closed_form.is_single_harvest(Global)
+    closed_form = Secondary_regrowth_closed_form.annual_flux_matrix(Global, nyears_start, mature=mature)
+    np.testing.assert_allclose(closed_form, tracker_annual_flux(scenario_module, Global, nyears_start), rtol=RTOL, atol=ATOL)
+
+
+@pytest.mark.parametrize('mature, scenario_module', [(False, Secondary_regrowth_scenario), (True, Secondary_mature_regrowth_scenario)], ids=['middle', 'mature'])
+def test_carbon_tracker_same_as_tracker(mature, scenario_module):
+    Global, nyears_start = growth_settings('IDN', {})
+    for year in [0, 1, nyears_start - 1]:
+        closed_form = Secondary_regrowth_closed_form.CarbonTracker(Global, year_start_for_PDV=year, mature=mature)
+        tracker = scenario_module.CarbonTracker(Global, year_start_for_PDV=year, keep_intermediates=False)
+        for name in ['totalC_stand_pool', 'totalC_product_pool', 'totalC_slash_root', 'totalC_landfill_pool', 'total_carbon_benefit', 'counterfactual_biomass', 'annual_discounted_value']:
+            np.testing.assert_allclose(getattr(closed_form, name), getattr(tracker, name), rtol=RTOL, atol=ATOL, err_msg=name)
+        np.testing.assert_array_equal(closed_form.discounted_year, tracker.discounted_year)
+
+
+def test_mature_age_offset():
+    """The mature regrowth starts from a stand MATURE_AGE_OFFSET years older, so it has more carbon harvested than the middle regrowth"""
+    Global, nyears_start = growth_settings('IDN', {})
+    middle = Secondary_regrowth_closed_form.CarbonTracker(Global, mature=False)
+    mature = Secondary_regrowth_closed_form.CarbonTracker(Global, mature=True)
+    assert mature.totalC_stand_pool[0] > middle.totalC_stand_pool[0]
+    tracker = Secondary_mature_regrowth_scenario.CarbonTracker(Global, keep_intermediates=False)
+    np.testing.assert_allclose(mature.totalC_stand_pool, tracker.totalC_stand_pool, rtol=RTOL, atol=ATOL)
+
+
+def test_thinning_falls_back_to_tracker():
+    Global, nyears_start = growth_settings('SWE', {})
+    assert not Secondary_regrowth_closed_form.is_single_harvest(Global)
+    np.testing.assert_allclose(Secondary_regrowth_closed_form.annual_flux_matrix(Global, nyears_start),
+                               tracker_annual_flux(Secondary_regrowth_scenario, Global, nyears_start), rtol=RTOL, atol=ATOL)
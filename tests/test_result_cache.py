@@ -0,0 +1,86 @@
+"""
+On-disk cache of the land area and carbon cost results (Result_cache.ResultCache): a cache hit gives the same results as a computed one,
+the least recently used results are evicted past max_bytes, and a change in a scenario module changes the keys
+"""
+import os
+import types
+import numpy as np
+import pytest
+import Global_by_country, Driver, Result_cache
+
+
+def harvest_growth_settings(inputs, code):
+    Global_harvest = Global_by_country.Parameters(inputs, Global_by_country.SetupTime(inputs, country_iso=code, nyears_run_control='harvest'), country_iso=code)
+    Global_growth = Global_by_country.Parameters(inputs, Global_by_country.SetupTime(inputs, country_iso=code, nyears_run_control='growth'), country_iso=code)
+    return Global_harvest, Global_growth
+
+
+def assert_same_results(cached, computed):
+    """The array and scalar results saved to the cache are the same as the computed ones"""
+    names = [name for name, value in vars(computed).items() if isinstance(value, (np.ndarray, np.generic, int, float))]
+    assert names
+    for name in names:
+        np.testing.assert_array_equal(getattr(cached, name), getattr(computed, name), err_msg=name)
+
+
+@pytest.mark.parametrize('code', ['IDN', 'SWE'])
+def test_cache_hit_same_as_computed(inputs, tmp_path, code):
+    cache = Result_cache.ResultCache(str(tmp_path))
+    Global_harvest, Global_growth = harvest_growth_settings(inputs, code)
+    land_computed = Result_cache.land_calculator(Global_harvest, cache)
+    carbon_computed = Result_cache.carbon_calculator(Global_harvest, Global_growth, land_computed, cache)
+    assert not isinstance(land_computed, Result_cache.CachedResult) and not isinstance(carbon_computed, Result_cache.CachedResult)
+
+    land_cached = Result_cache.land_calculator(Global_harvest, cache)
+    carbon_cached = Result_cache.carbon_calculator(Global_harvest, Global_growth, land_cached, cache)
+    assert isinstance(land_cached, Result_cache.CachedResult) and isinstance(carbon_cached, Result_cache.CachedResult)
+    assert_same_results(land_cached, land_computed)
+    assert_same_results(carbon_cached, carbon_computed)
+
+
+def test_country_run_with_cache(inputs, tmp_path):
+    cache = Result_cache.ResultCache(str(tmp_path))
+    computed = Driver.run_country_all_scenarios(inputs, 'Chile', 'CHL')
+    for _ in range(2):
+        # The first run fills the cache, the second reads it
+        assert Driver.run_country_all_scenarios(inputs, 'Chile', 'CHL', cache=cache) == computed
+
+
+def put_result(cache, key, nbytes, mtime):
+    cache.put(key, types.SimpleNamespace(values=np.zeros(nbytes // 8)))
+    os.utime(cache._filename(key), (mtime, mtime))
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = Result_cache.ResultCache(str(tmp_path), max_bytes=10 ** 9)
+    put_result(cache, 'a', 8000, 1000)
+    put_result(cache, 'b', 8000, 2000)
+    entry_bytes = os.path.getsize(cache._filename('a'))
+    # Room for two results
+    cache.max_bytes = 2 * entry_bytes + entry_bytes // 2
+    # Reading 'a' makes 'b' the least recently used
+    assert cache.get('a') is not None
+    put_result(cache, 'c', 8000, 3000)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    assert sum(os.path.getsize(cache._filename(key)) for key in ['a', 'c']) <= cache.max_bytes
+
+
+def test_key_changes_with_scenario_module(inputs, tmp_path, monkeypatch):
+    script = tmp_path / 'Fake_scenario.py'
+    script.write_text('RATE = 1\n')
+    monkeypatch.setattr(Result_cache, 'SCENARIO_MODULES', Result_cache.SCENARIO_MODULES + [types.SimpleNamespace(__name__='Fake_scenario', __file__=str(script))])
+    Global_harvest, _ = harvest_growth_settings(inputs, 'IDN')
+    key = Result_cache.ResultCache(str(tmp_path / 'cache')).key('LandCalculator', Global_harvest)
+    assert Result_cache.ResultCache(str(tmp_path / 'cache')).key('LandCalculator', Global_harvest) == key
+
+    script.write_text('RATE = 2\n')
+    assert Result_cache.ResultCache(str(tmp_path / 'cache')).key('LandCalculator', Global_harvest) != key
+
+
+def test_key_changes_with_parameters(inputs, tmp_path):
+    cache = Result_cache.ResultCache(str(tmp_path))
+    Global_harvest, _ = harvest_growth_settings(inputs, 'IDN')
+    Global_changed, _ = harvest_growth_settings(inputs.assign(**{'LLP half life': 31.0}), 'IDN')
+    assert cache.key('LandCalculator', Global_harvest) == cache.key('LandCalculator', harvest_growth_settings(inputs, 'IDN')[0])
+    assert cache.key('LandCalculator', Global_harvest) != cache.key('LandCalculator', Global_changed)
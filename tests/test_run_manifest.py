@@ -0,0 +1,87 @@
+"""
+Incremental Driver re-runs with the run manifest (Run_manifest): only the countries with a changed input row are recomputed,
+and the spliced output tab is the same as a full run
+"""
+import os
+import functools
+import openpyxl
+import pandas as pd
+from conftest import make_inputs, write_datafile
+import Driver, Run_manifest
+
+TABNAME_SETTINGS = ('BAU', 'NOSUB', 'ALL')
+RUN_SETTINGS = {'years': 40, 'discount_rate': '4p', 'version': 'test'}
+
+
+def counting(run_country, calls):
+    """The country function, recording the ISO of each country it computes"""
+    @functools.wraps(run_country)
+    def run(datafile, country, code, **kwargs):
+        calls.append(code)
+        return run_country(datafile, country, code, **kwargs)
+    return run
+
+
+def run_tab(datafile, calls, incremental=True):
+    return Driver.run_countries(datafile, counting(Driver.run_country_main_scenario, calls), *TABNAME_SETTINGS, RUN_SETTINGS, incremental=incremental)
+
+
+def set_input(datafile, code, column, value):
+    """Change one cell of the Inputs sheet, keeping the output tabs of the workbook"""
+    workbook = openpyxl.load_workbook(datafile)
+    sheet = workbook['Inputs']
+    # The header is in the second row, see write_datafile
+    header = [cell.value for cell in sheet[2]]
+    for row in sheet.iter_rows(min_row=3):
+        if row[header.index('ISO')].value == code:
+            row[header.index(column)].value = value
+    workbook.save(datafile)
+
+
+def test_country_digest():
+    inputs = make_inputs()
+    row = inputs.loc[inputs['ISO'] == 'SWE']
+    digest = Run_manifest.country_digest(row, RUN_SETTINGS, code_digest='code')
+    assert Run_manifest.country_digest(row.copy(), dict(RUN_SETTINGS), code_digest='code') == digest
+    assert Run_manifest.country_digest(row.assign(**{'LLP half life': 31.0}), RUN_SETTINGS, code_digest='code') != digest
+    assert Run_manifest.country_digest(row, dict(RUN_SETTINGS, discount_rate='2p'), code_digest='code') != digest
+    assert Run_manifest.country_digest(row, RUN_SETTINGS, code_digest='other code') != digest
+
+
+def test_country_run_scripts():
+    scripts = [os.path.splitext(os.path.basename(script))[0] for script in Run_manifest.country_run_scripts()]
+    assert 'Driver' in scripts and 'Carbon_cost_calculator' in scripts and 'Secondary_regrowth_closed_form' in scripts
+    for name in ['Monte_carlo', 'Scenario_service', 'Sensitivity', 'Carbon_pool_plot']:
+        assert name not in scripts
+
+
+def test_incremental_recomputes_only_changed_country(tmp_path):
+    datafile = write_datafile(str(tmp_path / 'incremental.xlsx'), make_inputs())
+    calls = []
+    run_tab(datafile, calls)
+    assert calls == ['IDN', 'CHL', 'SWE']
+    assert os.path.exists(Run_manifest.manifest_path(datafile))
+
+    # Nothing changed, no country is recomputed
+    calls.clear()
+    unchanged = run_tab(datafile, calls)
+    assert calls == []
+
+    set_input(datafile, 'SWE', 'LLP half life', 45.0)
+    calls.clear()
+    spliced = run_tab(datafile, calls)
+    assert calls == ['SWE']
+
+    # Full run of the changed inputs in another data file
+    full_datafile = write_datafile(str(tmp_path / 'full.xlsx'), make_inputs())
+    set_input(full_datafile, 'SWE', 'LLP half life', 45.0)
+    full = run_tab(full_datafile, [], incremental=False)
+    pd.testing.assert_frame_equal(spliced.reset_index(drop=True), full.reset_index(drop=True), check_exact=False, rtol=1e-12)
+    # The written tab is the same as the full run's
+    written = pd.read_excel(datafile, sheet_name='_'.join(TABNAME_SETTINGS))
+    pd.testing.assert_frame_equal(written, pd.read_excel(full_datafile, sheet_name='_'.join(TABNAME_SETTINGS)), check_exact=False, rtol=1e-12)
+    # The other countries keep their rows, SWE changed
+    others = spliced['ISO'] != 'SWE'
+    pd.testing.assert_frame_equal(spliced.loc[others].reset_index(drop=True), unchanged.loc[others].reset_index(drop=True), check_dtype=False)
+    column = 'S1 regrowth: total PDV (mega tC)'
+    assert spliced.loc[~others, column].iloc[0] != unchanged.loc[~others, column].iloc[0]
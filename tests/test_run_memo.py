@@ -0,0 +1,52 @@
+"""
+Scenario variants of a country run sharing their results (Result_cache.RunMemo): the output rows are the same as when every variant is computed
+"""
+import pytest
+from conftest import make_inputs
+import Driver, Result_cache
+
+# The tropical short rotation without thinning, and the rotations with thinning
+CODES = [('Indonesia', 'IDN'), ('Chile', 'CHL'), ('Sweden', 'SWE')]
+
+
+def compute_every_variant(monkeypatch):
+    """RunMemo that computes each result it is asked for, nothing is reused"""
+    monkeypatch.setattr(Result_cache.RunMemo, '_get', lambda self, key, compute: compute())
+
+
+def record_reused(monkeypatch, reused):
+    """Record for each result asked to the RunMemo whether it is reused"""
+    get = Result_cache.RunMemo._get
+
+    def recording_get(self, key, compute):
+        reused.append(key in self.results)
+        return get(self, key, compute)
+    monkeypatch.setattr(Result_cache.RunMemo, '_get', recording_get)
+
+
+@pytest.mark.parametrize('country, code', CODES)
+def test_memo_same_as_computed(monkeypatch, country, code):
+    inputs = make_inputs()
+    reused = []
+    with monkeypatch.context() as patch:
+        record_reused(patch, reused)
+        memoized = Driver.run_country_all_scenarios(inputs, country, code)
+    # The memo is used by the run, e.g. for the scenario variants with the default land area
+    assert any(reused)
+    with monkeypatch.context() as patch:
+        compute_every_variant(patch)
+        computed = Driver.run_country_all_scenarios(inputs, country, code)
+    assert memoized == computed
+
+
+@pytest.mark.parametrize('country, code', CODES)
+def test_memo_same_as_computed_sweep(monkeypatch, country, code):
+    """The sweep re-runs the annual flux of the shorter years of growth through the memo"""
+    inputs = make_inputs(**{'Years of growth': 60})
+    settings = {'years_growth': [30, 60], 'discount_rates': [0.02, 0.04]}
+    memoized = Driver.run_country_all_scenarios(inputs, country, code, **settings)
+    with monkeypatch.context() as patch:
+        compute_every_variant(patch)
+        computed = Driver.run_country_all_scenarios(inputs, country, code, **settings)
+    assert len(memoized) == 4
+    assert memoized == computed
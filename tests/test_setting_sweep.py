@@ -0,0 +1,30 @@
+"""
+Sweep of the discount rates and years of growth of one country run (Driver.output_rows_by_setting):
+each row is the same as a separate run with the 'Discount rate' and 'Years of growth' changed in the Inputs table
+"""
+import numpy as np
+import pytest
+from conftest import make_inputs
+import Driver
+
+YEARS_GROWTH = [40, 70, 100]
+DISCOUNT_RATES = [0.02, 0.04]
+
+
+def assert_same_row(swept, separate):
+    assert set(swept) - set(separate) == {'Discount rate', 'Years of growth'}
+    for name, value in separate.items():
+        if isinstance(value, str):
+            assert swept[name] == value, name
+        else:
+            np.testing.assert_allclose(swept[name], value, rtol=1e-12, atol=1e-9, err_msg=name)
+
+
+@pytest.mark.parametrize('run_country', [Driver.run_country_all_scenarios, Driver.run_country_main_scenario], ids=['all', 'main'])
+@pytest.mark.parametrize('country, code', [('Indonesia', 'IDN'), ('Chile', 'CHL'), ('Sweden', 'SWE')])
+def test_sweep_same_as_separate_runs(run_country, country, code):
+    swept = run_country(make_inputs(**{'Years of growth': max(YEARS_GROWTH)}), country, code, discount_rates=DISCOUNT_RATES, years_growth=YEARS_GROWTH)
+    assert [(row['Discount rate'], row['Years of growth']) for row in swept] == [(rate, years) for rate in DISCOUNT_RATES for years in YEARS_GROWTH]
+    for row in swept:
+        inputs = make_inputs(**{'Years of growth': row['Years of growth'], 'Discount rate': row['Discount rate']})
+        assert_same_row(row, run_country(inputs, country, code))